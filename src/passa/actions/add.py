@@ -6,8 +6,8 @@ import itertools
 import sys
 
 
-def add_packages(packages=[], editables=[], project=None, dev=False, sync=False, clean=False):
-    from passa.models.lockers import PinReuseLocker
+def add_packages(packages=[], editables=[], project=None, dev=False, sync=False, clean=False, offline=False):
+    from passa.models.lockers import IncrementalLocker
     from passa.operations.lock import lock
 
     lines = list(itertools.chain(
@@ -27,7 +27,7 @@ def add_packages(packages=[], editables=[], project=None, dev=False, sync=False,
 
     prev_lockfile = project.lockfile
 
-    locker = PinReuseLocker(project)
+    locker = IncrementalLocker(project, offline=offline)
     success = lock(locker)
     if not success:
         return 1
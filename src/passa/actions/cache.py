@@ -0,0 +1,73 @@
+# -*- coding=utf-8 -*-
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+
+
+# Labels of lookups served without fetching anything from the index.
+_LOCAL_LOOKUPS = ("cache", "artifact-cache", "shared-cache")
+
+
+def import_cache(paths):
+    from passa.internals.dependencies import import_dependencies
+    from passa.internals.mirrors import iter_metadata_records
+
+    count = import_dependencies(iter_metadata_records(paths))
+    print("Imported metadata of {0} packages".format(count))
+
+
+def show_stats():
+    from passa.internals.cachetiers import (
+        format_size, get_tier_stats, read_lookup_stats,
+    )
+    from passa.models.caches import CACHE_DIR
+
+    print("Cache directory: {0}".format(CACHE_DIR))
+    total = 0
+    for name, count, size in get_tier_stats(CACHE_DIR):
+        total += size
+        print("  {0:<14} {1:>8} entries {2:>12}".format(
+            name, count, format_size(size),
+        ))
+    print("  {0:<14} {1:>8}         {2:>12}".format("total", "", format_size(total)))
+
+    counts = read_lookup_stats(CACHE_DIR)
+    lookups = sum(counts.values())
+    if not lookups:
+        return
+    print("Dependency lookups: {0}".format(lookups))
+    for label, count in counts.most_common():
+        print("  {0:<14} {1:>8} {2:>6.1%}".format(
+            label, count, count / float(lookups),
+        ))
+    hits = sum(counts[label] for label in _LOCAL_LOOKUPS)
+    print("Cache hit rate: {0:.1%}".format(hits / float(lookups)))
+
+
+def prune_cache(max_size=None, max_age=None, dry_run=False):
+    from passa.internals.cachetiers import format_size, parse_size, prune
+    from passa.models.caches import CACHE_DIR
+
+    if max_size is None:
+        max_size = os.environ.get("PASSA_CACHE_MAX_SIZE")
+    if max_age is None:
+        max_age = os.environ.get("PASSA_CACHE_MAX_AGE")
+    try:
+        max_size = parse_size(max_size) if max_size else None
+        max_age = float(max_age) * 86400 if max_age else None
+    except ValueError as e:
+        print("invalid limit: {0}".format(e))
+        return 2
+
+    removed = prune(
+        CACHE_DIR, max_size=max_size, max_age=max_age, dry_run=dry_run,
+    )
+    for item in removed:
+        print("{0} {1}".format(
+            "Would remove" if dry_run else "Removed", item.path,
+        ))
+    print("{0} {1} entries, {2}".format(
+        "Would free" if dry_run else "Freed", len(removed),
+        format_size(sum(item.size for item in removed)),
+    ))
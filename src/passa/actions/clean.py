@@ -3,11 +3,11 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 
-def clean(project, dev=False):
+def clean(project, default=True, dev=False):
     from passa.models.synchronizers import Cleaner
     from passa.operations.sync import clean
 
-    cleaner = Cleaner(project, default=True, develop=dev)
+    cleaner = Cleaner(project, default=default, develop=dev)
 
     success = clean(cleaner)
     if not success:
@@ -0,0 +1,50 @@
+# -*- coding=utf-8 -*-
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import sys
+
+
+def _check_supported():
+    from passa.internals.daemon import is_supported
+    if is_supported():
+        return True
+    print("passa daemon requires Unix sockets", file=sys.stderr)
+    return False
+
+
+def serve():
+    from passa.internals.daemon import serve
+
+    if not _check_supported():
+        return 1
+    try:
+        serve()
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+
+
+def stop():
+    from passa.internals.daemon import stop
+
+    if not _check_supported():
+        return 1
+    if not stop():
+        print("passa daemon is not running")
+        return 1
+    print("passa daemon stopped")
+
+
+def status():
+    from passa.internals.daemon import get_socket_path, ping
+
+    if not _check_supported():
+        return 1
+    pid = ping()
+    if pid is None:
+        print("passa daemon is not running")
+        return 1
+    print("passa daemon is running (pid {0}) on {1}".format(
+        pid, get_socket_path(),
+    ))
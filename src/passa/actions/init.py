@@ -4,14 +4,20 @@ from __future__ import absolute_import, print_function, unicode_literals
 
 import io
 import os
-from pip_shims import Command as PipCommand, cmdoptions
-import plette
+
 import six
-import vistir
 
 
-class PipCmd(PipCommand):
-    name = "PipCmd"
+def _parse_pip_index_options():
+    from pip_shims import Command as PipCommand, cmdoptions
+
+    class PipCmd(PipCommand):
+        name = "PipCmd"
+
+    pip_command = PipCmd()
+    cmdoptions.make_option_group(cmdoptions.index_group, pip_command.parser)
+    parsed, _ = pip_command.parser.parse_args([])
+    return parsed
 
 
 def get_sources(urls, trusted_hosts):
@@ -31,18 +37,18 @@ def get_sources(urls, trusted_hosts):
 
 
 def init_project(root=None, python_version=None):
+    import vistir
+
     pipfile_path = os.path.join(root, "Pipfile")
     if os.path.isfile(pipfile_path):
         raise RuntimeError("{0!r} is already a Pipfile project".format(root))
     if not os.path.exists(root):
         vistir.path.mkdir_p(root, mode=0o755)
-    pip_command = PipCmd()
-    cmdoptions.make_option_group(cmdoptions.index_group, pip_command.parser)
-    parsed, _ = pip_command.parser.parse_args([])
+    parsed = _parse_pip_index_options()
     index_urls = [parsed.index_url] + parsed.extra_index_urls
     sources = get_sources(index_urls, parsed.trusted_hosts)
     data = {
-        "sources": sources,
+        "source": sources,
         "packages": {},
         "dev-packages": {},
     }
@@ -52,6 +58,8 @@ def init_project(root=None, python_version=None):
 
 
 def create_project(pipfile_path, data={}):
+    import plette
+
     pipfile = plette.pipfiles.Pipfile(data=data)
     with io.open(pipfile_path, "w") as fh:
         pipfile.dump(fh)
@@ -3,7 +3,8 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 
-def install(project=None, check=True, dev=False, clean=True):
+def install(project=None, check=True, dev=False, clean=True, link=None,
+            paranoid=False, compile_bytecode=True):
     from passa.models.lockers import BasicLocker
     from passa.operations.lock import lock
 
@@ -22,7 +23,8 @@ def install(project=None, check=True, dev=False, clean=True):
 
     syncer = Synchronizer(
         project, default=True, develop=dev,
-        clean_unneeded=clean,
+        clean_unneeded=clean, link=link, paranoid=paranoid,
+        compile_bytecode=compile_bytecode,
     )
 
     success = sync(syncer)
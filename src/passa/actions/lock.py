@@ -3,15 +3,80 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 
-def lock(project=None):
-    from passa.models.lockers import BasicLocker
+def lock(project=None, offline=False, targets=None):
+    from passa.models.lockers import BasicLocker, MultiTargetLocker
     from passa.operations.lock import lock
 
     project = project
-    locker = BasicLocker(project)
+    if targets:
+        locker = MultiTargetLocker(project, targets, offline=offline)
+    else:
+        locker = BasicLocker(project, offline=offline)
     success = lock(locker)
     if not success:
         return
 
     project._l.write()
     print("Written to project at", project.root)
+
+
+def _lock_project(args):
+    """Lock a project, returning why it failed, or None on success.
+    """
+    from passa.internals.dependencies import flush_caches
+    from passa.internals.reporters import print_title
+    from passa.models.lockers import BasicLocker
+    from passa.models.projects import Project
+    from passa.operations.lock import lock
+
+    root, offline = args
+    print_title(" {0} ".format(root))
+    try:
+        project = Project(root)
+        if not lock(BasicLocker(project, offline=offline)):
+            return "cannot resolve"
+        project._l.write()
+        print("Written to project at", project.root)
+    except Exception as e:
+        # One broken project should not stop the others from being locked.
+        print("\nCANNOT LOCK {0}:".format(root))
+        print("{:>40}".format("{0}: {1}".format(type(e).__name__, e)))
+        return type(e).__name__
+    finally:
+        # Pool workers exit without running exit handlers.
+        flush_caches()
+    return None
+
+
+def lock_projects(roots, offline=False, jobs=1):
+    """Lock multiple projects in one process.
+
+    Caches kept in memory (index pages, dependencies, hashes, and finders) are
+    shared between projects, so each is loaded or looked up only once. With
+    `jobs` greater than one, projects are locked in that many worker
+    processes instead, each sharing caches between the projects it locks.
+
+    A project failing to lock, for whatever reason, does not stop the others.
+    Failures are listed at the end. Returns 1 if any project fails to lock.
+    """
+    import multiprocessing
+
+    args = [(root, offline) for root in roots]
+    if jobs > 1 and len(args) > 1:
+        pool = multiprocessing.Pool(min(jobs, len(args)))
+        try:
+            results = pool.map(_lock_project, args, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_lock_project(a) for a in args]
+    failed = [
+        (root, reason) for root, reason in zip(roots, results)
+        if reason is not None
+    ]
+    if failed:
+        print("\nFailed to lock:")
+        for root, reason in failed:
+            print("    {0} ({1})".format(root, reason))
+        return 1
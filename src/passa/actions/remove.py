@@ -3,8 +3,8 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 
-def remove(project=None, only="default", packages=[], clean=True):
-    from passa.models.lockers import PinReuseLocker
+def remove(project=None, only="default", packages=[], clean=True, offline=False):
+    from passa.models.lockers import IncrementalLocker
     from passa.operations.lock import lock
 
     default = (only != "dev")
@@ -15,7 +15,7 @@ def remove(project=None, only="default", packages=[], clean=True):
         packages, default=default, develop=develop,
     )
 
-    locker = PinReuseLocker(project)
+    locker = IncrementalLocker(project, offline=offline)
     success = lock(locker)
     if not success:
         return 1
@@ -3,14 +3,16 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 
-def sync(project=None, dev=False, clean=True):
+def sync(project=None, dev=False, clean=True, link=None, paranoid=False,
+         compile_bytecode=True):
     from passa.models.synchronizers import Synchronizer
     from passa.operations.sync import sync
 
     project = project
     syncer = Synchronizer(
         project, default=True, develop=dev,
-        clean_unneeded=clean,
+        clean_unneeded=clean, link=link, paranoid=paranoid,
+        compile_bytecode=compile_bytecode,
     )
 
     success = sync(syncer)
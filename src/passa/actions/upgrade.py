@@ -5,8 +5,8 @@ from __future__ import absolute_import, print_function, unicode_literals
 import sys
 
 
-def upgrade(project=None, strategy="only-if-needed", sync=True, packages=[]):
-    from passa.models.lockers import EagerUpgradeLocker, PinReuseLocker
+def upgrade(project=None, strategy="only-if-needed", sync=True, packages=[], offline=False):
+    from passa.models.lockers import EagerUpgradeLocker, IncrementalLocker
     from passa.operations.lock import lock
 
     for package in packages:
@@ -21,9 +21,9 @@ def upgrade(project=None, strategy="only-if-needed", sync=True, packages=[]):
     prev_lockfile = project.lockfile
 
     if strategy == "eager":
-        locker = EagerUpgradeLocker(project, packages)
+        locker = EagerUpgradeLocker(packages, project, offline=offline)
     else:
-        locker = PinReuseLocker(project)
+        locker = IncrementalLocker(project, offline=offline)
     success = lock(locker)
     if not success:
         return 1
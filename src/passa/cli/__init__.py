@@ -4,16 +4,47 @@ from __future__ import absolute_import, unicode_literals
 
 import argparse
 import importlib
-import pkgutil
 import sys
 
 from passa import __version__
+from passa.internals.daemon import FORWARDED_COMMANDS, forward
 
 
-CURRENT_MODULE_PATH = sys.modules[__name__].__path__
+# Name and description of each command, implemented by the `Command` class in
+# the module of the same name. Only the module of the command being run is
+# imported, so `passa --help` and `passa --version` stay fast.
+COMMANDS = [
+    ("add", "Add packages to project."),
+    ("cache", "Manage the local cache."),
+    ("clean", "Uninstall unlisted packages from the environment."),
+    ("daemon", "Run commands in a long-running server with warm caches."),
+    ("freeze", "Export project depenencies to requirements.txt."),
+    ("init", "Create a new project."),
+    ("install", "Generate Pipfile.lock to synchronize the environment."),
+    ("lock", "Generate Pipfile.lock."),
+    ("remove", "Remove packages from project."),
+    ("sync", "Install Pipfile.lock into the environment."),
+    ("upgrade", "Upgrade packages in project."),
+]
+
+
+def _get_command_name(argv):
+    # The root parser has no options taking values, so the first positional
+    # argument is the command.
+    for arg in argv:
+        if not arg.startswith("-"):
+            return arg
+    return None
 
 
 def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in FORWARDED_COMMANDS:
+        result = forward(argv)
+        if result is not None:
+            sys.exit(result)
+
     root_parser = argparse.ArgumentParser(
         prog="passa",
         description="Pipfile project management tool.",
@@ -25,15 +56,14 @@ def main(argv=None):
         help="show the version and exit",
     )
 
+    command_name = _get_command_name(argv)
     subparsers = root_parser.add_subparsers()
-    for _, name, _ in pkgutil.iter_modules(CURRENT_MODULE_PATH, "."):
-        module = importlib.import_module(name, __name__)
-        try:
-            klass = module.Command
-        except AttributeError:
+    for name, description in COMMANDS:
+        parser = subparsers.add_parser(name, help=description)
+        if name != command_name:
             continue
-        parser = subparsers.add_parser(klass.name, help=klass.description)
-        command = klass(parser)
+        module = importlib.import_module(".{0}".format(name), __name__)
+        command = module.Command(parser)
         parser.set_defaults(func=command.run)
 
     options = root_parser.parse_args(argv)
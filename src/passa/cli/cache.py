@@ -0,0 +1,52 @@
+# -*- coding=utf-8 -*-
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+from ..actions.cache import import_cache, prune_cache, show_stats
+from ._base import BaseCommand
+from .options import dry_run, import_paths, max_age, max_size
+
+
+class Command(BaseCommand):
+
+    name = "cache"
+    description = "Manage the local cache."
+    default_arguments = []
+    subcommands = {
+        "import": (
+            "Populate dependency caches from a local mirror.",
+            [import_paths],
+        ),
+        "prune": (
+            "Remove old and least recently used cache entries.",
+            [max_size, max_age, dry_run],
+        ),
+        "stats": (
+            "Show sizes of cache tiers, and how lookups were served.",
+            [],
+        ),
+    }
+
+    def add_arguments(self):
+        subparsers = self.parser.add_subparsers(dest="cache_command")
+        for name, (description, arguments) in sorted(self.subcommands.items()):
+            parser = subparsers.add_parser(name, help=description)
+            for arg in arguments:
+                arg.add_to_parser(parser)
+
+    def run(self, options):
+        if options.cache_command == "import":
+            return import_cache(paths=options.paths)
+        elif options.cache_command == "prune":
+            return prune_cache(
+                max_size=options.max_size, max_age=options.max_age,
+                dry_run=options.dry_run,
+            )
+        elif options.cache_command == "stats":
+            return show_stats()
+        self.parser.print_help()
+        return -1
+
+
+if __name__ == "__main__":
+    Command.run_parser()
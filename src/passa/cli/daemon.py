@@ -0,0 +1,37 @@
+# -*- coding=utf-8 -*-
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+from ..actions.daemon import serve, status, stop
+from ._base import BaseCommand
+
+
+class Command(BaseCommand):
+
+    name = "daemon"
+    description = "Run commands in a long-running server with warm caches."
+    default_arguments = []
+    subcommands = {
+        "serve": "Run the server in the foreground.",
+        "status": "Show whether the server is running.",
+        "stop": "Stop the running server.",
+    }
+
+    def add_arguments(self):
+        subparsers = self.parser.add_subparsers(dest="daemon_command")
+        for name, description in sorted(self.subcommands.items()):
+            subparsers.add_parser(name, help=description)
+
+    def run(self, options):
+        if options.daemon_command == "serve":
+            return serve()
+        elif options.daemon_command == "status":
+            return status()
+        elif options.daemon_command == "stop":
+            return stop()
+        self.parser.print_help()
+        return -1
+
+
+if __name__ == "__main__":
+    Command.run_parser()
@@ -4,18 +4,22 @@ from __future__ import absolute_import, print_function, unicode_literals
 
 from ..actions.install import install
 from ._base import BaseCommand
-from .options import dev, no_check, no_clean
+from .options import (
+    dev, link, no_check, no_clean, no_compile, paranoid,
+)
 
 
 class Command(BaseCommand):
 
     name = "install"
     description = "Generate Pipfile.lock to synchronize the environment."
-    arguments = [no_check, dev, no_clean]
+    arguments = [no_check, dev, no_clean, link, paranoid, no_compile]
 
     def run(self, options):
         return install(project=options.project, check=options.check, dev=options.dev,
-                            clean=options.clean)
+                            clean=options.clean, link=options.link,
+                            paranoid=options.paranoid,
+                            compile_bytecode=options.compile_bytecode)
 
 
 if __name__ == "__main__":
@@ -2,16 +2,39 @@
 
 from __future__ import absolute_import, print_function, unicode_literals
 
-from ..actions.lock import lock
+from ..actions.lock import lock, lock_projects
+from ..internals.profiling import profile_to
 from ._base import BaseCommand
+from .options import (
+    jobs, offline, profile_format, profile_output, projects, target_envs,
+)
 
 
 class Command(BaseCommand):
     name = "lock"
     description = "Generate Pipfile.lock."
+    arguments = [
+        offline, target_envs, projects, jobs, profile_output, profile_format,
+    ]
 
     def run(self, options):
-        return lock(project=options.project)
+        with profile_to(options.profile_output, options.profile_format):
+            return self._run(options)
+
+    def _run(self, options):
+        if options.projects:
+            if options.targets:
+                self.parser.error(
+                    "--target-env cannot be used with --projects",
+                )
+            return lock_projects(
+                [p.root for p in options.projects],
+                offline=options.offline, jobs=options.jobs,
+            )
+        return lock(
+            project=options.project, offline=options.offline,
+            targets=options.targets,
+        )
 
 
 if __name__ == "__main__":
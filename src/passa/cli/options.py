@@ -5,32 +5,39 @@ import argparse
 import os
 import sys
 
-import tomlkit.exceptions
-
-import passa.models.projects
-import vistir
+from ..internals.profiling import FORMATS
 
 
 PYTHON_VERSION = ".".join(str(v) for v in sys.version_info[:2])
 
 
-class Project(passa.models.projects.Project):
-    def __init__(self, root, *args, **kwargs):
-        root = vistir.compat.Path(root).absolute()
-        pipfile = root.joinpath("Pipfile")
-        if not pipfile.is_file():
-            raise argparse.ArgumentError(
-                "project", "{0!r} is not a Pipfile project".format(root),
-            )
-        try:
-            super(Project, self).__init__(root.as_posix(), *args, **kwargs)
-        except tomlkit.exceptions.ParseError as e:
-            raise argparse.ArgumentError(
-                "project", "failed to parse Pipfile: {0!r}".format(str(e)),
-            )
+# Types import what they need when called, so building the parser (e.g. for
+# `passa --help`) does not import models and their dependencies.
+
+def load_project(root):
+    import passa.models.projects
+    import tomlkit.exceptions
+
+    root = os.path.abspath(root)
+    if not os.path.isfile(os.path.join(root, "Pipfile")):
+        raise argparse.ArgumentError(
+            "project", "{0!r} is not a Pipfile project".format(root),
+        )
+    try:
+        return passa.models.projects.Project(root)
+    except tomlkit.exceptions.ParseError as e:
+        raise argparse.ArgumentError(
+            "project", "failed to parse Pipfile: {0!r}".format(str(e)),
+        )
+
 
-    def __name__(self):
-        return "Project Root"
+def _target_type(value):
+    import passa.internals.targets
+
+    try:
+        return passa.internals.targets.parse_target(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
 
 class Option(object):
@@ -69,8 +76,10 @@ class ArgumentGroup(object):
         self.parser = parser
 
 
+# The default is converted when parsing, so it follows the working directory
+# of a daemon serving multiple requests.
 project = Option(
-    "--project", metavar="project", default=os.getcwd(), type=Project,
+    "--project", metavar="project", default=".", type=load_project,
     help="path to project root (directory containing Pipfile)",
 )
 
@@ -135,6 +144,75 @@ no_clean = Option(
     help="do not remove packages not specified in Pipfile.lock",
 )
 
+link = Option(
+    "--link", choices=["hardlink", "reflink"], default=None,
+    help="install wheels by linking files from a shared store in the cache",
+)
+
+paranoid = Option(
+    "--paranoid", action="store_true", default=False,
+    help="always re-verify hashes of cached artifacts",
+)
+
+no_compile = Option(
+    "--no-compile", dest="compile_bytecode", action="store_false", default=True,
+    help="do not byte-compile installed files",
+)
+
+offline = Option(
+    "--offline", action="store_true", default=False,
+    help="lock only with data in local caches, without network access",
+)
+
+target_envs = Option(
+    "--target-env", dest="targets", metavar="python-platform",
+    action="append", default=None, type=_target_type,
+    help="lock for a target environment, e.g. 3.8-linux (can be used "
+         "multiple times; targets are locked in parallel and merged)",
+)
+
+projects = Option(
+    "--projects", metavar="project", nargs="+", default=None, type=load_project,
+    help="lock multiple projects in one process, sharing caches",
+)
+
+jobs = Option(
+    "-j", "--jobs", type=int, default=1,
+    help="number of projects to lock in parallel (with --projects)",
+)
+
+profile_output = Option(
+    "--profile-output", metavar="path", default=None,
+    help="write timings of lock phases and lookups to this file",
+)
+
+profile_format = Option(
+    "--profile-format", choices=FORMATS, default="json",
+    help="format of --profile-output (chrome: trace event format)",
+)
+
+import_paths = Option(
+    "paths", metavar="path", nargs="+",
+    help="wheel, metadata file, JSON API document, or directory to import",
+)
+
+max_size = Option(
+    "--max-size", metavar="SIZE", default=None,
+    help=("remove least recently used entries until the cache fits in SIZE, "
+          "e.g. 500M or 10G (default: $PASSA_CACHE_MAX_SIZE)"),
+)
+
+max_age = Option(
+    "--max-age", metavar="DAYS", default=None,
+    help=("remove entries not used for DAYS days "
+          "(default: $PASSA_CACHE_MAX_AGE)"),
+)
+
+dry_run = Option(
+    "--dry-run", action="store_true", default=False,
+    help="only show what would be removed",
+)
+
 dev_only = Option(
     "--dev", dest="only", action="store_const", const="dev",
     help="only try to modify [dev-packages]",
@@ -4,17 +4,21 @@ from __future__ import absolute_import, print_function, unicode_literals
 
 from ..actions.sync import sync
 from ._base import BaseCommand
-from .options import dev, no_clean
+from .options import dev, link, no_clean, no_compile, paranoid
 
 
 class Command(BaseCommand):
 
     name = "sync"
     description = "Install Pipfile.lock into the environment."
-    arguments = [dev, no_clean]
+    arguments = [dev, no_clean, link, paranoid, no_compile]
 
     def run(self, options):
-        return sync(project=options.project, dev=options.dev, clean=options.clean)
+        return sync(
+            project=options.project, dev=options.dev, clean=options.clean,
+            link=options.link, paranoid=options.paranoid,
+            compile_bytecode=options.compile_bytecode,
+        )
 
 
 if __name__ == "__main__":
@@ -3,18 +3,19 @@ from __future__ import absolute_import, print_function, unicode_literals
 
 from ..actions.upgrade import upgrade
 from ._base import BaseCommand
-from .options import no_clean, no_sync, packages, strategy
+from .options import no_clean, no_sync, offline, packages, strategy
 
 
 class Command(BaseCommand):
 
     name = "upgrade"
     description = "Upgrade packages in project."
-    arguments = [packages, strategy, no_clean, no_sync]
+    arguments = [packages, strategy, no_clean, no_sync, offline]
 
     def run(self, options):
         return upgrade(project=options.project, strategy=options.strategy,
-                            sync=options.sync, packages=options.packages)
+                            sync=options.sync, packages=options.packages,
+                            offline=options.offline)
 
 
 if __name__ == "__main__":
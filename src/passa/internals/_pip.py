@@ -1,11 +1,12 @@
 # -*- coding=utf-8 -*-
 
-from __future__ import absolute_import, unicode_literals
+from __future__ import absolute_import, print_function, unicode_literals
 
 import contextlib
+import copy
+import hashlib
 import io
 import itertools
-import distutils.log
 import os
 
 import distlib.database
@@ -13,13 +14,35 @@ import distlib.scripts
 import distlib.wheel
 import packaging.utils
 import pip_shims
-import setuptools.dist
 import six
 import vistir
 
-from ..models.caches import CACHE_DIR
+from ..models.caches import CACHE_DIR, IndexPageCache, VerifiedArtifactCache
 from ._pip_shims import VCS_SUPPORT, build_wheel as _build_wheel, unpack_url
-from .utils import filter_sources
+from .bytecode import suppress_bytecode
+from .cachetiers import mark_accessed
+from .indexes import (
+    fetch_index_entries, get_page_url, get_version_hashes, iter_candidates,
+)
+from .lazywheels import RangeRequestUnsupported, read_wheel_metadata
+from .targets import is_artifact_supported
+from .utils import filter_sources, get_env_number, is_pinned
+from .wheels import install_linked
+
+
+ARTIFACT_CACHE = VerifiedArtifactCache()
+
+# Index pages fetched within this many seconds are used without revalidation.
+INDEX_PAGE_TTL = get_env_number("PASSA_INDEX_TTL", 0, convert=float)
+
+# Finders, sessions, and index page entries are kept for the lifetime of the
+# process, so locking multiple projects in one process only looks each up
+# once.
+_FINDERS = {}
+_INDEX_PAGE_SESSIONS = {}
+_INDEX_PAGE_ENTRIES = {}
+
+_pip_options = None
 
 
 @vistir.path.ensure_mkdir_p(mode=0o775)
@@ -82,25 +105,43 @@ class _PipCommand(pip_shims.Command):
     name = "PipCommand"
 
 
-def _get_pip_session(trusted_hosts):
-    cmd = _PipCommand()
-    options, _ = cmd.parser.parse_args([])
-    options.cache_dir = CACHE_DIR
+def _get_pip_options():
+    """Get pip's options, as set in its configuration files and environment.
+    """
+    global _pip_options
+    if _pip_options is None:
+        cmd = _PipCommand()
+        pip_shims.cmdoptions.make_option_group(
+            pip_shims.cmdoptions.index_group, cmd.parser,
+        )
+        _pip_options, _ = cmd.parser.parse_args([])
+    return _pip_options
+
+
+def _get_pip_session(trusted_hosts, http_cache=True):
+    options = copy.copy(_get_pip_options())
+    options.cache_dir = CACHE_DIR if http_cache else None
     options.trusted_hosts = trusted_hosts
-    session = cmd._build_session(options)
+    session = _PipCommand()._build_session(options)
     return session
 
 
 def _get_finder(sources):
     index_urls, trusted_hosts = _get_pip_index_urls(sources)
+    key = (tuple(index_urls), tuple(trusted_hosts))
+    try:
+        return _FINDERS[key]
+    except KeyError:
+        pass
     session = _get_pip_session(trusted_hosts)
     finder = pip_shims.PackageFinder(
-        find_links=[],
+        find_links=_get_pip_options().find_links,
         index_urls=index_urls,
         trusted_hosts=trusted_hosts,
         allow_all_prereleases=True,
         session=session,
     )
+    _FINDERS[key] = finder
     return finder
 
 
@@ -134,7 +175,45 @@ class WheelBuildError(RuntimeError):
     pass
 
 
-def build_wheel(ireq, sources, hashes=None):
+class _RecordingHashes(object):
+    """Wrap pip's Hashes to remember the SHA256 of the file it verified.
+
+    pip checks a download against the hashes while reading it, but does not
+    tell which digest matched. This computes the SHA256 on the same chunks,
+    so the artifact does not need to be read again to be recorded.
+    """
+    def __init__(self, hashes):
+        self._hashes = hashes
+        self.sha256 = None
+
+    def __getattr__(self, name):
+        return getattr(self._hashes, name)
+
+    def __bool__(self):
+        return bool(self._hashes)
+
+    __nonzero__ = __bool__
+
+    def check_against_chunks(self, chunks):
+        h = hashlib.sha256()
+
+        def _iter_chunks():
+            for chunk in chunks:
+                h.update(chunk)
+                yield chunk
+
+        self._hashes.check_against_chunks(_iter_chunks())
+        self.sha256 = h.hexdigest()
+
+    def check_against_file(self, file):
+        return self.check_against_chunks(iter(lambda: file.read(8096), b""))
+
+    def check_against_path(self, path):
+        with open(path, "rb") as f:
+            return self.check_against_file(f)
+
+
+def build_wheel(ireq, sources, hashes=None, paranoid=False):
     """Build a wheel file for the InstallRequirement object.
 
     An artifact is downloaded (or read from cache). If the artifact is not a
@@ -142,7 +221,9 @@ def build_wheel(ireq, sources, hashes=None):
     not depend on its existence after the returned wheel goes out of scope.
 
     If `hashes` is truthy, it is assumed to be a list of hashes (as formatted
-    in Pipfile.lock) to be checked against the download.
+    in Pipfile.lock) to be checked against the download. A cached artifact
+    already verified against them (and unchanged since) is not re-hashed,
+    unless `paranoid` is true.
 
     Returns a `distlib.wheel.Wheel` instance. Raises a `WheelBuildError` (a
     `RuntimeError` subclass) if the wheel cannot be built.
@@ -174,12 +255,31 @@ def build_wheel(ireq, sources, hashes=None):
         else:
             only_download = False
             download_dir = kwargs["download_dir"]
-        ireq.options["hashes"] = _convert_hashes(hashes)
-        unpack_url(
-            ireq.link, ireq.source_dir, download_dir,
-            only_download=only_download, session=finder.session,
-            hashes=ireq.hashes(False), progress_bar="off",
+        artifact = os.path.join(download_dir, ireq.link.filename)
+        verified = (
+            hashes and not paranoid and
+            ARTIFACT_CACHE.is_verified(artifact, hashes)
         )
+        # A verified wheel is used directly from the download directory, so
+        # there is nothing left to do. An sdist still needs to be unpacked,
+        # but without checking its hashes again.
+        if verified:
+            mark_accessed(artifact)
+        if not verified or not ireq.is_wheel:
+            ireq.options["hashes"] = {} if verified else _convert_hashes(hashes)
+            checked_hashes = _RecordingHashes(ireq.hashes(False))
+            unpack_url(
+                ireq.link, ireq.source_dir, download_dir,
+                only_download=only_download, session=finder.session,
+                hashes=checked_hashes, progress_bar="off",
+            )
+            # Record the digest pip verified the artifact with, so it is not
+            # read again to be checked next time.
+            if hashes and not verified and os.path.exists(artifact):
+                if checked_hashes.sha256 is not None:
+                    ARTIFACT_CACHE.set_hash(artifact, checked_hashes.sha256)
+                else:
+                    ARTIFACT_CACHE.get_hash(artifact, verify=True)
 
     if ireq.is_wheel:
         # If this is a wheel, use the downloaded thing.
@@ -216,11 +316,245 @@ def get_vcs_ref(requirement):
     return ref
 
 
-def find_installation_candidates(ireq, sources):
+# Index hosts found not to serve metadata files in this run.
+_HOSTS_WITHOUT_METADATA = set()
+
+
+def _get_metadata_link_info(link):
+    """Get the URL of a link's PEP 658 metadata file, and its hash.
+
+    Returns a 3-tuple `(url, hash_name, hash_value)`. Newer pip versions parse
+    the index's advertisement of the metadata file. Older ones don't, so we
+    optimistically guess the URL (hash unknown) unless the host is known not
+    to serve them. The URL is None if there is no metadata file.
+    """
+    try:
+        get_metadata_link = link.metadata_link
+    except AttributeError:
+        host = six.moves.urllib.parse.urlparse(link.url).netloc
+        if host in _HOSTS_WITHOUT_METADATA:
+            return None, None, None
+        return "{0}.metadata".format(link.url_without_fragment), None, None
+    metadata_link = get_metadata_link()
+    if metadata_link is None:
+        return None, None, None
+    return (
+        metadata_link.url_without_fragment,
+        getattr(metadata_link, "hash_name", None),
+        getattr(metadata_link, "hash", None),
+    )
+
+
+def _get_remote_wheel_link(ireq, finder):
+    ireq.populate_link(finder, False, False)
+    link = ireq.link
+    if link is None or not link.is_wheel:
+        return None
+    if link.scheme not in ("http", "https"):
+        return None
+    return link
+
+
+def get_wheel_link_identity(link):
+    """Identify a wheel link by its filename and hash.
+
+    Returns None if the link is not a wheel, or the hash is unknown.
+    """
+    if link is None or not link.is_wheel or not link.hash:
+        return None
+    return "{0}#{1}={2}".format(link.filename, link.hash_name, link.hash)
+
+
+def find_wheel_identity(ireq, sources):
+    """Identify the wheel a pinned requirement would use on this interpreter.
+
+    This populates the requirement's link, so later lookups reuse it. Returns
+    None if the best match is not a wheel, or the index provides no hash.
+    """
+    finder = _get_finder(sources)
+    ireq.populate_link(finder, False, False)
+    return get_wheel_link_identity(ireq.link)
+
+
+def read_metadata_file(ireq, sources):
+    """Read metadata of the pinned wheel from its index, without downloading it.
+
+    This uses the metadata file served alongside the wheel, as specified in
+    PEP 658. Returns the content of the file as text, or None if the index
+    does not serve it.
+    """
+    finder = _get_finder(sources)
+    link = _get_remote_wheel_link(ireq, finder)
+    if link is None:
+        return None
+    url, hash_name, hash_value = _get_metadata_link_info(link)
+    if url is None:
+        return None
+    response = finder.session.get(url)
+    if response.status_code == 404 and not hash_name:
+        # Not advertised, and not found. This index doesn't serve them.
+        host = six.moves.urllib.parse.urlparse(link.url).netloc
+        _HOSTS_WITHOUT_METADATA.add(host)
+        return None
+    response.raise_for_status()
+    content = response.content
+    if hash_name and hash_value:
+        if hashlib.new(hash_name, content).hexdigest() != hash_value:
+            raise ValueError("hash mismatch for {0}".format(url))
+    return content.decode("utf-8")
+
+
+def read_remote_wheel_metadata(ireq, sources):
+    """Read metadata of the pinned wheel with HTTP range requests.
+
+    Only the zip's central directory and the METADATA member are downloaded.
+    Returns the content of METADATA as text, or None if this is not possible,
+    e.g. the server does not support range requests. The caller should fall
+    back to downloading the whole wheel in that case.
+    """
+    finder = _get_finder(sources)
+    link = _get_remote_wheel_link(ireq, finder)
+    if link is None:
+        return None
+    try:
+        return read_wheel_metadata(link.url_without_fragment, finder.session)
+    except RangeRequestUnsupported:
+        return None
+
+
+def _get_index_page_session(sources):
+    # pip's session applies its configuration, e.g. certificates, proxies,
+    # and credentials from URLs, netrc, or keyring. Its HTTP cache is not
+    # used, since pages are revalidated against our own cache instead.
+    _, trusted_hosts = _get_pip_index_urls(sources)
+    key = tuple(trusted_hosts)
+    try:
+        return _INDEX_PAGE_SESSIONS[key]
+    except KeyError:
+        pass
+    session = _get_pip_session(trusted_hosts, http_cache=False)
+    _INDEX_PAGE_SESSIONS[key] = session
+    return session
+
+
+def _uses_index_pages():
+    # Links found with --find-links are not on index pages, so pip's finder
+    # is needed to list them.
+    return not (
+        os.environ.get("PASSA_IGNORE_INDEX_CACHE") or
+        _get_pip_options().find_links
+    )
+
+
+def _iter_index_pages(name, sources):
+    for source in sources:
+        url = source.get("url")
+        if not url:
+            continue
+        page_url = get_page_url(url, name)
+        yield page_url, source.get("verify_ssl", True), IndexPageCache(page_url)
+
+
+def _find_index_candidates(name, sources, include_yanked, target):
+    candidates = []
+    session = _get_index_page_session(sources)
+    for page_url, verify, cache in _iter_index_pages(name, sources):
+        try:
+            entries = _INDEX_PAGE_ENTRIES[page_url]
+        except KeyError:
+            entries = fetch_index_entries(
+                page_url, name, cache, session, INDEX_PAGE_TTL,
+                verify=verify,
+            )
+            _INDEX_PAGE_ENTRIES[page_url] = entries
+        candidates.extend(iter_candidates(entries, include_yanked, target))
+    return candidates
+
+
+def find_installation_candidates(ireq, sources, target=None):
+    """Find all candidates of the requirement's project on the indexes.
+
+    Index pages are parsed and cached, see `passa.internals.indexes`. pip's
+    finder is used instead if `PASSA_IGNORE_INDEX_CACHE` is set, pip is
+    configured with --find-links, or reading an index page fails. Yanked
+    files are only included for exact pins.
+
+    If `target` is given, wheels installable for it are candidates, instead
+    of ones for this interpreter. pip's finder only knows about the latter.
+    """
+    if _uses_index_pages():
+        try:
+            return _find_index_candidates(
+                ireq.name, sources, is_pinned(ireq), target,
+            )
+        except Exception as e:
+            print("unable to read index pages for {0} ({1})".format(
+                ireq.name, e,
+            ))
     finder = _get_finder(sources)
     return finder.find_all_candidates(ireq.name)
 
 
+def forget_index_pages():
+    """Drop index page entries kept in memory, so they are revalidated.
+    """
+    _INDEX_PAGE_ENTRIES.clear()
+
+
+def forget_finders():
+    """Drop finders and sessions, and read pip's configuration again.
+
+    Newer pip versions memoize candidates found by a finder.
+    """
+    global _pip_options
+    _FINDERS.clear()
+    _INDEX_PAGE_SESSIONS.clear()
+    _pip_options = None
+
+
+def _get_cached_index_entries(name, sources):
+    entries = []
+    found = False
+    for page_url, _, cache in _iter_index_pages(name, sources):
+        try:
+            page_entries = _INDEX_PAGE_ENTRIES[page_url]
+        except KeyError:
+            page_entries = cache.page.get("entries")
+        if page_entries is not None:
+            found = True
+            entries.extend(page_entries)
+    return entries if found else None
+
+
+def find_cached_index_candidates(name, sources, include_yanked=False,
+                                 target=None):
+    """Find candidates from cached index pages only, without network access.
+    """
+    entries = _get_cached_index_entries(name, sources) or []
+    return list(iter_candidates(entries, include_yanked, target))
+
+
+def get_cached_index_hashes(name, version, sources, target=None):
+    """Get hashes of all files of a version from cached index pages.
+
+    Pages read while finding candidates are cached, so this usually finds
+    hashes of every candidate without network access. Only files installable
+    for `target` are included, if given. Returns None if the hashes are not
+    all known, or pip's finder is used instead of index pages.
+    """
+    if not _uses_index_pages():
+        return None
+    entries = _get_cached_index_entries(name, sources)
+    if entries is None:
+        return None
+    if target is not None:
+        entries = [
+            entry for entry in entries
+            if is_artifact_supported(entry["filename"], target)
+        ]
+    return get_version_hashes(entries, version) or None
+
+
 class RequirementUninstaller(object):
     """A context manager to remove a package for the inner block.
 
@@ -261,6 +595,8 @@ def _suppress_distutils_logs():
     There isn't a good way to suppress them now, so let's monky-patch.
     See https://bugs.python.org/issue25392.
     """
+    import distutils.log    # Only needed here; avoid importing on startup.
+
     f = distutils.log.Log._log
 
     def _log(log, level, msg, args):
@@ -281,6 +617,9 @@ class NoopInstaller(object):
     An installer has two methods, `prepare()` and `install()`. Neither takes
     arguments, and should be called in that order to prepare an installation
     operation, and to actually install things.
+
+    After installation, `get_python_sources()` returns Python source files
+    written by the installer, so the caller can byte-compile them.
     """
     def prepare(self):
         pass
@@ -288,6 +627,9 @@ class NoopInstaller(object):
     def install(self):
         pass
 
+    def get_python_sources(self):
+        return []
+
 
 class EditableInstaller(NoopInstaller):
     """Installer to handle editable.
@@ -298,6 +640,9 @@ class EditableInstaller(NoopInstaller):
         self.setup_py = ireq.setup_py
 
     def install(self):
+        # Deferred since importing setuptools is slow, and rarely needed.
+        import setuptools.dist
+
         with vistir.cd(self.working_directory), _suppress_distutils_logs():
             # Access from Setuptools to ensure things are patched correctly.
             setuptools.dist.distutils.core.run_setup(
@@ -309,19 +654,52 @@ class WheelInstaller(NoopInstaller):
     """Installer by building a wheel.
 
     The wheel is built during `prepare()`, and installed in `install()`.
+
+    If `link` is given (either "hardlink" or "reflink"), the wheel is unpacked
+    into a shared store, and files are linked into the environment instead of
+    being extracted from the archive. See `passa.internals.wheels`.
     """
-    def __init__(self, requirement, sources, paths):
+    def __init__(self, requirement, sources, paths, link=None, paranoid=False):
         self.ireq = requirement.as_ireq()
         self.sources = filter_sources(requirement, sources)
         self.hashes = requirement.hashes or None
         self.paths = paths
+        self.link = link
+        self.paranoid = paranoid
         self.wheel = None
+        self.dist = None
 
     def prepare(self):
-        self.wheel = build_wheel(self.ireq, self.sources, self.hashes)
+        self.wheel = build_wheel(
+            self.ireq, self.sources, self.hashes, paranoid=self.paranoid,
+        )
 
     def install(self):
-        self.wheel.install(self.paths, distlib.scripts.ScriptMaker(None, None))
+        # Files are not byte-compiled here. The caller can compile files from
+        # all installers in one go, see `get_python_sources()`.
+        maker = distlib.scripts.ScriptMaker(None, None)
+        with suppress_bytecode():
+            if self.link:
+                digest = ARTIFACT_CACHE.get_hash(
+                    os.path.join(self.wheel.dirname, self.wheel.filename),
+                    verify=self.paranoid,
+                )
+                self.dist = install_linked(
+                    self.wheel, self.paths, maker, self.link, digest,
+                    verify=self.paranoid,
+                )
+            else:
+                self.dist = self.wheel.install(self.paths, maker)
+
+    def get_python_sources(self):
+        if self.dist is None:
+            return []
+        base = os.path.dirname(self.dist.path)
+        return [
+            os.path.normpath(os.path.join(base, path))
+            for path, _, _ in self.dist.list_installed_files()
+            if path.endswith(".py")
+        ]
 
 
 def _iter_egg_info_directories(root, name):
@@ -0,0 +1,56 @@
+# -*- coding=utf-8 -*-
+
+"""Identify local artifacts by their content.
+
+This is used to cache results of operations on artifacts that have no
+version to key on, e.g. a local directory or an archive referenced by path.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import hashlib
+import os
+
+
+# Directories that do not affect what a project builds into, but change often
+# (or are created by building the project itself).
+IGNORED_DIRECTORIES = {
+    ".bzr", ".eggs", ".git", ".hg", ".nox", ".svn", ".tox", ".venv",
+    "__pycache__", "build", "dist", "node_modules", "venv",
+}
+
+
+def get_file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(8096), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _is_ignored_directory(name):
+    return name in IGNORED_DIRECTORIES or name.endswith(".egg-info")
+
+
+def get_tree_digest(root):
+    """Calculate a SHA256 hex digest of a directory's content.
+
+    Both the relative path and the content of each file are included, so
+    adding, removing, renaming, or modifying a file all change the digest.
+    VCS metadata, build output, and bytecode are ignored.
+    """
+    h = hashlib.sha256()
+    for parent, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not _is_ignored_directory(d))
+        for filename in sorted(filenames):
+            if filename.endswith((".pyc", ".pyo")):
+                continue
+            path = os.path.join(parent, filename)
+            if not os.path.isfile(path):
+                continue
+            relpath = os.path.relpath(path, root).replace(os.sep, "/")
+            h.update(relpath.encode("utf-8"))
+            h.update(b"\0")
+            h.update(get_file_digest(path).encode("ascii"))
+            h.update(b"\0")
+    return h.hexdigest()
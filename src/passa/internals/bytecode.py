@@ -0,0 +1,58 @@
+# -*- coding=utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals
+
+import contextlib
+import multiprocessing
+import py_compile
+import sys
+
+
+@contextlib.contextmanager
+def suppress_bytecode():
+    """Prevent installers from byte-compiling files one by one.
+
+    Both distlib and our linked installer check `sys.dont_write_bytecode` to
+    decide whether to compile files while installing them.
+    """
+    value = sys.dont_write_bytecode
+    sys.dont_write_bytecode = True
+    try:
+        yield
+    finally:
+        sys.dont_write_bytecode = value
+
+
+def _compile_file(path):
+    try:
+        py_compile.compile(path, doraise=True)
+    except (py_compile.PyCompileError, IOError, OSError):
+        return False
+    return True
+
+
+def compile_files(paths, workers=None):
+    """Byte-compile Python source files with a process pool.
+
+    One worker is used per CPU by default. Files that fail to compile (e.g.
+    Python 2 only modules) are skipped, as pip does. Returns a list of paths
+    that failed.
+    """
+    paths = sorted(set(paths))
+    if not paths:
+        return []
+    if workers is None:
+        try:
+            workers = multiprocessing.cpu_count()
+        except NotImplementedError:
+            workers = 1
+    if workers > 1 and len(paths) > 1:
+        pool = multiprocessing.Pool(min(workers, len(paths)))
+        try:
+            results = pool.map(_compile_file, paths, chunksize=16)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_compile_file(path) for path in paths]
+    return [path for path, ok in zip(paths, results) if not ok]
@@ -0,0 +1,338 @@
+# -*- coding=utf-8 -*-
+
+"""Inspect and prune the cache directory.
+
+The cache directory contains several tiers: metadata caches (JSON and binary
+files at the top level), pip's HTTP and hash caches, downloaded and built
+artifacts, and the unpacked wheel store. All tiers are pruned by age and
+total size, least recently used first. Each metadata cache file is pruned as
+a whole, since its entries do not record when they were used.
+
+Other passa processes may use the cache while it is pruned. Files are only
+unlinked (which does not affect open handles), directories are renamed out
+of the way before being deleted, and nothing accessed within the last
+`GRACE_PERIOD` seconds is removed.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+
+# (name, directory, whether each top-level directory is an entry)
+TIERS = [
+    ("hash-cache", "hash-cache", False),
+    ("http", "http", False),
+    ("index-pages", "index-pages", False),
+    ("downloads", "pkgs", False),
+    ("wheels", "wheels", False),
+    ("wheel-store", "wheel-store", True),
+]
+
+METADATA_TIER = "metadata"
+METADATA_EXTENSIONS = (".json", ".bin")
+
+# Never remove anything accessed this recently (in seconds). This protects
+# entries in use by running processes.
+GRACE_PERIOD = 3600
+
+# Prefixes of temporary files and directories created in the cache.
+TEMPORARY_PREFIXES = ("unpack-", ".passa-prune-")
+
+# Files in tiers that are not entries, and never pruned. Lock files are
+# opened but never written, so they look unused while held by a process
+# (see `passa.models.caches._locked`). Temporary files are moved into place
+# when complete.
+LOCK_SUFFIX = ".lock"
+TEMPORARY_FILE_PREFIX = ".tmp-"
+
+STATS_FILENAME = "stats.log"
+
+# The stats file is compacted into a single line when it grows past this
+# size (in bytes).
+STATS_MAX_SIZE = 64 << 10
+
+
+CacheItem = collections.namedtuple("CacheItem", [
+    "tier", "path", "size", "last_access", "is_directory",
+])
+
+TierStats = collections.namedtuple("TierStats", ["name", "count", "size"])
+
+
+_SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def parse_size(value):
+    """Parse a size like "500M" or "10G" into a number of bytes.
+    """
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", value, re.I)
+    if not match:
+        raise ValueError("invalid size {0!r}".format(value))
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[unit.upper()])
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            break
+        size /= 1024.0
+    else:
+        unit = "TB"
+    if unit == "B":
+        return "{0} B".format(int(size))
+    return "{0:.1f} {1}".format(size, unit)
+
+
+def mark_accessed(path):
+    """Record that a cache entry is used, without touching its mtime.
+
+    Some entries are used without being read (e.g. artifacts whose hashes are
+    already verified), and file systems mounted with noatime never update
+    access times. A file's mtime is kept since caches use it to detect
+    changes. A directory's atime changes whenever it is listed (including by
+    pruning), so its mtime is used instead.
+    """
+    try:
+        if os.path.isdir(path):
+            os.utime(path, None)
+        else:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+    except OSError:
+        pass
+
+
+def _get_last_access(stat):
+    return max(stat.st_atime, stat.st_mtime)
+
+
+def _get_directory_item(tier, path):
+    size = 0
+    last_access = os.stat(path).st_mtime   # See mark_accessed().
+    for parent, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                stat = os.lstat(os.path.join(parent, filename))
+            except OSError:
+                continue
+            size += stat.st_size
+            last_access = max(last_access, _get_last_access(stat))
+    return CacheItem(tier, path, size, last_access, True)
+
+
+def _is_entry_file(name):
+    return not (
+        name.endswith(LOCK_SUFFIX) or name.startswith(TEMPORARY_FILE_PREFIX)
+    )
+
+
+def _iter_tier_items(cache_dir, tier, dirname, entries_are_directories):
+    root = os.path.join(cache_dir, dirname)
+    if not os.path.isdir(root):
+        return
+    if entries_are_directories:
+        for name in sorted(os.listdir(root)):
+            path = os.path.join(root, name)
+            if name.startswith(TEMPORARY_PREFIXES) or not os.path.isdir(path):
+                continue
+            try:
+                yield _get_directory_item(tier, path)
+            except OSError:     # Removed by another process.
+                continue
+        return
+    for parent, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if not _is_entry_file(filename):
+                continue
+            path = os.path.join(parent, filename)
+            try:
+                stat = os.lstat(path)
+            except OSError:
+                continue
+            yield CacheItem(
+                tier, path, stat.st_size, _get_last_access(stat), False,
+            )
+
+
+def _iter_metadata_items(cache_dir):
+    if not os.path.isdir(cache_dir):
+        return
+    for name in sorted(os.listdir(cache_dir)):
+        path = os.path.join(cache_dir, name)
+        if (not name.endswith(METADATA_EXTENSIONS) or
+                not _is_entry_file(name) or not os.path.isfile(path)):
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:     # Removed by another process.
+            continue
+        yield CacheItem(
+            METADATA_TIER, path, stat.st_size, _get_last_access(stat), False,
+        )
+
+
+def iter_cache_items(cache_dir):
+    """Iterate through prunable entries in the cache directory.
+    """
+    for item in _iter_metadata_items(cache_dir):
+        yield item
+    for tier, dirname, entries_are_directories in TIERS:
+        for item in _iter_tier_items(
+                cache_dir, tier, dirname, entries_are_directories):
+            yield item
+
+
+def get_tier_stats(cache_dir):
+    """Get the number of entries and total size of each tier.
+    """
+    counts = collections.OrderedDict(
+        (name, [0, 0]) for name in [METADATA_TIER] + [t[0] for t in TIERS]
+    )
+    for item in iter_cache_items(cache_dir):
+        counts[item.tier][0] += 1
+        counts[item.tier][1] += item.size
+    return [
+        TierStats(name, count, size)
+        for name, (count, size) in counts.items()
+    ]
+
+
+def _remove_item(item):
+    if not item.is_directory:
+        try:
+            os.unlink(item.path)
+        except OSError:
+            return False
+        return True
+    # Move the directory away first, so it disappears atomically for other
+    # processes, instead of being seen partially deleted.
+    parent = os.path.dirname(item.path)
+    trash = tempfile.mkdtemp(prefix=".passa-prune-", dir=parent)
+    try:
+        os.rename(item.path, os.path.join(trash, "entry"))
+    except OSError:
+        os.rmdir(trash)
+        return False
+    shutil.rmtree(trash, ignore_errors=True)
+    return True
+
+
+def _remove_stale_temporaries(cache_dir, deadline):
+    for _, dirname, _ in TIERS:
+        root = os.path.join(cache_dir, dirname)
+        if not os.path.isdir(root):
+            continue
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if not name.startswith(TEMPORARY_PREFIXES):
+                continue
+            try:
+                stale = os.stat(path).st_mtime < deadline
+            except OSError:
+                continue
+            if stale:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def prune(cache_dir, max_size=None, max_age=None, dry_run=False, now=None):
+    """Remove entries older than `max_age`, then least recently used entries
+    until the total size is within `max_size`.
+
+    `max_size` is in bytes, and `max_age` in seconds. Either can be None for
+    no limit. Returns a list of `CacheItem` removed (or would be removed, if
+    `dry_run` is true).
+    """
+    if now is None:
+        now = time.time()
+    items = sorted(iter_cache_items(cache_dir), key=lambda i: i.last_access)
+    protected_after = now - GRACE_PERIOD
+    total_size = sum(item.size for item in items)
+    removed = []
+    for item in items:
+        if item.last_access >= protected_after:
+            break   # Sorted, so everything after is also recent.
+        expired = max_age is not None and now - item.last_access > max_age
+        oversized = max_size is not None and total_size > max_size
+        if not expired and not oversized:
+            break
+        if dry_run or _remove_item(item):
+            removed.append(item)
+            total_size -= item.size
+    if not dry_run:
+        _remove_stale_temporaries(cache_dir, protected_after)
+    return removed
+
+
+def _read_counts(path):
+    counts = collections.Counter()
+    try:
+        f = io.open(path, encoding="utf-8")
+    except (IOError, OSError):
+        return counts
+    with f:
+        for line in f:
+            try:
+                counts.update(json.loads(line))
+            except (TypeError, ValueError):
+                continue    # Partially written by an interrupted process.
+    return counts
+
+
+class LookupStats(object):
+    """Count how dependency lookups are served, and persist the counts.
+
+    Each process appends one JSON line to the stats file on `flush()`.
+    Appends of a single short line do not interleave, so no locking is
+    needed between processes. When the file grows past `STATS_MAX_SIZE`, it
+    is compacted into a single line with the sums.
+    """
+    def __init__(self, cache_dir):
+        self.path = os.path.join(cache_dir, STATS_FILENAME)
+        self.counts = collections.Counter()
+
+    def record(self, label):
+        self.counts[label] += 1
+
+    def _append(self, counts):
+        line = json.dumps(dict(counts), sort_keys=True)
+        with io.open(self.path, "a", encoding="utf-8") as f:
+            f.write("{0}\n".format(line))
+
+    def _compact(self):
+        # Move the file aside first, so other processes append to a new one
+        # while this one is summed up. Counts appended to the old file while
+        # it is being read may be lost; they are only statistics.
+        compacting = "{0}.compact-{1}".format(self.path, os.getpid())
+        try:
+            os.rename(self.path, compacting)
+        except OSError:
+            return
+        try:
+            self._append(_read_counts(compacting))
+        finally:
+            os.unlink(compacting)
+
+    def flush(self):
+        if not self.counts:
+            return
+        try:
+            self._append(self.counts)
+            if os.path.getsize(self.path) > STATS_MAX_SIZE:
+                self._compact()
+        except (IOError, OSError):
+            return
+        self.counts.clear()
+
+
+def read_lookup_stats(cache_dir):
+    """Sum up counts persisted by `LookupStats` from all processes.
+    """
+    return _read_counts(os.path.join(cache_dir, STATS_FILENAME))
@@ -2,11 +2,23 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import collections
+
 import packaging.specifiers
 import packaging.version
 import requirementslib
 
-from ._pip import find_installation_candidates, get_vcs_ref
+from ._pip import (
+    find_cached_index_candidates, find_installation_candidates, get_vcs_ref,
+)
+from .dependencies import get_cached_versions
+from .utils import is_pinned
+
+
+# A version known from the local cache, in place of an index candidate.
+_CachedCandidate = collections.namedtuple("_CachedCandidate", [
+    "version", "requires_python",
+])
 
 
 def _filter_matching_python_requirement(candidates, required_python):
@@ -51,17 +63,41 @@ def _requirement_from_metadata(name, version, extras, index):
     return r
 
 
-def find_candidates(requirement, sources, requires_python, allow_prereleases):
+def _find_cached_candidates(requirement, sources, target):
+    candidates = find_cached_index_candidates(
+        requirement.name, sources, is_pinned(requirement.as_ireq()), target,
+    )
+    listed = {str(c.version) for c in candidates}
+    candidates.extend(
+        _CachedCandidate(version, requires_python)
+        for version, requires_python in sorted(
+            get_cached_versions(requirement.name).items(),
+        )
+        if version not in listed
+    )
+    return candidates
+
+
+def _version_key(version):
+    return packaging.version.parse(version)
+
+
+def find_candidates(requirement, sources, requires_python, allow_prereleases,
+                    offline=False, target=None):
     # A non-named requirement has exactly one candidate that is itself. For
-    # VCS, we also lock the requirement to an exact ref.
+    # VCS, we also lock the requirement to an exact ref, unless we are offline
+    # and can't reach the repository.
     if not requirement.is_named:
         candidate = _copy_requirement(requirement)
-        if candidate.is_vcs:
+        if candidate.is_vcs and not offline:
             candidate.req.ref = get_vcs_ref(candidate)
         return [candidate]
 
     ireq = requirement.as_ireq()
-    icans = find_installation_candidates(ireq, sources)
+    if offline:
+        icans = _find_cached_candidates(requirement, sources, target)
+    else:
+        icans = find_installation_candidates(ireq, sources, target=target)
 
     if requires_python:
         matching_icans = list(_filter_matching_python_requirement(
@@ -69,13 +105,15 @@ def find_candidates(requirement, sources, requires_python, allow_prereleases):
         ))
         icans = matching_icans or icans
 
+    # Versions are compared as strings. The requirement's specifier may come
+    # from pip's vendored packaging, which only accepts its own version objects.
     versions = sorted(ireq.specifier.filter(
-        (c.version for c in icans), allow_prereleases,
-    ))
+        (str(c.version) for c in icans), allow_prereleases,
+    ), key=_version_key)
     if not allow_prereleases and not versions:
         versions = sorted(ireq.specifier.filter(
-            (c.version for c in icans), True,
-        ))
+            (str(c.version) for c in icans), True,
+        ), key=_version_key)
 
     name = requirement.normalized_name
     extras = requirement.extras
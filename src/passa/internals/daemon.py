@@ -0,0 +1,382 @@
+# -*- coding=utf-8 -*-
+
+"""A long-running server to run commands with warm caches.
+
+The server listens on a Unix socket, and runs commands forwarded by the
+CLI in its own process. Modules (pip, requirementslib, etc.) are imported
+once, and in-memory caches and HTTP sessions are kept between commands.
+
+The protocol is newline-delimited JSON. The client sends one request, and
+the server replies with any number of output messages, followed by a status
+message::
+
+    -> {"argv": ["lock"], "cwd": "/path", "environ": {...}, ...}
+    <- {"stream": "stdout", "text": "..."}
+    <- {"status": 0}
+
+The server handles one request at a time, since commands change the working
+directory and redirect the standard streams of the whole process. Requests
+made with a different interpreter, passa version, or environment variables
+affecting commands are refused, and the client runs the command itself.
+
+The socket is in ``$XDG_RUNTIME_DIR``, or a directory in the temporary
+directory only accessible to the user. The client only connects to a socket
+owned by the user.
+
+This module only imports from the standard library, so the CLI can forward
+commands without paying for heavy imports.
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import contextlib
+import errno
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+import traceback
+
+
+# Commands forwarded to a running server. Commands changing the environment
+# (e.g. sync) are not, since the server's view of installed packages is
+# built when it starts, and would be stale after the first change.
+FORWARDED_COMMANDS = {"lock", "freeze"}
+
+
+# Environment variables affecting what commands do. Many are only read when
+# modules are imported, so they can't be changed for a request.
+_ENVIRON_PREFIXES = ("PASSA_", "PIP_")
+_ENVIRON_NAMES = {
+    "HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "NO_PROXY",
+    "REQUESTS_CA_BUNDLE", "CURL_CA_BUNDLE", "SSL_CERT_FILE", "SSL_CERT_DIR",
+    "NETRC", "XDG_CACHE_HOME", "XDG_CONFIG_HOME",
+}
+_ENVIRON_IGNORED = {"PASSA_NO_DAEMON", "PASSA_DAEMON_SOCKET"}
+
+
+def _get_environ():
+    return {
+        key: value for key, value in os.environ.items()
+        if (key.upper().startswith(_ENVIRON_PREFIXES) or
+            key.upper() in _ENVIRON_NAMES) and key not in _ENVIRON_IGNORED
+    }
+
+
+def _check_owner(path, private=False):
+    """Raise `OSError` unless the path is owned by the current user.
+
+    If `private` is true, the path must also not be accessible to others.
+    Symbolic links are not followed.
+    """
+    st = os.lstat(path)
+    if st.st_uid != os.getuid() or (private and st.st_mode & 0o077):
+        raise OSError(errno.EPERM, "not private to the current user", path)
+    return st
+
+
+def _get_socket_dir(create):
+    directory = os.environ.get("XDG_RUNTIME_DIR")
+    if directory and os.path.isdir(directory):
+        return directory
+    directory = os.path.join(tempfile.gettempdir(), "passa-{0}".format(
+        os.getuid(),
+    ))
+    if create:
+        try:
+            os.mkdir(directory, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+    # The temporary directory is shared. Don't use a directory created by
+    # someone else, or a symbolic link to one.
+    if not stat.S_ISDIR(_check_owner(directory, private=True).st_mode):
+        raise OSError(errno.ENOTDIR, "not a directory", directory)
+    return directory
+
+
+def get_socket_path(create=False):
+    """Get the path of the server's socket.
+
+    The directory containing it is only created if `create` is true, so
+    clients looking for a server don't leave directories behind.
+
+    Raises `OSError` if there is no directory only accessible to the user to
+    put it in.
+    """
+    try:
+        return os.environ["PASSA_DAEMON_SOCKET"]
+    except KeyError:
+        pass
+    return os.path.join(_get_socket_dir(create), "passa-daemon.sock")
+
+
+def is_supported():
+    return hasattr(socket, "AF_UNIX")
+
+
+def _get_version():
+    from passa import __version__
+    return __version__
+
+
+def _send(connection, message):
+    data = json.dumps(message) + "\n"
+    connection.sendall(data.encode("utf-8"))
+
+
+def _iter_messages(connection):
+    with contextlib.closing(connection.makefile("rb")) as f:
+        for line in f:
+            yield json.loads(line.decode("utf-8"))
+
+
+def _read_message(connection):
+    with contextlib.closing(connection.makefile("rb")) as f:
+        line = f.readline()
+    if not line:
+        return None
+    return json.loads(line.decode("utf-8"))
+
+
+def _connect(path):
+    # Only talk to a server run by the same user, which can see our
+    # environment and output anyway.
+    _check_owner(path)
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+    except (OSError, socket.error):
+        connection.close()
+        raise
+    return connection
+
+
+def _request(message, path=None):
+    """Send a request, and iterate through replies.
+
+    Raises `socket.error` (`OSError`) if the server is not running, or is
+    not run by the current user.
+    """
+    connection = _connect(path or get_socket_path())
+    try:
+        _send(connection, message)
+        for reply in _iter_messages(connection):
+            yield reply
+    finally:
+        connection.close()
+
+
+def forward(argv, path=None):
+    """Run a command in the server, if it is running.
+
+    Output is written to this process's standard streams. Returns the exit
+    status, or None if the command is not run by the server, so the caller
+    should run it itself.
+    """
+    if not is_supported() or os.environ.get("PASSA_NO_DAEMON"):
+        return None
+    request = {
+        "argv": list(argv), "cwd": os.getcwd(), "environ": _get_environ(),
+        "executable": sys.executable, "version": _get_version(),
+    }
+    streams = {"stdout": sys.stdout, "stderr": sys.stderr}
+    try:
+        for reply in _request(request, path):
+            if "error" in reply:
+                return None
+            if "status" in reply:
+                return reply["status"]
+            stream = streams[reply["stream"]]
+            stream.write(reply["text"])
+            stream.flush()
+    except (OSError, socket.error, ValueError):
+        return None
+    # Replies ended without a status; the server died mid-command.
+    print("passa daemon stopped unexpectedly", file=sys.stderr)
+    return 1
+
+
+def ping(path=None):
+    """Get the PID of the running server, or None if it is not running.
+    """
+    try:
+        for reply in _request({"command": "ping"}, path):
+            return reply.get("pid")
+    except (OSError, socket.error, ValueError):
+        return None
+
+
+def stop(path=None):
+    """Stop the running server. Returns whether a server was running.
+    """
+    try:
+        for _ in _request({"command": "stop"}, path):
+            return True
+    except (OSError, socket.error, ValueError):
+        return False
+    return False
+
+
+class _StreamWriter(object):
+    """A file-like object sending writes to the client.
+    """
+    encoding = "utf-8"
+
+    def __init__(self, connection, name):
+        self.connection = connection
+        self.name = name
+
+    def write(self, text):
+        if isinstance(text, bytes):
+            text = text.decode(self.encoding, "replace")
+        if text:
+            _send(self.connection, {"stream": self.name, "text": text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def _run_command(argv):
+    from passa.cli import main
+    try:
+        result = main(argv)
+    except SystemExit as e:
+        result = e.code
+    except Exception:
+        traceback.print_exc()
+        return 1
+    if result is None:
+        return 0
+    if not isinstance(result, int):
+        print(result, file=sys.stderr)
+        return 1
+    return result
+
+
+def _forget_request_state():
+    """Drop in-memory state that may be stale for the next request.
+
+    Index pages and hashes can change on the index between requests, unlike
+    metadata of a released version.
+    """
+    from passa.internals._pip import forget_finders, forget_index_pages
+    from passa.internals.dependencies import forget_json_api_misses
+    from passa.internals.hashes import forget_hashes
+    forget_finders()
+    forget_index_pages()
+    forget_json_api_misses()
+    forget_hashes()
+
+
+def _handle(connection, environ):
+    """Handle a request. Returns False if the server should stop.
+
+    `environ` holds the server's environment variables affecting commands.
+    """
+    try:
+        request = _read_message(connection)
+    except ValueError:
+        request = None
+    if not request:
+        return True
+    command = request.get("command")
+    if command == "stop":
+        _send(connection, {"status": 0})
+        return False
+    if command == "ping":
+        _send(connection, {"status": 0, "pid": os.getpid()})
+        return True
+    if (request.get("executable") != sys.executable or
+            request.get("version") != _get_version() or
+            request.get("environ") != environ):
+        _send(connection, {"error": "environment mismatch"})
+        return True
+
+    cwd = os.getcwd()
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = _StreamWriter(connection, "stdout")
+    sys.stderr = _StreamWriter(connection, "stderr")
+    try:
+        os.chdir(request["cwd"])
+        status = _run_command(request["argv"])
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+        os.chdir(cwd)
+        _forget_request_state()
+    _send(connection, {"status": status})
+    return True
+
+
+def _warm_up():
+    # Import everything commands need, and load on-disk caches into memory.
+    import passa.cli
+    import passa.internals.dependencies
+    import passa.models.lockers
+    import passa.models.synchronizers
+    passa.internals.dependencies.DEPENDENCY_CACHE.read_cache()
+
+
+def serve(path=None):
+    """Run the server until stopped.
+
+    Raises `RuntimeError` if another server is running on the socket, or the
+    socket can't be created.
+    """
+    try:
+        path = path or get_socket_path(create=True)
+    except OSError as e:
+        raise RuntimeError("unable to create passa daemon socket ({0})".format(
+            e,
+        ))
+    if ping(path) is not None:
+        raise RuntimeError("passa daemon is already running on {0}".format(
+            path,
+        ))
+    if os.path.lexists(path):
+        try:
+            os.unlink(path)     # Left by a server that did not exit cleanly.
+        except OSError as e:
+            raise RuntimeError("unable to remove {0} ({1})".format(path, e))
+
+    environ = _get_environ()
+    # Commands run in this process must not be forwarded to itself.
+    os.environ["PASSA_NO_DAEMON"] = "1"
+    _warm_up()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)     # Only the owner can connect.
+    try:
+        server.bind(path)
+    except (OSError, socket.error) as e:
+        server.close()
+        raise RuntimeError("unable to listen on {0} ({1})".format(path, e))
+    finally:
+        os.umask(umask)
+    server.listen(5)
+    print("passa daemon listening on {0}".format(path))
+    try:
+        while True:
+            connection, _ = server.accept()
+            try:
+                running = _handle(connection, environ)
+            except (OSError, socket.error):
+                running = True  # Client went away.
+            finally:
+                connection.close()
+            if not running:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
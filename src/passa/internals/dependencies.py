@@ -2,43 +2,333 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import atexit
+import copy
 import functools
+import hashlib
+import io
+import itertools
+import json
+import multiprocessing.pool
 import os
+import re
 import sys
 
+import distlib.metadata
+import packaging.markers
 import packaging.specifiers
 import packaging.utils
 import packaging.version
 import requests
+import requests.adapters
 import requirementslib
+import requirementslib.models.requirements
 import six
-
-from ..models.caches import DependencyCache, RequiresPythonCache
-from ._pip import WheelBuildError, build_wheel, read_sdist_metadata
+import vistir
+
+from ..models.caches import (
+    CACHE_DIR, ArtifactDependencyCache, DependencyCache,
+    ParsedRequirementCache, RequiresPythonCache, SharedDependencyCache,
+    flush_together, write_caches,
+)
+from .artifacts import get_file_digest, get_tree_digest
+from .cachetiers import LookupStats
+from ._pip import (
+    WheelBuildError, build_wheel, find_wheel_identity,
+    get_wheel_link_identity, read_metadata_file, read_remote_wheel_metadata,
+    read_sdist_metadata,
+)
+from . import profiling
 from .markers import contains_extra, get_contained_extras, get_without_extra
-from .utils import get_pinned_version, is_pinned
+from .utils import LRUCache, get_env_number, get_pinned_version, is_pinned
 
 
 DEPENDENCY_CACHE = DependencyCache()
 REQUIRES_PYTHON_CACHE = RequiresPythonCache()
+ARTIFACT_DEPENDENCY_CACHE = ArtifactDependencyCache()
+SHARED_DEPENDENCY_CACHE = SharedDependencyCache()
+
+# Parsed parts are only valid for the parser that produced them. Bump the
+# first part when `_requirement_from_parts()` changes.
+PARSED_PARTS_VERSION = "1:{0}".format(requirementslib.__version__)
+PARSED_REQUIREMENT_CACHE = ParsedRequirementCache(
+    version=PARSED_PARTS_VERSION,
+)
+
+# How lookups are served, reported by `passa cache stats`.
+LOOKUP_STATS = LookupStats(CACHE_DIR)
+
+# Bump this when the rules in `_is_cache_broken()` change, so entries
+# validated under the old rules are checked again.
+CACHE_SCHEMA_VERSION = 1
+
+# Dependency lines are parsed once per run, however many times they are seen.
+_PARSED_LINES = LRUCache(4096)
+
+# Parts of lines parsed in this run, not yet written to the persistent cache.
+_UNSAVED_PARSED_PARTS = {}
+
+
+def _get_requirement_parts(requirement):
+    """Break a parsed requirement into parts to be rebuilt from later.
+
+    Only plain named requirements are supported. Returns None otherwise.
+    """
+    if not requirement.is_named or requirement.editable or requirement.hashes:
+        return None
+    return (
+        requirement.name,
+        requirement.specifiers or "",
+        tuple(requirement.extras or ()),
+        requirement.markers or None,
+    )
+
+
+def _requirement_from_parts(parts):
+    """Rebuild a requirement in the same shape `Requirement.from_line()` does.
+
+    This skips the line parser's string splitting, and checks for paths and
+    URLs, which are not needed for a plain named requirement.
+    """
+    name, specifier, extras, markers = parts
+    extras = list(extras)
+    named = requirementslib.models.requirements.NamedRequirement(
+        name=name, version=specifier or None, extras=extras or None,
+    )
+    named.req.marker = packaging.markers.Marker(markers) if markers else None
+    named.req.local_file = False
+    kwargs = {"name": name, "req": named, "markers": markers, "editable": False}
+    if extras:
+        named.req.extras = extras
+        named.extras = extras
+        kwargs["extras"] = extras
+    return requirementslib.Requirement(**kwargs)
+
+
+def _get_requirement_signature(requirement):
+    return (
+        requirement.as_line(include_hashes=False),
+        requirement.is_named, requirement.normalized_name,
+        requirement.specifiers, requirement.extras_as_pip,
+        requirement.markers,
+    )
+
+
+def _verify_requirement_parts(requirement, parts):
+    """Check a requirement rebuilt from `parts` matches the parsed one.
+    """
+    try:
+        rebuilt = _requirement_from_parts(parts)
+    except Exception:
+        return False
+    return (
+        _get_requirement_signature(rebuilt) ==
+        _get_requirement_signature(requirement)
+    )
+
+
+def _parse_requirement_line(line):
+    """Parse a dependency line into a requirementslib Requirement.
+
+    The parsed parts of each line are persisted, so a line seen in previous
+    runs does not need to go through the full parser again. Parts are only
+    saved if the requirement rebuilt from them matches the parsed one, and
+    are discarded when requirementslib is upgraded.
+
+    The result is shared between calls, and must not be modified. Use
+    `copy.deepcopy()` if you need to; `Requirement.copy()` is shallow, and
+    the copy would still share the underlying requirement.
+    """
+    requirement = _PARSED_LINES.get(line)
+    if requirement is not None:
+        return requirement
+    saved_parts = PARSED_REQUIREMENT_CACHE.get(line)
+    if isinstance(saved_parts, tuple) and len(saved_parts) == 4:
+        try:
+            requirement = _requirement_from_parts(saved_parts)
+        except Exception:
+            requirement = None
+    if requirement is None:
+        requirement = requirementslib.Requirement.from_line(line)
+        parts = _get_requirement_parts(requirement)
+        if parts is not None and _verify_requirement_parts(requirement, parts):
+            _UNSAVED_PARSED_PARTS[line] = parts
+    _PARSED_LINES[line] = requirement
+    return requirement
+
+
+def parse_dependencies(lines):
+    """Parse dependency lines into requirementslib Requirements.
+
+    Each result is a copy, so the caller may modify it.
+    """
+    return [copy.deepcopy(_parse_requirement_line(line)) for line in lines]
+
+
+def _save_parsed_requirement_parts():
+    if not _UNSAVED_PARSED_PARTS:
+        return
+    PARSED_REQUIREMENT_CACHE.update(_UNSAVED_PARSED_PARTS)
+    _UNSAVED_PARSED_PARTS.clear()
+
+
+def flush_caches():
+    """Write cache entries and lookup stats recorded in memory to disk.
+
+    Each write of a cache re-reads and rewrites its whole file, so this is
+    done once after locking, instead of on every change.
+    """
+    try:
+        _save_parsed_requirement_parts()
+    except (IOError, OSError) as e:
+        print("unable to read cache ({0})".format(e))
+    # Entries and checksums of pinned dependencies are checked against each
+    # other, so they are written together.
+    try:
+        flush_together([REQUIRES_PYTHON_CACHE, DEPENDENCY_CACHE])
+    except (IOError, OSError) as e:
+        print("unable to write cache ({0})".format(e))
+    for cache in (ARTIFACT_DEPENDENCY_CACHE, SHARED_DEPENDENCY_CACHE,
+                  PARSED_REQUIREMENT_CACHE):
+        try:
+            cache.flush()
+        except (IOError, OSError) as e:
+            print("unable to write cache ({0})".format(e))
+    LOOKUP_STATS.flush()
+
+
+atexit.register(flush_caches)
+
+
+def _build_json_api_session(pool_size):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# A shared session keeps connections to the indexes alive between lookups.
+JSON_API_POOL_SIZE = get_env_number(
+    "PASSA_JSON_API_POOL_SIZE", 10, minimum=1,
+)
+JSON_API_SESSION = _build_json_api_session(JSON_API_POOL_SIZE)
+
+# URLs that answered 404 in this run, so we don't ask again. Each URL is for
+# one package version on one index; private indexes answer 404 for packages
+# they do not host, which says nothing about other packages.
+_JSON_API_MISSES = set()
 
+_json_api_thread_pool = None
 
-def _cached(f, **kwargs):
 
+def _get_json_api_thread_pool():
+    global _json_api_thread_pool
+    if _json_api_thread_pool is None:
+        _json_api_thread_pool = multiprocessing.pool.ThreadPool(
+            JSON_API_POOL_SIZE,
+        )
+    return _json_api_thread_pool
+
+
+def _get_shared_cache_key(ireq, identity):
+    name = packaging.utils.canonicalize_name(ireq.name)
+    return (name, identity, ireq.extras or ())
+
+
+def _get_wheel_identity(ireq, sources):
+    identity = get_wheel_link_identity(ireq.link)
+    if identity is not None or ireq.link is not None:
+        return identity
+    # The getter did not look the artifact up, e.g. the JSON API.
+    try:
+        return find_wheel_identity(ireq, sources)
+    except Exception:
+        return None
+
+
+def _cached(f, artifact_key=None, shared=False, **kwargs):
+    """Wrap a getter to cache its results.
+
+    If `shared` is true, and the result was read from a wheel (as opposed to
+    a source build), it is also cached for other Python versions to use,
+    keyed by the wheel this interpreter would use.
+    """
     @functools.wraps(f)
     def wrapped(ireq):
         result = f(ireq, **kwargs)
-        if result is not None and is_pinned(ireq):
-            deps, requires_python = result
-            DEPENDENCY_CACHE[ireq] = deps
-            REQUIRES_PYTHON_CACHE[ireq] = requires_python
+        if result is None:
+            return result
+        deps, requires_python = result
+        if is_pinned(ireq):
+            _set_cached_dependencies(ireq, deps, requires_python)
+            identity = (
+                _get_wheel_identity(ireq, kwargs["sources"])
+                if shared else None
+            )
+            if identity is not None:
+                key = _get_shared_cache_key(ireq, identity)
+                SHARED_DEPENDENCY_CACHE[key] = [deps, requires_python]
+        elif artifact_key is not None:
+            ARTIFACT_DEPENDENCY_CACHE[artifact_key] = [deps, requires_python]
         return result
 
     return wrapped
 
 
+_VCS_COMMIT_RE = re.compile(r"^[0-9a-f]{40}$")
+
+
+def _get_artifact_identity(requirement, ireq):
+    """Identify the exact artifact a non-pinned requirement points to.
+
+    * A VCS requirement is identified by its repository and commit. This is
+      only possible after the ref is resolved to a commit.
+    * A local file is identified by its content hash.
+    * A local directory is identified by the hash of its files' content.
+    * A remote URL is identified by the hash in its fragment, if present.
+
+    Returns None if the requirement cannot be identified.
+    """
+    if requirement.is_vcs:
+        ref = requirement.req.ref
+        if not ref or not _VCS_COMMIT_RE.match(ref):
+            return None
+        identity = "{0}@{1}".format(requirement.req.vcs_uri, ref)
+        subdirectory = getattr(requirement.req, "subdirectory", None)
+        if subdirectory:
+            identity = "{0}#subdirectory={1}".format(identity, subdirectory)
+        return identity
+    link = ireq.link
+    if link is None:
+        return None
+    if link.scheme != "file":
+        if not link.hash:
+            return None
+        return "{0}:{1}".format(link.hash_name, link.hash)
+    path = vistir.path.url_to_path(link.url_without_fragment)
+    if os.path.isfile(path):
+        return "sha256:{0}".format(get_file_digest(path))
+    elif os.path.isdir(path):
+        return "tree-sha256:{0}".format(get_tree_digest(path))
+    return None
+
+
+def _get_artifact_key(requirement, ireq):
+    if os.environ.get("PASSA_IGNORE_LOCAL_CACHE"):
+        return None
+    if requirement.is_named or is_pinned(ireq):
+        return None
+    identity = _get_artifact_identity(requirement, ireq)
+    if identity is None:
+        return None
+    return (requirement.normalized_name, identity, ireq.extras or ())
+
+
 def _is_cache_broken(line, parent_name):
-    dep_req = requirementslib.Requirement.from_line(line)
+    dep_req = _parse_requirement_line(line)
     if contains_extra(dep_req.markers):
         return True     # The "extra =" marker breaks everything.
     elif dep_req.normalized_name == parent_name:
@@ -46,6 +336,54 @@ def _is_cache_broken(line, parent_name):
     return False
 
 
+def _get_cache_checksum(deps, pyrq):
+    data = json.dumps([CACHE_SCHEMA_VERSION, deps, pyrq], sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _is_cache_valid(name, deps, pyrq):
+    """Check whether cached dependencies of package `name` can be used.
+    """
+    try:
+        packaging.specifiers.SpecifierSet(pyrq)
+        name = packaging.utils.canonicalize_name(name)
+        return not any(_is_cache_broken(line, name) for line in deps)
+    except Exception:
+        return False
+
+
+def _set_cached_dependencies(ireq, deps, pyrq):
+    """Cache dependencies of a pinned requirement.
+
+    The entry is validated as it is written, and its checksum recorded if it
+    is valid, so reading it back does not need to validate or write again.
+    """
+    DEPENDENCY_CACHE[ireq] = deps
+    REQUIRES_PYTHON_CACHE[ireq] = pyrq
+    if _is_cache_valid(ireq.name, deps, pyrq):
+        DEPENDENCY_CACHE.set_checksum(ireq, _get_cache_checksum(deps, pyrq))
+
+
+class DependencyCacheMiss(LookupError):
+    """Raised in offline mode if dependencies are not found in local caches.
+    """
+
+
+def get_cached_versions(name):
+    """Get versions of a package with dependencies in the local cache.
+
+    Returns a dict mapping each version to its cached Requires-Python.
+    """
+    key = name.replace("_", "-").lower()    # Same as cache keys.
+    requires_pythons = REQUIRES_PYTHON_CACHE.cache.get(key, {})
+    versions = {}
+    for version_and_extras in DEPENDENCY_CACHE.cache.get(key, {}):
+        version = version_and_extras.split("[", 1)[0]
+        if version not in versions:
+            versions[version] = requires_pythons.get(version_and_extras, "")
+    return versions
+
+
 def _get_dependencies_from_cache(ireq):
     """Retrieves dependencies for the requirement from the dependency cache.
     """
@@ -59,28 +397,58 @@ def _get_dependencies_from_cache(ireq):
     except KeyError:
         return
 
-    # Preserving sanity: Run through the cache and make sure every entry if
-    # valid. If this fails, something is wrong with the cache. Drop it.
-    try:
-        packaging.specifiers.SpecifierSet(pyrq)
-        ireq_name = packaging.utils.canonicalize_name(ireq.name)
-        if any(_is_cache_broken(line, ireq_name) for line in deps):
-            broken = True
-        else:
-            broken = False
-    except Exception:
-        broken = True
+    # Entries validated under the current rules when they were written are
+    # trusted, as long as they have not changed since.
+    if DEPENDENCY_CACHE.get_checksum(ireq) == _get_cache_checksum(deps, pyrq):
+        return deps, pyrq
 
-    if broken:
+    # Preserving sanity: Entries written without a checksum, e.g. by older
+    # versions, are validated once. A valid entry gets its checksum recorded,
+    # so later reads trust it; a broken one is dropped.
+    if not _is_cache_valid(ireq.name, deps, pyrq):
         print("dropping broken cache for {0}".format(ireq.name))
         del DEPENDENCY_CACHE[ireq]
         del REQUIRES_PYTHON_CACHE[ireq]
         return
+    DEPENDENCY_CACHE.set_checksum(ireq, _get_cache_checksum(deps, pyrq))
+    return deps, pyrq
+
 
+def _get_dependencies_from_artifact_cache(ireq, artifact_key):
+    """Retrieves dependencies of a non-pinned requirement from cache.
+
+    See `_get_artifact_identity()` for how the artifact is identified.
+    """
+    if artifact_key is None:
+        return
+    entry = ARTIFACT_DEPENDENCY_CACHE.get(artifact_key)
+    if entry is None:
+        return
+    deps, pyrq = entry
     return deps, pyrq
 
 
-def _get_dependencies_from_json_url(url, session):
+def _get_dependencies_from_shared_cache(ireq, sources):
+    """Retrieves dependencies from the cache shared between Python versions.
+
+    This finds the wheel this interpreter would use, and looks up the result
+    recorded for it, possibly by another Python version.
+    """
+    if os.environ.get("PASSA_IGNORE_LOCAL_CACHE"):
+        return
+    if not is_pinned(ireq):
+        return
+    identity = find_wheel_identity(ireq, sources)
+    if identity is None:
+        return
+    entry = SHARED_DEPENDENCY_CACHE.get(_get_shared_cache_key(ireq, identity))
+    if entry is None:
+        return
+    deps, pyrq = entry
+    return deps, pyrq
+
+
+def _get_dependencies_from_json_url(url, session, extras):
     response = session.get(url)
     response.raise_for_status()
     info = response.json()["info"]
@@ -94,25 +462,49 @@ def _get_dependencies_from_json_url(url, session):
     # The JSON API returns null both when there are not requirements, or the
     # requirement list cannot be retrieved. We can't safely assume, so it's
     # better to drop it and fall back to downloading the package.
-    try:
-        dependency_requirements_iterator = (
-            requirementslib.Requirement.from_line(line)
-            for line in requirement_lines
-        )
-    except TypeError:
+    if requirement_lines is None:
         return
 
     dependencies = [
-        dep_req.as_line(include_hashes=False)
-        for dep_req in dependency_requirements_iterator
-        if not contains_extra(dep_req.markers)
+        line for line in (
+            _filter_requirement_line(line, extras)
+            for line in requirement_lines
+        )
+        if line is not None
     ]
     return dependencies, requires_python
 
 
+def forget_json_api_misses():
+    """Forget URLs the JSON API failed on, so they are tried again.
+    """
+    _JSON_API_MISSES.clear()
+
+
+def _fetch_dependencies_from_json_url(url, extras):
+    if url in _JSON_API_MISSES:
+        return None
+    try:
+        return _get_dependencies_from_json_url(url, JSON_API_SESSION, extras)
+    except Exception as e:
+        # Timeouts and server errors may be temporary. Only give up on the
+        # URL if the index does not know about it at all.
+        response = getattr(e, "response", None)
+        if response is not None and response.status_code == 404:
+            _JSON_API_MISSES.add(url)
+        print("unable to read dependencies via {0} ({1})".format(url, e))
+    return None
+
+
 def _get_dependencies_from_json(ireq, sources):
     """Retrieves dependencies for the install requirement from the JSON API.
 
+    Indexes are queried in order, unless `PASSA_JSON_API_CONCURRENT` is set,
+    in which case all of them are queried at once, and the first valid answer
+    is used. Requirements for extras are selected with the same logic used to
+    read wheel metadata, so the result is cached under the extras-qualified
+    key like any other getter's.
+
     :param ireq: A single InstallRequirement
     :type ireq: :class:`~pip._internal.req.req_install.InstallRequirement`
     :return: A set of dependency lines for generating new InstallRequirements.
@@ -121,11 +513,6 @@ def _get_dependencies_from_json(ireq, sources):
     if os.environ.get("PASSA_IGNORE_JSON_API"):
         return
 
-    # It is technically possible to parse extras out of the JSON API's
-    # requirement format, but it is such a chore let's just use the simple API.
-    if ireq.extras:
-        return
-
     try:
         version = get_pinned_version(ireq)
     except ValueError:
@@ -140,23 +527,50 @@ def _get_dependencies_from_json(ireq, sources):
         if proc_url.endswith("/simple")
     ]
 
-    session = requests.session()
-
-    for prefix in url_prefixes:
-        url = "{prefix}/pypi/{name}/{version}/json".format(
+    urls = [
+        "{prefix}/pypi/{name}/{version}/json".format(
             prefix=prefix,
             name=packaging.utils.canonicalize_name(ireq.name),
             version=version,
         )
-        try:
-            dependencies = _get_dependencies_from_json_url(url, session)
-            if dependencies is not None:
-                return dependencies
-        except Exception as e:
-            print("unable to read dependencies via {0} ({1})".format(url, e))
+        for prefix in url_prefixes
+    ]
+
+    fetch = functools.partial(
+        _fetch_dependencies_from_json_url, extras=ireq.extras or (),
+    )
+    if len(urls) > 1 and os.environ.get("PASSA_JSON_API_CONCURRENT"):
+        results = _get_json_api_thread_pool().imap_unordered(fetch, urls)
+    else:
+        results = (fetch(url) for url in urls)
+    for dependencies in results:
+        if dependencies is not None:
+            return dependencies
     return
 
 
+def _filter_requirement_line(line, extras):
+    """Evaluate the "extra == ..." part of a requirement line's markers.
+
+    Returns None if the requirement is only needed for extras not in
+    `extras`. Otherwise the line is returned, with the "extra" part stripped,
+    and normalized (e.g. "bar (>=1)" from the JSON API becomes "bar>=1").
+
+    The extra extraction is not comprehensive. Tt assumes the marker is NEVER
+    something like `extra == "foo" and extra == "bar"`. I guess this never
+    makes sense anyway? Markers are just terrible.
+    """
+    r = requirementslib.Requirement.from_line(line)
+    if not r.markers:
+        return r.as_line(include_hashes=False)
+    contained = get_contained_extras(r.markers)
+    if (contained and not any(e in contained for e in extras)):
+        return None
+    marker = get_without_extra(r.markers)
+    r.markers = str(marker) if marker else None
+    return r.as_line(include_hashes=False)
+
+
 def _read_requirements(metadata, extras):
     """Read wheel metadata to know what it depends on.
 
@@ -165,10 +579,6 @@ def _read_requirements(metadata, extras):
     requirements are for a specific extra. Unfortunately, not all fields are
     specificed like this (I don't know why); some are specified with markers.
     So we jump though these terrible hoops to know exactly what we need.
-
-    The extra extraction is not comprehensive. Tt assumes the marker is NEVER
-    something like `extra == "foo" and extra == "bar"`. I guess this never
-    makes sense anyway? Markers are just terrible.
     """
     extras = extras or ()
     requirements = []
@@ -181,15 +591,9 @@ def _read_requirements(metadata, extras):
         if extra is not None and extra not in extras:
             continue
         for line in entry.get("requires", []):
-            r = requirementslib.Requirement.from_line(line)
-            if r.markers:
-                contained = get_contained_extras(r.markers)
-                if (contained and not any(e in contained for e in extras)):
-                    continue
-                marker = get_without_extra(r.markers)
-                r.markers = str(marker) if marker else None
-                line = r.as_line(include_hashes=False)
-            requirements.append(line)
+            line = _filter_requirement_line(line, extras)
+            if line is not None:
+                requirements.append(line)
     return requirements
 
 
@@ -214,6 +618,48 @@ def _read_requires_python(metadata):
     return ""
 
 
+def _read_metadata_text(text, extras):
+    metadata = distlib.metadata.Metadata(
+        fileobj=io.StringIO(text), scheme="legacy",
+    )
+    requirements = _read_requirements(metadata, extras or ())
+    requires_python = _read_requires_python(metadata)
+    return requirements, requires_python
+
+
+def _get_dependencies_from_metadata_file(ireq, sources):
+    """Retrieves dependencies from the metadata file served by the index.
+
+    Indexes implementing PEP 658 serve a wheel's METADATA as a separate file,
+    so we don't need to download the whole wheel to read dependencies.
+    """
+    if os.environ.get("PASSA_IGNORE_METADATA_FILE"):
+        return
+    if not is_pinned(ireq):
+        return
+    text = read_metadata_file(ireq, sources)
+    if text is None:
+        return
+    return _read_metadata_text(text, ireq.extras)
+
+
+def _get_dependencies_from_lazy_wheel(ireq, sources):
+    """Retrieves dependencies by reading a remote wheel's METADATA lazily.
+
+    HTTP range requests are used to only download parts of the wheel needed
+    to read METADATA. If the server does not support this, this returns None
+    so the next getter downloads the whole wheel instead.
+    """
+    if os.environ.get("PASSA_IGNORE_LAZY_WHEEL"):
+        return
+    if not is_pinned(ireq):
+        return
+    text = read_remote_wheel_metadata(ireq, sources)
+    if text is None:
+        return
+    return _read_metadata_text(text, ireq.extras)
+
+
 def _get_dependencies_from_pip(ireq, sources):
     """Retrieves dependencies for the requirement from pip internals.
 
@@ -241,30 +687,135 @@ def _get_dependencies_from_pip(ireq, sources):
     return requirements, requires_python
 
 
-def get_dependencies(requirement, sources):
+# Imported entries cover every combination of up to this many extras. More
+# are rarely requested together, and the number of combinations explodes.
+IMPORT_MAX_EXTRAS = 3
+
+
+def _iter_extras_combinations(extras):
+    extras = sorted(set(extras))
+    for size in range(min(len(extras), IMPORT_MAX_EXTRAS) + 1):
+        for combination in itertools.combinations(extras, size):
+            yield combination
+
+
+def _get_lines_by_extras(requires_dist, extras):
+    """Filter requirement lines once, so they can be combined for any extras.
+
+    Returns a list of `(line, needed_by)`, where `needed_by` is None if the
+    line is always needed, or otherwise the set of extras that need it.
+    """
+    lines = []
+    for line in requires_dist:
+        filtered = _filter_requirement_line(line, ())
+        if filtered is not None:
+            lines.append((filtered, None))
+            continue
+        needed_by = set()
+        for extra in extras:
+            filtered_for_extra = _filter_requirement_line(line, (extra,))
+            if filtered_for_extra is not None:
+                filtered = filtered_for_extra
+                needed_by.add(extra)
+        if needed_by:
+            lines.append((filtered, needed_by))
+    return lines
+
+
+def import_dependencies(records):
+    """Populate dependency caches from `mirrors.MetadataRecord` instances.
+
+    An entry is added for each package, and for the package with each
+    combination of its declared extras (up to `IMPORT_MAX_EXTRAS` at once).
+    Both caches are written together, only after all records are read.
+
+    Returns the number of records imported.
+    """
+    dependency_entries = []
+    requires_python_entries = []
+    checksums = {}
+    count = 0
+    for record in records:
+        lines = _get_lines_by_extras(record.requires_dist, record.extras)
+        for extras in _iter_extras_combinations(record.extras):
+            key = (record.name, record.version, extras)
+            dependencies = [
+                line for line, needed_by in lines
+                if needed_by is None or needed_by.intersection(extras)
+            ]
+            dependency_entries.append((key, dependencies))
+            requires_python_entries.append((key, record.requires_python))
+            if _is_cache_valid(
+                    record.name, dependencies, record.requires_python):
+                checksums[key] = _get_cache_checksum(
+                    dependencies, record.requires_python,
+                )
+        count += 1
+    DEPENDENCY_CACHE.update(dependency_entries, checksums)
+    REQUIRES_PYTHON_CACHE.update(requires_python_entries)
+    # A lookup needs both entries. Dependencies are written last, so readers
+    # never find them without Requires-Python.
+    write_caches([REQUIRES_PYTHON_CACHE, DEPENDENCY_CACHE])
+    return count
+
+
+def get_dependencies(requirement, sources, offline=False):
     """Get all dependencies for a given install requirement.
 
+    If `offline` is true, only local caches are consulted, and
+    `DependencyCacheMiss` is raised if the requirement is not found.
+
     :param requirement: A requirement
     :param sources: Pipfile-formatted sources
     :type sources: list[dict]
     """
+    ireq = requirement.as_ireq()
+    # Calculated up-front, since building may modify a local directory.
+    artifact_key = _get_artifact_key(requirement, ireq)
     getters = [
-        _get_dependencies_from_cache,
-        _cached(_get_dependencies_from_json, sources=sources),
-        _cached(_get_dependencies_from_pip, sources=sources),
+        ("cache", _get_dependencies_from_cache),
+        ("artifact-cache", functools.partial(
+            _get_dependencies_from_artifact_cache,
+            artifact_key=artifact_key,
+        )),
+        ("json", _cached(
+            _get_dependencies_from_json, shared=True, sources=sources,
+        )),
+        ("shared-cache", _cached(
+            _get_dependencies_from_shared_cache, sources=sources,
+        )),
+        ("metadata-file", _cached(
+            _get_dependencies_from_metadata_file,
+            shared=True, sources=sources,
+        )),
+        ("lazy-wheel", _cached(
+            _get_dependencies_from_lazy_wheel,
+            shared=True, sources=sources,
+        )),
+        ("pip", _cached(
+            _get_dependencies_from_pip,
+            artifact_key=artifact_key, shared=True, sources=sources,
+        )),
     ]
-    ireq = requirement.as_ireq()
+    if offline:
+        getters = getters[:2]   # Only the local caches.
     last_exc = None
-    for getter in getters:
+    for label, getter in getters:
         try:
-            result = getter(ireq)
+            with profiling.span(label, "get_dependencies", package=ireq.name):
+                result = getter(ireq)
         except Exception as e:
             last_exc = sys.exc_info()
             continue
         if result is not None:
+            LOOKUP_STATS.record(label)
+            profiling.count("get_dependencies.{0}".format(label))
             deps, pyreq = result
-            reqs = [requirementslib.Requirement.from_line(d) for d in deps]
-            return reqs, pyreq
+            return parse_dependencies(deps), pyreq
+    LOOKUP_STATS.record("failed")
+    profiling.count("get_dependencies.failed")
+    if offline:
+        raise DependencyCacheMiss(requirement.as_line(include_hashes=False))
     if last_exc:
         six.reraise(*last_exc)
     raise RuntimeError("failed to get dependencies for {}".format(
@@ -6,6 +6,9 @@ import contextlib
 
 from pip_shims import Wheel
 
+from . import profiling
+from .targets import is_artifact_supported
+
 
 def _wheel_supported(self, tags=None):
     # Ignore current platform. Support everything.
@@ -36,7 +39,22 @@ def _allow_all_wheels():
     Wheel.support_index_min = original_support_index_min
 
 
-def get_hashes(cache, req):
+# Hashes found in this process, so projects locked in the same process do
+# not look up the same artifacts again.
+_HASHES = {}
+
+
+def forget_hashes():
+    _HASHES.clear()
+
+
+def get_hashes(cache, req, sources=None, target=None):
+    """Get hashes of all artifacts of a pinned requirement.
+
+    `sources` are Pipfile-formatted sources to look the artifacts up in.
+    Results are remembered for the process, keyed by the sources' URLs, so
+    the same name in two projects does not share hashes of another index.
+    """
     if req.is_vcs:
         return set()
 
@@ -52,10 +70,25 @@ def get_hashes(cache, req):
     if not ireq.is_pinned:
         return set()
 
-    with _allow_all_wheels():
-        matching_candidates = req.find_all_matches()
+    key = (
+        req.as_line(include_hashes=False),
+        tuple(sorted(source["url"] for source in sources or ())),
+        target,
+    )
+    try:
+        return set(_HASHES[key])
+    except KeyError:
+        pass
+
+    with _allow_all_wheels(), profiling.span("find_all_matches", "hashes"):
+        matching_candidates = req.find_all_matches(sources=sources or None)
 
-    return {
+    hashes = {
         cache.get_hash(candidate.location)
         for candidate in matching_candidates
+        if target is None or is_artifact_supported(
+            candidate.location.filename, target,
+        )
     }
+    _HASHES[key] = frozenset(hashes)
+    return hashes
@@ -0,0 +1,209 @@
+# -*- coding=utf-8 -*-
+
+"""Read and cache candidate listings from simple (PEP 503) index pages.
+
+Each project page is parsed into a list of entries (filename, URL, version,
+Requires-Python, hash, and whether it is yanked), which are cached instead
+of the page itself. A cached page is used without network access within a
+freshness TTL, and revalidated with ETag and Last-Modified afterwards, so an
+unchanged page is neither downloaded nor parsed again.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import time
+
+import distlib.wheel
+import packaging.utils
+import packaging.version
+
+from six.moves import html_parser
+from six.moves.urllib import parse as urllib_parse
+
+from .targets import is_artifact_supported
+
+
+SDIST_EXTENSIONS = (".tar.gz", ".tar.bz2", ".tar.xz", ".tgz", ".tar", ".zip")
+
+# Bump this when the content of entries changes, so pages cached before are
+# fetched again instead of revalidated.
+PAGE_FORMAT = 2
+
+
+IndexCandidate = collections.namedtuple("IndexCandidate", [
+    "name", "version", "filename", "url", "requires_python", "hash",
+])
+
+
+class _AnchorParser(html_parser.HTMLParser):
+
+    def __init__(self, url):
+        html_parser.HTMLParser.__init__(self)
+        self.base_url = url
+        self.anchors = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "base" and attrs.get("href"):
+            self.base_url = urllib_parse.urljoin(self.base_url, attrs["href"])
+        elif tag == "a" and attrs.get("href"):
+            self.anchors.append(attrs)
+
+
+def _get_version_from_filename(filename, canonical_name):
+    if filename.endswith(".whl"):
+        parts = filename[:-4].split("-")
+        if len(parts) not in (5, 6):
+            return None
+        if packaging.utils.canonicalize_name(parts[0]) != canonical_name:
+            return None
+        return parts[1]
+    for extension in SDIST_EXTENSIONS:
+        if filename.endswith(extension):
+            stem = filename[:-len(extension)]
+            break
+    else:
+        return None     # Eggs, installers, etc. are not supported.
+    # The name may contain dashes, so try each one as the separator.
+    for i, c in enumerate(stem):
+        if c != "-":
+            continue
+        if packaging.utils.canonicalize_name(stem[:i]) == canonical_name:
+            return stem[i + 1:] or None
+    return None
+
+
+def parse_index_page(html, url, name):
+    """Parse a project page of a simple index into a list of entries.
+
+    Each entry is a dict with keys matching `IndexCandidate` fields, and
+    "yanked". The hash is formatted as in Pipfile.lock, or None if the index
+    does not provide a SHA256 hash. Yanked files (PEP 592) are included, and
+    marked as such.
+    """
+    canonical_name = packaging.utils.canonicalize_name(name)
+    parser = _AnchorParser(url)
+    parser.feed(html)
+    parser.close()
+    entries = []
+    for attrs in parser.anchors:
+        file_url = urllib_parse.urljoin(parser.base_url, attrs["href"])
+        parsed = urllib_parse.urlsplit(file_url)
+        filename = urllib_parse.unquote(parsed.path.rsplit("/", 1)[-1])
+        version = _get_version_from_filename(filename, canonical_name)
+        if version is None:
+            continue
+        fragment = urllib_parse.parse_qs(parsed.fragment)
+        sha256 = fragment.get("sha256")
+        entries.append({
+            "name": canonical_name,
+            "version": version,
+            "filename": filename,
+            "url": urllib_parse.urlunsplit(parsed[:4] + ("",)),
+            "requires_python": attrs.get("data-requires-python") or "",
+            "hash": "sha256:{0}".format(sha256[0]) if sha256 else None,
+            "yanked": "data-yanked" in attrs,
+        })
+    return entries
+
+
+def get_page_url(index_url, name):
+    return "{0}/{1}/".format(
+        index_url.rstrip("/"), packaging.utils.canonicalize_name(name),
+    )
+
+
+def fetch_index_entries(page_url, name, cache, session, ttl, verify=True):
+    """Get entries of a project page, from `cache` if possible.
+
+    `cache` is an `IndexPageCache` for the page. If it was fetched within
+    `ttl` seconds, it is used directly. Otherwise the page is requested
+    conditionally, and only parsed if it changed.
+    """
+    page = cache.page
+    now = time.time()
+    cached = "entries" in page and page.get("format") == PAGE_FORMAT
+    if cached and now - page.get("fetched", 0) < ttl:
+        return page["entries"]
+
+    headers = {"Accept": "text/html"}
+    if cached:
+        if page.get("etag"):
+            headers["If-None-Match"] = page["etag"]
+        if page.get("last_modified"):
+            headers["If-Modified-Since"] = page["last_modified"]
+    response = session.get(page_url, headers=headers, verify=verify)
+    if response.status_code == 304 and cached:
+        cache.update_page(fetched=now)
+        return page["entries"]
+    if response.status_code == 404:
+        entries = []    # The project is not on this index.
+    else:
+        response.raise_for_status()
+        entries = parse_index_page(
+            response.text, response.url or page_url, name,
+        )
+    cache.update_page(
+        entries=entries, fetched=now, format=PAGE_FORMAT,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+    return entries
+
+
+def _to_candidate(entry):
+    try:
+        version = packaging.version.Version(entry["version"])
+    except packaging.version.InvalidVersion:
+        return None
+    return IndexCandidate(
+        entry["name"], version, entry["filename"], entry["url"],
+        entry["requires_python"], entry["hash"],
+    )
+
+
+def _is_supported(filename, target):
+    if target is not None:
+        return is_artifact_supported(filename, target)
+    return not filename.endswith(".whl") or distlib.wheel.is_compatible(filename)
+
+
+def iter_candidates(entries, include_yanked=False, target=None):
+    """Convert entries into `IndexCandidate` instances.
+
+    Wheels not installable for `target` (or this interpreter, if not given),
+    and files with versions not valid under PEP 440, are skipped. Yanked
+    files are skipped too, unless `include_yanked` is true; PEP 592 allows
+    them to satisfy exact pins.
+    """
+    for entry in entries:
+        if entry.get("yanked") and not include_yanked:
+            continue
+        if not _is_supported(entry["filename"], target):
+            continue
+        candidate = _to_candidate(entry)
+        if candidate is not None:
+            yield candidate
+
+
+def get_version_hashes(entries, version):
+    """Get hashes of all files of a version, formatted as in Pipfile.lock.
+
+    Yanked files are included, since a pinned version may be installed from
+    them. Returns None if any file's hash is unknown, since the result would
+    be incomplete. Returns an empty set if there are no files.
+    """
+    try:
+        version = packaging.version.Version(version)
+    except packaging.version.InvalidVersion:
+        return None
+    hashes = set()
+    for entry in entries:
+        candidate = _to_candidate(entry)
+        if candidate is None or candidate.version != version:
+            continue
+        if not candidate.hash:
+            return None
+        hashes.add(candidate.hash)
+    return hashes
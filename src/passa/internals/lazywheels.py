@@ -0,0 +1,173 @@
+# -*- coding=utf-8 -*-
+
+"""Read metadata out of remote wheels with HTTP range requests.
+
+A wheel is a zip file, and a zip file can be read by looking at its central
+directory (at the end of the file), and then only the members needed. With
+range requests, reading METADATA only takes a few kilobytes of transfer,
+instead of downloading the whole wheel.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import contextlib
+import os
+import re
+import tempfile
+import zipfile
+
+
+# Try to fetch at least this many bytes at once, to avoid tiny requests.
+CHUNK_SIZE = 10240
+
+# Offsets and lengths are of the wheel itself, so it must not be compressed
+# in transfer.
+IDENTITY_HEADERS = {"Accept-Encoding": "identity"}
+
+_CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+
+
+def _is_identity(response):
+    return response.headers.get("Content-Encoding", "identity") == "identity"
+
+
+class RangeRequestUnsupported(Exception):
+    pass
+
+
+class LazyHTTPFile(object):
+    """A read-only, seekable file backed by HTTP range requests.
+
+    Content is fetched on demand when read, and kept in a sparse temporary
+    file, so each byte is downloaded at most once.
+    """
+    def __init__(self, url, session, chunk_size=CHUNK_SIZE):
+        response = session.head(
+            url, allow_redirects=True, headers=IDENTITY_HEADERS,
+        )
+        response.raise_for_status()
+        if (response.headers.get("Accept-Ranges") != "bytes" or
+                not _is_identity(response)):
+            raise RangeRequestUnsupported(url)
+        # The length is needed to find the central directory, and servers
+        # may omit it (e.g. for chunked responses).
+        try:
+            self.length = int(response.headers["Content-Length"])
+        except (KeyError, ValueError):
+            raise RangeRequestUnsupported(url)
+        self.url = response.url or url
+        self._session = session
+        self._chunk_size = chunk_size
+        self._file = tempfile.TemporaryFile()
+        self._file.truncate(self.length)
+        self._fetched = []  # Sorted, non-overlapping [start, end) intervals.
+        self._position = 0
+
+        # The central directory is at the end. Get it in one go.
+        self._fetch(max(0, self.length - chunk_size), self.length)
+
+    def close(self):
+        self._file.close()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.length
+        self._position = min(max(offset, 0), self.length)
+        return self._position
+
+    def read(self, size=-1):
+        start = self._position
+        if size is None or size < 0:
+            stop = self.length
+        else:
+            stop = min(self.length, start + size)
+        if start >= stop:
+            return b""
+        self._fetch(start, max(stop, min(self.length, start + self._chunk_size)))
+        self._file.seek(start)
+        data = self._file.read(stop - start)
+        self._position = stop
+        return data
+
+    def _iter_gaps(self, start, stop):
+        for left, right in self._fetched:
+            if right <= start:
+                continue
+            if left >= stop:
+                break
+            if left > start:
+                yield start, left
+            start = max(start, right)
+        if start < stop:
+            yield start, stop
+
+    def _fetch(self, start, stop):
+        for left, right in list(self._iter_gaps(start, stop)):
+            headers = dict(IDENTITY_HEADERS, **{
+                "Range": "bytes={0}-{1}".format(left, right - 1),
+                "Cache-Control": "no-cache",
+            })
+            response = self._session.get(self.url, headers=headers)
+            response.raise_for_status()
+            if response.status_code != 206 or not self._is_range(
+                    response, left, right):
+                raise RangeRequestUnsupported(self.url)
+            self._file.seek(left)
+            self._file.write(response.content)
+            self._add_fetched(left, right)
+
+    def _is_range(self, response, start, stop):
+        """Check the response holds exactly the bytes in [start, stop).
+        """
+        if not _is_identity(response) or len(response.content) != stop - start:
+            return False
+        content_range = response.headers.get("Content-Range")
+        if content_range is None:
+            return True
+        match = _CONTENT_RANGE_RE.match(content_range.strip())
+        if not match:
+            return False
+        first, last, length = match.groups()
+        return (
+            (int(first), int(last) + 1) == (start, stop) and
+            length in ("*", str(self.length))
+        )
+
+    def _add_fetched(self, start, stop):
+        intervals = sorted(self._fetched + [[start, stop]])
+        merged = [intervals[0]]
+        for left, right in intervals[1:]:
+            if left <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], right)
+            else:
+                merged.append([left, right])
+        self._fetched = merged
+
+
+def read_wheel_metadata(url, session):
+    """Read the METADATA file of a remote wheel.
+
+    Raises `RangeRequestUnsupported` if the server does not support range
+    requests. Returns the content as text, or None if the wheel does not
+    contain exactly one METADATA file at the top level.
+    """
+    with contextlib.closing(LazyHTTPFile(url, session)) as f:
+        zf = zipfile.ZipFile(f)
+        names = [
+            name for name in zf.namelist()
+            if name.count("/") == 1 and name.endswith(".dist-info/METADATA")
+        ]
+        if len(names) != 1:
+            return None
+        return zf.read(names[0]).decode("utf-8")
@@ -2,7 +2,7 @@
 
 from __future__ import absolute_import, unicode_literals
 
-from packaging.markers import Marker
+from packaging.markers import Marker, default_environment
 
 
 def _strip_extra(elements):
@@ -99,3 +99,27 @@ def contains_extra(marker):
         return False
     marker = Marker(str(marker))
     return _markers_contains_extra(marker._markers)
+
+
+class MarkerEvaluator(object):
+    """Evaluate markers against a fixed environment, memoizing the results.
+
+    Markers in a lock file are heavily repeated (e.g. the same
+    ``python_version`` marker on hundreds of entries), so each distinct marker
+    string is only parsed and evaluated once.
+    """
+    def __init__(self, environment=None):
+        if environment is None:
+            environment = default_environment()
+        self.environment = environment
+        self._results = {}
+
+    def evaluate(self, marker):
+        key = str(marker)
+        try:
+            return self._results[key]
+        except KeyError:
+            pass
+        result = Marker(key).evaluate(self.environment)
+        self._results[key] = result
+        return result
@@ -0,0 +1,112 @@
+# -*- coding=utf-8 -*-
+
+"""Read package metadata in bulk from a local mirror.
+
+Supported inputs are wheels, PEP 658 metadata files (``*.metadata``), and
+JSON documents in the format of the ``/pypi/{name}/{version}/json`` API.
+Directories are walked recursively.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import email.parser
+import io
+import json
+import os
+import zipfile
+
+
+MetadataRecord = collections.namedtuple("MetadataRecord", [
+    "name", "version", "requires_dist", "requires_python", "extras",
+])
+
+
+def _record_from_metadata_text(text):
+    message = email.parser.Parser().parsestr(text, headersonly=True)
+    name = message.get("Name")
+    version = message.get("Version")
+    if not name or not version:
+        return None
+    requires_python = message.get("Requires-Python") or ""
+    if requires_python == "UNKNOWN":
+        requires_python = ""
+    return MetadataRecord(
+        name=name, version=version,
+        requires_dist=message.get_all("Requires-Dist") or [],
+        requires_python=requires_python,
+        extras=message.get_all("Provides-Extra") or [],
+    )
+
+
+def _read_wheel_metadata_text(path):
+    with zipfile.ZipFile(path) as zf:
+        names = [
+            name for name in zf.namelist()
+            if name.count("/") == 1 and name.endswith(".dist-info/METADATA")
+        ]
+        if len(names) != 1:
+            return None
+        return zf.read(names[0]).decode("utf-8")
+
+
+def _iter_records_from_json(path):
+    with io.open(path, encoding="utf-8") as f:
+        doc = json.load(f)
+    docs = doc if isinstance(doc, list) else [doc]
+    for doc in docs:
+        try:
+            info = doc["info"]
+        except (KeyError, TypeError):
+            continue
+        # The JSON API returns null both when there are not requirements, or
+        # the requirement list cannot be retrieved. Skip, since we can't tell.
+        requires_dist = info.get("requires_dist")
+        if requires_dist is None:
+            continue
+        yield MetadataRecord(
+            name=info["name"], version=info["version"],
+            requires_dist=requires_dist,
+            requires_python=info.get("requires_python") or "",
+            extras=info.get("provides_extra") or [],
+        )
+
+
+def _iter_records_from_file(path):
+    if path.endswith(".whl"):
+        try:
+            text = _read_wheel_metadata_text(path)
+        except zipfile.BadZipfile:
+            text = None
+    elif path.endswith(".metadata"):
+        with io.open(path, encoding="utf-8") as f:
+            text = f.read()
+    elif path.endswith(".json"):
+        for record in _iter_records_from_json(path):
+            yield record
+        return
+    else:
+        return
+    if text is None:
+        return
+    record = _record_from_metadata_text(text)
+    if record is not None:
+        yield record
+
+
+def iter_metadata_records(paths):
+    """Iterate through `MetadataRecord` instances read from paths.
+
+    A wheel and its metadata file (if both present) produce the same record
+    twice; this is harmless since they contain the same information.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            for record in _iter_records_from_file(path):
+                yield record
+            continue
+        for parent, _, filenames in os.walk(path):
+            for filename in sorted(filenames):
+                filepath = os.path.join(parent, filename)
+                for record in _iter_records_from_file(filepath):
+                    yield record
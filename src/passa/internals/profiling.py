@@ -0,0 +1,167 @@
+# -*- coding=utf-8 -*-
+
+"""Record where time goes while locking.
+
+Code is instrumented with `span()` (a timed block) and `count()` (a named
+counter). Both do nothing unless a `Profiler` is installed, e.g. with
+`profile_to()`. Recorded data can be written as JSON (spans, counters, and
+total time per span name), or in Chrome's trace event format, which can be
+opened in chrome://tracing or Perfetto.
+
+Only the current process is recorded. Work done in worker processes (e.g.
+when locking for multiple targets) is not included.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import contextlib
+import io
+import json
+import os
+import threading
+import timeit
+
+
+FORMATS = ("json", "chrome")
+
+
+Span = collections.namedtuple("Span", [
+    "name", "category", "start", "duration", "thread", "args",
+])
+
+
+class Profiler(object):
+    """Collect spans and counters.
+    """
+    def __init__(self, clock=timeit.default_timer):
+        self.clock = clock
+        self.origin = clock()
+        self.spans = []
+        self.counters = collections.Counter()
+
+    @contextlib.contextmanager
+    def span(self, name, category="", **args):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.spans.append(Span(
+                name, category, start - self.origin, self.clock() - start,
+                threading.current_thread().ident, args,
+            ))
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def get_totals(self):
+        """Get total time (in seconds) and number of spans for each name.
+        """
+        totals = collections.OrderedDict()
+        for span in sorted(self.spans, key=lambda s: (s.category, s.name)):
+            key = "{0}:{1}".format(span.category, span.name)
+            duration, count = totals.get(key, (0.0, 0))
+            totals[key] = (duration + span.duration, count + 1)
+        return totals
+
+    def to_json(self):
+        return {
+            "spans": [
+                {
+                    "name": s.name, "category": s.category,
+                    "start": s.start, "duration": s.duration, "args": s.args,
+                }
+                for s in self.spans
+            ],
+            "counters": dict(self.counters),
+            "totals": {
+                key: {"duration": duration, "count": count}
+                for key, (duration, count) in self.get_totals().items()
+            },
+        }
+
+    def to_chrome_trace(self):
+        pid = os.getpid()
+        events = [
+            {
+                "name": s.name, "cat": s.category, "ph": "X",
+                "ts": s.start * 1e6, "dur": s.duration * 1e6,
+                "pid": pid, "tid": s.thread, "args": s.args,
+            }
+            for s in self.spans
+        ]
+        end = max([s.start + s.duration for s in self.spans] or [0.0])
+        events.extend(
+            {
+                "name": name, "ph": "C", "ts": end * 1e6, "pid": pid,
+                "args": {"value": value},
+            }
+            for name, value in sorted(self.counters.items())
+        )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path, format="json"):
+        if format == "chrome":
+            data = self.to_chrome_trace()
+        elif format == "json":
+            data = self.to_json()
+        else:
+            raise ValueError("unknown profile format {0!r}".format(format))
+        with io.open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(data, indent=2, sort_keys=True))
+
+
+_profiler = None
+
+
+def get_profiler():
+    return _profiler
+
+
+def set_profiler(profiler):
+    """Install a profiler, or uninstall with None. Returns the previous one.
+    """
+    global _profiler
+    previous, _profiler = _profiler, profiler
+    return previous
+
+
+@contextlib.contextmanager
+def _null_span():
+    yield
+
+
+def span(name, category="", **args):
+    """Time the block under the installed profiler, if any.
+
+    Callable argument values are called to get the actual values, but only
+    if a profiler is installed, so they cost nothing otherwise.
+    """
+    if _profiler is None:
+        return _null_span()
+    args = {k: v() if callable(v) else v for k, v in args.items()}
+    return _profiler.span(name, category, **args)
+
+
+def count(name, value=1):
+    if _profiler is not None:
+        _profiler.count(name, value)
+
+
+@contextlib.contextmanager
+def profile_to(path, format="json"):
+    """Profile the block, and write the result to `path`.
+
+    Does nothing if `path` is None.
+    """
+    if path is None:
+        yield
+        return
+    profiler = Profiler()
+    previous = set_profiler(profiler)
+    try:
+        with profiler.span("total", "passa"):
+            yield
+    finally:
+        set_profiler(previous)
+        profiler.write(path, format)
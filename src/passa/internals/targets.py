@@ -0,0 +1,192 @@
+# -*- coding=utf-8 -*-
+
+"""Describe target environments to lock for, and merge their results.
+
+A target is a Python version and a platform (as in `sys.platform`), written
+as e.g. ``3.8-linux`` or ``3.7.3-win32``. A lock for a target only includes
+dependencies whose markers apply to it, and only hashes of artifacts it can
+install. Locks of several targets are merged into one lock file, where
+entries not needed by every target are marked with the targets needing them.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import collections
+
+import packaging.markers
+
+
+Target = collections.namedtuple("Target", ["python_version", "platform"])
+
+# Values of platform_system and os_name, derived from sys.platform.
+PLATFORM_SYSTEMS = {"linux": "Linux", "win32": "Windows", "darwin": "Darwin"}
+
+# Prefixes of wheel platform tags installable on each platform. Any machine
+# architecture is accepted, since targets do not specify one.
+PLATFORM_TAG_PREFIXES = {
+    "linux": ("linux_", "manylinux", "musllinux"),
+    "win32": ("win32", "win_"),
+    "darwin": ("macosx_",),
+}
+
+
+class TargetConflictError(ValueError):
+    """Raised if targets lock a package to different versions.
+
+    A lock file can only contain one entry for each package.
+    """
+    def __init__(self, conflicts):
+        super(TargetConflictError, self).__init__(conflicts)
+        self.conflicts = conflicts
+
+    def __str__(self):
+        return "conflicting pins for targets: {0}".format(
+            ", ".join(self.conflicts),
+        )
+
+
+def parse_target(value):
+    """Parse a target like "3.8-linux".
+    """
+    python_version, sep, platform = value.partition("-")
+    parts = python_version.split(".")
+    if (not sep or not platform or len(parts) not in (2, 3) or
+            not all(part.isdigit() for part in parts)):
+        raise ValueError(
+            "invalid target {0!r}, expected PYTHON_VERSION-PLATFORM "
+            "(e.g. 3.8-linux)".format(value),
+        )
+    return Target(python_version, platform)
+
+
+def format_target(target):
+    return "{0}-{1}".format(target.python_version, target.platform)
+
+
+def _get_full_version(target):
+    parts = target.python_version.split(".")
+    return ".".join(parts + ["0"] * (3 - len(parts)))
+
+
+def get_requires_python(target):
+    """Get the Python version to check Requires-Python against.
+    """
+    return _get_full_version(target)
+
+
+def get_environment(target):
+    """Build a marker environment for the target.
+
+    Values not determined by the target (e.g. `platform_machine`) are taken
+    from the running interpreter.
+    """
+    environment = packaging.markers.default_environment()
+    environment.update({
+        "python_version": ".".join(target.python_version.split(".")[:2]),
+        "python_full_version": _get_full_version(target),
+        "sys_platform": target.platform,
+        "platform_system": PLATFORM_SYSTEMS.get(target.platform, ""),
+        "os_name": "nt" if target.platform == "win32" else "posix",
+        "extra": "",
+    })
+    return environment
+
+
+def get_target_marker(target):
+    return "python_version == '{0}' and sys_platform == '{1}'".format(
+        ".".join(target.python_version.split(".")[:2]), target.platform,
+    )
+
+
+def _is_python_tag_supported(tag, abi, major, minor):
+    if tag == "py{0}".format(major):
+        return True
+    version = "{0}{1}".format(major, minor)
+    if tag in ("py" + version, "cp" + version):
+        return True
+    # An abi3 wheel is installable on later versions of the same major.
+    if abi == "abi3" and tag.startswith("cp{0}".format(major)):
+        try:
+            return int(tag[len("cp") + 1:]) <= int(minor)
+        except ValueError:
+            return False
+    return False
+
+
+def is_artifact_supported(filename, target):
+    """Check whether an artifact can be installed for the target.
+
+    Source distributions are always supported. Wheels are checked against
+    their CPython or generic Python tags, and platform tags.
+    """
+    if not filename.endswith(".whl"):
+        return True
+    parts = filename[:-4].split("-")
+    if len(parts) not in (5, 6):
+        return False
+    python_tags, abi, platform_tags = parts[-3:]
+    major, minor = target.python_version.split(".")[:2]
+    if not any(
+            _is_python_tag_supported(tag, abi, major, minor)
+            for tag in python_tags.split(".")):
+        return False
+    prefixes = PLATFORM_TAG_PREFIXES.get(target.platform, (target.platform,))
+    return any(
+        tag == "any" or tag.startswith(prefixes)
+        for tag in platform_tags.split(".")
+    )
+
+
+def _without_metadata(entry):
+    return {k: v for k, v in entry.items() if k not in ("markers", "hashes")}
+
+
+def _join_markers(marker, target):
+    target_marker = get_target_marker(target)
+    if not marker:
+        return target_marker
+    if " or " in marker:
+        marker = "({0})".format(marker)
+    return "{0} and {1}".format(marker, target_marker)
+
+
+def merge_sections(targets, sections):
+    """Merge lock file sections locked for each target.
+
+    `sections` is a list of mappings of package name to lock file entry,
+    one for each target in `targets`. Hashes are combined. Entries locked
+    the same way for every target are kept as-is, other entries are marked
+    with the targets they apply to. Raises `TargetConflictError` if targets
+    lock a package differently.
+    """
+    entries_by_name = collections.defaultdict(list)
+    for target, section in zip(targets, sections):
+        for name, entry in section.items():
+            entries_by_name[name].append((target, entry))
+
+    merged = {}
+    conflicts = []
+    for name, pairs in sorted(entries_by_name.items()):
+        entry = dict(pairs[0][1])
+        if any(_without_metadata(e) != _without_metadata(entry)
+               for _, e in pairs[1:]):
+            conflicts.append("{0} ({1})".format(name, ", ".join(
+                "{0} for {1}".format(e.get("version", "?"), format_target(t))
+                for t, e in pairs
+            )))
+            continue
+        hashes = set()
+        for _, e in pairs:
+            hashes.update(e.get("hashes", []))
+        if hashes:
+            entry["hashes"] = sorted(hashes)
+        markers = {e.get("markers") for _, e in pairs}
+        if len(pairs) != len(targets) or len(markers) != 1:
+            entry["markers"] = " or ".join(
+                "({0})".format(_join_markers(e.get("markers"), t))
+                for t, e in pairs
+            )
+        merged[name] = entry
+    if conflicts:
+        raise TargetConflictError(conflicts)
+    return merged
@@ -0,0 +1,199 @@
+# -*- coding=utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals
+
+import contextlib
+import csv
+import multiprocessing
+import multiprocessing.pool
+import os
+import shutil
+import tempfile
+
+try:
+    from importlib.util import cache_from_source
+except ImportError:     # Python 2 does not use __pycache__.
+    cache_from_source = None
+
+
+def _get_worker_count():
+    try:
+        cpu_count = multiprocessing.cpu_count()
+    except NotImplementedError:
+        cpu_count = 1
+    # Unlinks and renames are I/O bound; use more threads than CPUs.
+    return min(32, cpu_count + 4)
+
+
+@contextlib.contextmanager
+def _thread_pool(workers):
+    pool = multiprocessing.pool.ThreadPool(workers)
+    try:
+        yield pool
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _iter_record_paths(dist):
+    """Iterate through absolute paths of files listed in the dist's RECORD.
+
+    RECORD is a CSV file, so paths containing commas are quoted. Bytecode for
+    each Python source is included even if it is not listed, since it is
+    generated on import after installation.
+    """
+    for row in csv.reader(dist.get_metadata_lines("RECORD")):
+        path = row[0].strip() if row else ""
+        if not path:
+            continue
+        path = os.path.normpath(os.path.join(dist.location, path))
+        yield path
+        if not path.endswith(".py"):
+            continue
+        yield path + "c"
+        if cache_from_source is not None:
+            yield cache_from_source(path)
+
+
+def _is_path_within(path, root):
+    path = os.path.normcase(path)
+    root = os.path.join(os.path.normcase(root), "")
+    return path.startswith(root)
+
+
+class BatchUninstaller(object):
+    """A context manager to remove multiple distributions for the inner block.
+
+    All files are collected from each distribution's RECORD up-front, and
+    moved into stash directories in parallel. If the inner block exits
+    correctly, the stashes are deleted (committing the uninstallation of all
+    distributions at once), otherwise every file is moved back.
+
+    Only distributions with a RECORD file (i.e. installed from wheels) can be
+    handled. Others are exposed as `unsupported` for the caller to remove by
+    other means.
+    """
+    def __init__(self, dists, prefix, workers=None):
+        self.prefix = prefix
+        self.workers = workers or _get_worker_count()
+        self.dists = []
+        self.unsupported = []
+        for dist in dists:
+            if dist.has_metadata("RECORD"):
+                self.dists.append(dist)
+            else:
+                self.unsupported.append(dist)
+        self._moves = []
+        self._stashes = {}
+
+    @property
+    def names(self):
+        return {dist.key for dist in self.dists}
+
+    def _get_stash(self, path, roots):
+        for root in roots:
+            if _is_path_within(path, root):
+                break
+        else:
+            root = os.path.dirname(path)
+        try:
+            stash = self._stashes[root]
+        except KeyError:
+            stash = tempfile.mkdtemp(prefix=".passa-uninstall-", dir=root)
+            self._stashes[root] = stash
+        return os.path.join(stash, os.path.relpath(path, root))
+
+    def _plan(self):
+        """Calculate where each file should go, in a single scan.
+        """
+        # Sort roots so the most specific one matches first.
+        roots = sorted(
+            {dist.location for dist in self.dists},
+            key=len, reverse=True,
+        )
+        seen = set()
+        for dist in self.dists:
+            for path in _iter_record_paths(dist):
+                if path in seen or not _is_path_within(path, self.prefix):
+                    continue
+                seen.add(path)
+                if not os.path.isfile(path) and not os.path.islink(path):
+                    continue
+                self._moves.append((path, self._get_stash(path, roots)))
+        for directory in {os.path.dirname(t) for _, t in self._moves}:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+    def __enter__(self):
+        self._plan()
+        with _thread_pool(self.workers) as pool:
+            results = pool.map(_try_rename, self._moves)
+        failed = [s for (s, _), ok in zip(self._moves, results) if not ok]
+        self._moves = [move for move, ok in zip(self._moves, results) if ok]
+        if failed:
+            self._rollback()
+            raise OSError("failed to remove {0}".format(", ".join(failed)))
+        return self
+
+    def _commit(self):
+        stashed = [
+            os.path.join(parent, name)
+            for stash in self._stashes.values()
+            for parent, _, filenames in os.walk(stash)
+            for name in filenames
+        ]
+        with _thread_pool(self.workers) as pool:
+            pool.map(_try_unlink, stashed)
+        for stash in self._stashes.values():
+            shutil.rmtree(stash, ignore_errors=True)
+        _remove_empty_directories(
+            {os.path.dirname(source) for source, _ in self._moves},
+            {dist.location for dist in self.dists},
+        )
+
+    def _rollback(self):
+        with _thread_pool(self.workers) as pool:
+            pool.map(_try_rename, [(t, s) for s, t in self._moves])
+        for stash in self._stashes.values():
+            shutil.rmtree(stash, ignore_errors=True)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self._commit()
+        else:
+            self._rollback()
+
+
+def _try_rename(pair):
+    source, target = pair
+    try:
+        os.rename(source, target)
+    except OSError:
+        return False
+    return True
+
+
+def _try_unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _remove_empty_directories(directories, roots):
+    """Remove directories left empty, up to (but excluding) one of `roots`.
+
+    Directories not inside any of the roots (e.g. the scripts directory) are
+    always kept.
+    """
+    roots = {os.path.normcase(os.path.normpath(root)) for root in roots}
+    # Deepest first, so parents emptied by removing children are caught.
+    for directory in sorted(directories, key=len, reverse=True):
+        if not any(_is_path_within(directory, root) for root in roots):
+            continue
+        while os.path.normcase(directory) not in roots:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
@@ -1,6 +1,9 @@
 # -*- coding=utf-8 -*-
 
-from __future__ import absolute_import, unicode_literals
+from __future__ import absolute_import, print_function, unicode_literals
+
+import collections
+import os
 
 
 def identify_requirment(r):
@@ -116,3 +119,53 @@ def strip_extras(requirement):
     new = type(requirement).from_line(line)
     new.extras = None
     return new
+
+
+def get_env_number(name, default, convert=int, minimum=0):
+    """Read a number from an environment variable.
+
+    `default` is used if the variable is not set, or its value cannot be
+    converted, or is less than `minimum`. Invalid values are reported, not
+    raised, since this is usually evaluated on import.
+    """
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        number = convert(value)
+    except ValueError:
+        number = None
+    if number is None or number < minimum:
+        print("ignoring invalid {0}={1!r}, using {2}".format(
+            name, value, default,
+        ))
+        return default
+    return number
+
+
+class LRUCache(object):
+    """A mapping that only keeps the `maxsize` most recently used entries.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            return default
+        self._data[key] = value     # Re-insert as the most recent.
+        return value
+
+    def __setitem__(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
@@ -0,0 +1,383 @@
+# -*- coding=utf-8 -*-
+
+"""Install wheels by linking files out of a shared, unpacked store.
+
+Each wheel is unpacked only once into ``CACHE_DIR/wheel-store``, keyed by the
+SHA256 of the archive. Installing it into an environment then links (or
+clones) files out of the store, instead of decompressing every member again
+for every environment.
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import base64
+import email
+import errno
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+
+import distlib.database
+import distlib.util
+import vistir
+
+from ..models.caches import CACHE_DIR
+from .cachetiers import mark_accessed
+
+try:
+    import fcntl
+except ImportError:     # Windows.
+    fcntl = None
+
+
+STORE_DIR = os.path.join(CACHE_DIR, "wheel-store")
+
+# From linux/fs.h. Clones a file's extents on copy-on-write file systems.
+FICLONE = 0x40049409
+
+
+def _format_record_hash(h):
+    value = base64.urlsafe_b64encode(h.digest()).rstrip(b"=").decode("ascii")
+    return "{0}={1}".format(h.name, value)
+
+
+def _get_record_hash(data, kind="sha256"):
+    return _format_record_hash(hashlib.new(kind, data))
+
+
+class _HashingReader(object):
+    """Wrap a file object to hash its content as it is read.
+    """
+    def __init__(self, f, h):
+        self._f = f
+        self.hash = h
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self.hash.update(data)
+        return data
+
+
+def _get_wheel_path(wheel):
+    return os.path.join(wheel.dirname, wheel.filename)
+
+
+def _get_dist_info_name(wheel):
+    return "{0}-{1}.dist-info".format(wheel.name, wheel.version)
+
+
+def _get_data_name(wheel):
+    return "{0}-{1}.data".format(wheel.name, wheel.version)
+
+
+def _read_records(zf, wheel):
+    record_name = "{0}/RECORD".format(_get_dist_info_name(wheel))
+    with zf.open(record_name) as f:
+        with distlib.util.CSVReader(stream=f) as reader:
+            return {row[0]: row for row in reader}
+
+
+def _iter_members(zf, root):
+    """Iterate through (info, path) of files in the wheel to unpack.
+    """
+    for info in zf.infolist():
+        arcname = info.filename
+        # Directories and signatures are not listed in RECORD.
+        if arcname.endswith(("/", "/RECORD.jws")):
+            continue
+        path = os.path.abspath(os.path.join(root, *arcname.split("/")))
+        if not path.startswith(root):
+            raise ValueError("wheel member escapes store: {0!r}".format(
+                arcname,
+            ))
+        yield info, path
+
+
+def _get_hash_kind(row):
+    return row[1].split("=", 1)[0] if row and row[1] else "sha256"
+
+
+def _hash_file(f, h):
+    reader = _HashingReader(f, h)
+    while reader.read(io.DEFAULT_BUFFER_SIZE):
+        pass
+    return _format_record_hash(h)
+
+
+def _unpack_wheel(wheel, target):
+    """Extract all members of the wheel into `target`.
+
+    Every member is checked against the wheel's RECORD while it is extracted,
+    so files in the store can be trusted afterwards without re-hashing.
+    Members are streamed to disk, so large ones are not held in memory.
+    """
+    root = os.path.join(os.path.abspath(target), "")
+    with zipfile.ZipFile(_get_wheel_path(wheel)) as zf:
+        records = _read_records(zf, wheel)
+        for info, path in _iter_members(zf, root):
+            arcname = info.filename
+            row = records.get(arcname)
+            kind = _get_hash_kind(row)
+            vistir.mkdir_p(os.path.dirname(path))
+            with zf.open(info) as src, io.open(path, "wb") as dst:
+                reader = _HashingReader(src, hashlib.new(kind))
+                shutil.copyfileobj(reader, dst)
+            if row and row[1] and _format_record_hash(reader.hash) != row[1]:
+                raise ValueError("digest mismatch for {0!r}".format(arcname))
+            mode = (info.external_attr >> 16) & 0o777
+            if os.name == "posix" and mode:
+                os.chmod(path, mode)
+
+
+def _is_unpacked_wheel_intact(wheel, location):
+    """Check every file of the wheel in the store against the wheel.
+
+    Files listed with a hash in the wheel's RECORD are checked against it,
+    and others (i.e. RECORD itself) against the archive member.
+    """
+    root = os.path.join(os.path.abspath(location), "")
+    with zipfile.ZipFile(_get_wheel_path(wheel)) as zf:
+        records = _read_records(zf, wheel)
+        for info, path in _iter_members(zf, root):
+            row = records.get(info.filename)
+            kind = _get_hash_kind(row)
+            if row and row[1]:
+                expected = row[1]
+            else:
+                with zf.open(info) as f:
+                    expected = _hash_file(f, hashlib.new(kind))
+            try:
+                with io.open(path, "rb") as f:
+                    actual = _hash_file(f, hashlib.new(kind))
+            except (IOError, OSError):
+                return False
+            if actual != expected:
+                return False
+    return True
+
+
+def _discard_unpacked_wheel(location):
+    # Move it away first, so other processes never see it partially deleted.
+    # The temporary name is cleaned up by pruning if this is interrupted.
+    trash = tempfile.mkdtemp(prefix="unpack-", dir=STORE_DIR)
+    try:
+        os.rename(location, os.path.join(trash, "entry"))
+    except OSError:
+        pass    # Already replaced by another process.
+    shutil.rmtree(trash, ignore_errors=True)
+
+
+def get_unpacked_wheel(wheel, digest, verify=False):
+    """Get the store directory containing the wheel's unpacked content.
+
+    `digest` is the SHA256 hex digest of the wheel file, used as the key.
+
+    The wheel is unpacked into a temporary directory next to its final
+    location, and moved into place when complete, so a partially unpacked
+    wheel is never visible to other processes. If `verify` is true, an
+    existing store directory is checked against the wheel first, and
+    unpacked again if it does not match.
+    """
+    vistir.mkdir_p(STORE_DIR)
+    location = os.path.join(STORE_DIR, digest)
+    if os.path.isdir(location):
+        if not verify or _is_unpacked_wheel_intact(wheel, location):
+            mark_accessed(location)
+            return location
+        print("unpacking {0} again, store entry does not match".format(
+            wheel.filename,
+        ))
+        _discard_unpacked_wheel(location)
+    temp_location = tempfile.mkdtemp(prefix="unpack-", dir=STORE_DIR)
+    try:
+        _unpack_wheel(wheel, temp_location)
+    except Exception:
+        shutil.rmtree(temp_location, ignore_errors=True)
+        raise
+    try:
+        os.rename(temp_location, location)
+    except OSError:
+        # Another process finished unpacking the same wheel first.
+        if not os.path.isdir(location):
+            raise
+        shutil.rmtree(temp_location, ignore_errors=True)
+    return location
+
+
+def _reflink(source, target):
+    if fcntl is None:
+        raise OSError(errno.ENOTSUP, "reflink not supported", target)
+    with io.open(source, "rb") as src, io.open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copymode(source, target)
+
+
+def link_file(source, target, method):
+    """Materialize `source` as `target` with the given link method.
+
+    Hard links are not possible across devices, and reflinks are only
+    supported by some file systems. Fall back to copying in those cases.
+    """
+    vistir.mkdir_p(os.path.dirname(target))
+    if os.path.lexists(target):
+        os.unlink(target)
+    try:
+        if method == "hardlink":
+            os.link(source, target)
+            return
+        elif method == "reflink":
+            _reflink(source, target)
+            return
+    except (IOError, OSError):
+        if os.path.lexists(target):
+            os.unlink(target)
+    shutil.copy2(source, target)
+
+
+def _read_wheel_info(store, wheel):
+    path = os.path.join(store, _get_dist_info_name(wheel), "WHEEL")
+    with io.open(path, encoding="utf-8") as f:
+        return email.message_from_file(f)
+
+
+def _read_record(store, wheel):
+    path = os.path.join(store, _get_dist_info_name(wheel), "RECORD")
+    with distlib.util.CSVReader(path=path) as reader:
+        return list(reader)
+
+
+def _read_console_scripts(store, wheel):
+    path = os.path.join(store, _get_dist_info_name(wheel), "entry_points.txt")
+    try:
+        with io.open(path, "rb") as f:
+            exports = distlib.util.read_exports(f)
+    except (IOError, OSError):
+        return []
+    specs = []
+    for key, options in (("console_scripts", None), ("gui_scripts", {"gui": True})):
+        for entry in exports.get(key, {}).values():
+            spec = "{0} = {1}:{2}".format(entry.name, entry.prefix, entry.suffix)
+            if entry.flags:
+                spec += " [{0}]".format(",".join(entry.flags))
+            specs.append((spec, options))
+    return specs
+
+
+def _write_record(dist, rows, prefix):
+    """Write RECORD for the installed distribution.
+
+    This matches `InstalledDistribution.write_installed_files()`, but reuses
+    hashes from the wheel's own RECORD for linked files, since their content
+    is identical and need not be read again.
+    """
+    prefix = os.path.join(prefix, "")
+    base = os.path.dirname(dist.path)
+    base_under_prefix = base.startswith(prefix)
+    base = os.path.join(base, "")
+    record_path = dist.get_distinfo_file("RECORD")
+    with distlib.util.CSVWriter(record_path) as writer:
+        for path, hash_value, size in rows:
+            if path.startswith(base) or (
+                    base_under_prefix and path.startswith(prefix)):
+                path = os.path.relpath(path, base)
+            writer.writerow((path, hash_value, size))
+        writer.writerow((os.path.relpath(record_path, base), "", ""))
+
+
+def _make_script(maker, specification, options=None):
+    filenames = maker.make(specification, options)
+    distlib.util.FileOperator().set_executable_mode(filenames)
+    return filenames
+
+
+def install_linked(wheel, paths, maker, method, digest, verify=False):
+    """Install a wheel by linking files from the shared store.
+
+    `digest` is the SHA256 hex digest of the wheel file. If `verify` is true,
+    the store directory is checked against the wheel before it is used.
+
+    This mirrors `distlib.wheel.Wheel.install()`. Scripts are still written
+    by `maker` since their shebangs depend on the target interpreter, and
+    RECORD is written so the installation can be uninstalled normally.
+
+    Returns a `distlib.database.InstalledDistribution` instance.
+    """
+    store = get_unpacked_wheel(wheel, digest, verify=verify)
+    info_dir = _get_dist_info_name(wheel)
+    data_prefix = "{0}/".format(_get_data_name(wheel))
+    script_prefix = "{0}scripts/".format(data_prefix)
+    skipped = {"{0}/WHEEL".format(info_dir), "{0}/RECORD".format(info_dir)}
+
+    if _read_wheel_info(store, wheel)["Root-Is-Purelib"] == "true":
+        libdir = paths["purelib"]
+    else:
+        libdir = paths["platlib"]
+
+    fileop = distlib.util.FileOperator()
+    written = []    # For rollback.
+    rows = []       # For RECORD. Hash is None if it needs to be calculated.
+    try:
+        for arcname, hash_value, size in _read_record(store, wheel):
+            if arcname in skipped:
+                continue
+            source = os.path.join(store, *arcname.split("/"))
+            if arcname.startswith(data_prefix):
+                _, where, relpath = arcname.split("/", 2)
+                target = os.path.join(paths[where], *relpath.split("/"))
+            else:
+                target = os.path.join(libdir, *arcname.split("/"))
+            if arcname.startswith(script_prefix) and not arcname.endswith(".exe"):
+                # Rewrite shebangs for this environment.
+                maker.source_dir = os.path.dirname(source)
+                maker.target_dir = os.path.dirname(target)
+                filenames = _make_script(maker, os.path.basename(source))
+                written.extend(filenames)
+                rows.extend((f, None, None) for f in filenames)
+                continue
+            link_file(source, target, method)
+            written.append(target)
+            rows.append((target, hash_value, size))
+            if target.endswith(".py") and not sys.dont_write_bytecode:
+                pyc = fileop.byte_compile(target)
+                written.append(pyc)
+                rows.append((pyc, "", ""))
+
+        specs = _read_console_scripts(store, wheel)
+        if specs:
+            maker.target_dir = paths["scripts"]
+            for spec, options in specs:
+                filenames = _make_script(maker, spec, options)
+                written.extend(filenames)
+                rows.extend((f, None, None) for f in filenames)
+
+        dist = distlib.database.InstalledDistribution(
+            os.path.join(libdir, info_dir),
+        )
+        shared_paths = {k: v for k, v in paths.items()
+                        if k not in ("purelib", "platlib")}
+        shared_paths["lib"] = libdir
+        shared = dist.write_shared_locations(shared_paths)
+        if shared:
+            written.append(shared)
+            rows.append((shared, None, None))
+
+        # Hash generated files; linked ones already have hashes from RECORD.
+        for i, (path, hash_value, size) in enumerate(rows):
+            if hash_value is not None:
+                continue
+            with io.open(path, "rb") as f:
+                data = f.read()
+            rows[i] = (path, _get_record_hash(data), str(len(data)))
+        _write_record(dist, rows, paths["prefix"])
+    except Exception:
+        for path in written:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        raise
+    return dist
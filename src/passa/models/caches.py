@@ -1,21 +1,40 @@
 # -*- coding=utf-8 -*-
 
-from __future__ import absolute_import, unicode_literals
+from __future__ import absolute_import, print_function, unicode_literals
 
+import contextlib
 import copy
+import errno
 import hashlib
 import json
+import marshal
+import mmap
 import os
 import sys
+import tempfile
+import time
 
 import appdirs
 import pip_shims
 import requests
+import six
 import vistir
 
+from ..internals import profiling
 from ..internals._pip_shims import VCS_SUPPORT
+from ..internals.targets import format_target
 from ..internals.utils import get_pinned_version
 
+try:
+    import fcntl
+except ImportError:     # Windows.
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:     # POSIX.
+    msvcrt = None
+
 
 CACHE_DIR = os.environ.get("PASSA_CACHE_DIR", appdirs.user_cache_dir("passa"))
 
@@ -45,8 +64,13 @@ class HashCache(pip_shims.SafeFileCache):
         if can_hash:
             # hash url WITH fragment
             hash_value = self.get(new_location.url)
-        if not hash_value:
-            hash_value = self._get_file_hash(new_location)
+        if hash_value:
+            profiling.count("hash-cache.hit")
+        else:
+            profiling.count("hash-cache.miss")
+            with profiling.span(
+                    "download-and-hash", "hash-cache", url=new_location.url):
+                hash_value = self._get_file_hash(new_location)
             hash_value = hash_value.encode('utf8')
         if can_hash:
             self.set(new_location.url, hash_value)
@@ -59,6 +83,36 @@ class HashCache(pip_shims.SafeFileCache):
                 h.update(chunk)
         return ":".join([h.name, h.hexdigest()])
 
+    def _get_pin_key(self, requirement, sources, target):
+        # Artifacts of a pin depend on the indexes it is looked up in, and
+        # the target environment they are filtered for.
+        return "pin:{0}=={1}:{2}:{3}".format(
+            requirement.normalized_name,
+            get_pinned_version(requirement.as_ireq()),
+            " ".join(sorted(source["url"] for source in sources)),
+            format_target(target) if target else "",
+        )
+
+    def get_pinned_hashes(self, requirement, sources, target=None):
+        """Get hashes recorded for a pinned requirement, or None if unknown.
+
+        This allows locking a pin offline, without listing its artifacts.
+        """
+        data = self.get(self._get_pin_key(requirement, sources, target))
+        if not data:
+            return None
+        try:
+            hashes = json.loads(data.decode("utf-8"))
+        except ValueError:
+            return None
+        return set(hashes)
+
+    def set_pinned_hashes(self, requirement, sources, hashes, target=None):
+        self.set(
+            self._get_pin_key(requirement, sources, target),
+            json.dumps(sorted(hashes)).encode("utf-8"),
+        )
+
 
 # pip-tools's dependency cache implementation.
 class CorruptCacheError(Exception):
@@ -87,19 +141,273 @@ def _key_from_req(req):
     return key
 
 
-def _read_cache_file(cache_file_path):
-    with open(cache_file_path, 'r') as cache_file:
+def _make_cache_key(name, version, extras):
+    extras = tuple(sorted(extras or ()))
+    if not extras:
+        extras_string = ""
+    else:
+        extras_string = "[{}]".format(",".join(extras))
+    name = name.replace('_', '-').lower()
+    return name, "{}{}".format(version, extras_string)
+
+
+def _rename_over(source, target):
+    try:
+        replace = os.replace
+    except AttributeError:  # Python 2.
+        if os.name == 'nt' and os.path.exists(target):
+            os.remove(target)
+        replace = os.rename
+    replace(source, target)
+
+
+def _replace_file(path, data):
+    """Write `data` to a temporary file, and move it into place.
+
+    Other processes see either the old file or the new one, never a partially
+    written one.
+    """
+    fd, temp_path = tempfile.mkstemp(
+        prefix='.tmp-', dir=os.path.dirname(os.path.abspath(path)),
+    )
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        _rename_over(temp_path, path)
+    except BaseException:
         try:
-            doc = json.load(cache_file)
-        except ValueError:
-            raise CorruptCacheError(cache_file_path)
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+@contextlib.contextmanager
+def _locked(path):
+    """Hold an exclusive lock associated with `path` across processes.
+
+    The lock is taken on a separate file, which is never removed, since
+    removing a lock file while someone waits on it is a race.
+    """
+    with open('{0}.lock'.format(path), 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextlib.contextmanager
+def _locked_all(paths):
+    """Hold locks of all `paths`, taken in sorted order to avoid deadlocks.
+    """
+    paths = sorted(set(paths))
+    if not paths:
+        yield
+        return
+    with _locked(paths[0]), _locked_all(paths[1:]):
+        yield
+
+
+def _quarantine(path):
+    """Move a corrupt file aside, keeping only the latest one for inspection.
+    """
+    directory, filename = os.path.split(path)
+    prefix = '{0}.corrupt-'.format(filename)
+    for name in os.listdir(directory or os.curdir):
+        if name.startswith(prefix):
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError:
+                pass
+    target = '{0}.corrupt-{1}'.format(path, int(time.time()))
+    try:
+        os.rename(path, target)
+    except OSError:
+        return
+    print('moved corrupt cache file {0} to {1}, starting afresh'.format(
+        path, target,
+    ))
+
+
+_DELETED = object()
+
+
+def _apply_change(sections, change):
+    section, keys, value = change
+    container = sections[section]
+    for key in keys[:-1]:
+        if value is _DELETED and key not in container:
+            return
+        container = container.setdefault(key, {})
+    if value is _DELETED:
+        container.pop(keys[-1], None)
+    else:
+        container[keys[-1]] = value
+
+
+class _FileCache(object):
+    """Base class of caches persisted in a single file.
+
+    The content is a mapping of sections, each a (possibly nested) dict.
+
+    Multiple processes can share the file. Changes are recorded in memory,
+    and replayed onto the file's latest content when written, under an
+    exclusive lock, so no process loses another's entries. The result is
+    moved into place atomically, so reading never needs to wait for the
+    lock. A corrupt file, or one in an unknown format, is moved aside, and
+    the cache starts empty.
+    """
+    sections = ()
+
+    def __init__(self, cache_file):
+        self._cache_file = cache_file
+        self._sections = None
+        self._changes = []
+        self._cleared = False
+
+    def _decode(self, f):
+        """Read sections from the file object. Raise CorruptCacheError if the
+        content cannot be read.
+        """
+        raise NotImplementedError
+
+    def _encode(self, sections):
+        raise NotImplementedError
+
+    def _get_empty_sections(self):
+        return {name: {} for name in self.sections}
+
+    def _read_file(self, locked=False):
+        try:
+            f = open(self._cache_file, 'rb')
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return self._get_empty_sections()
+        try:
+            with f:
+                return self._decode(f)
+        except CorruptCacheError:
+            if not locked:
+                # Check again under the lock, in case a writer fixed it.
+                with _locked(self._cache_file):
+                    return self._read_file(locked=True)
+            _quarantine(self._cache_file)
+            return self._get_empty_sections()
+
+    def _get_section(self, name):
+        if self._sections is None:
+            self.read_cache()
+        return self._sections[name]
 
-        # Check version and load the contents
-        assert doc['__format__'] == 1, 'Unknown cache file format'
-        return doc['dependencies']
+    def _set(self, section, keys, value):
+        self._get_section(section)  # Make sure the content is loaded.
+        change = (section, keys, value)
+        self._changes.append(change)
+        _apply_change(self._sections, change)
 
+    def read_cache(self):
+        """Reads the cached contents into memory.
+
+        Changes not yet written are kept.
+        """
+        sections = self._read_file()
+        for change in self._changes:
+            _apply_change(sections, change)
+        self._sections = sections
+
+    def _merge_changes(self):
+        """Replay changes onto the file's latest content. Call under lock.
+        """
+        if self._cleared:
+            sections = self._get_empty_sections()
+        else:
+            sections = self._read_file(locked=True)
+        for change in self._changes:
+            _apply_change(sections, change)
+        return sections
+
+    def _set_written(self, sections):
+        self._sections = sections
+        self._changes = []
+        self._cleared = False
+
+    def write_cache(self):
+        """Writes changes to disk, merged with changes from other processes.
+        """
+        write_caches([self])
+
+    def flush(self):
+        """Write changes to disk, if there are any.
+        """
+        if self._changes or self._cleared:
+            self.write_cache()
+
+    def clear(self):
+        self._sections = self._get_empty_sections()
+        self._changes = []
+        self._cleared = True
+        self.write_cache()
+
+
+def write_caches(caches):
+    """Write changes of multiple caches in one transaction.
+
+    Locks of all caches are held while writing, so other writers see changes
+    of all caches or none, and every file is encoded before any is replaced,
+    so a failure leaves all of them untouched. Files are replaced in the
+    given order; list the cache readers check first last.
+    """
+    with _locked_all(cache._cache_file for cache in caches):
+        merged = [cache._merge_changes() for cache in caches]
+        encoded = [
+            cache._encode(sections) for cache, sections in zip(caches, merged)
+        ]
+        for cache, data in zip(caches, encoded):
+            _replace_file(cache._cache_file, data)
+    for cache, sections in zip(caches, merged):
+        cache._set_written(sections)
+
+
+def flush_together(caches):
+    """Write changes of the caches having any in one transaction.
 
-class _JSONCache(object):
+    See `write_caches()`.
+    """
+    changed = [cache for cache in caches if cache._changes or cache._cleared]
+    if changed:
+        write_caches(changed)
+
+
+def _decode_json(f, section_names):
+    try:
+        doc = json.loads(f.read().decode('utf-8'))
+    except ValueError:
+        raise CorruptCacheError(f.name)
+    if not isinstance(doc, dict) or doc.get('__format__') != 1:
+        raise CorruptCacheError(f.name)
+    sections = {name: doc.get(name, {}) for name in section_names}
+    if not all(isinstance(section, dict) for section in sections.values()):
+        raise CorruptCacheError(f.name)
+    return sections
+
+
+def _encode_json(sections):
+    doc = {'__format__': 1}
+    doc.update(sections)
+    return json.dumps(doc, sort_keys=True).encode('utf-8')
+
+
+class _JSONCache(_FileCache):
     """A persistent cache backed by a JSON file.
 
     The cache file is written to the appropriate user cache dir for the
@@ -108,8 +416,12 @@ class _JSONCache(object):
         ~/.cache/pip-tools/depcache-pyX.Y.json
 
     Where X.Y indicates the Python version.
+
+    Setting or deleting entries only changes the cache in memory. Call
+    `flush()` to write them to disk.
     """
     filename_format = None
+    sections = ('dependencies', 'checksums')
 
     def __init__(self, cache_dir=CACHE_DIR):
         vistir.mkdir_p(cache_dir)
@@ -117,8 +429,15 @@ class _JSONCache(object):
         cache_filename = self.filename_format.format(
             python_version=python_version,
         )
-        self._cache_file = os.path.join(cache_dir, cache_filename)
-        self._cache = None
+        super(_JSONCache, self).__init__(
+            os.path.join(cache_dir, cache_filename),
+        )
+
+    def _decode(self, f):
+        return _decode_json(f, self.sections)
+
+    def _encode(self, sections):
+        return _encode_json(sections)
 
     @property
     def cache(self):
@@ -126,9 +445,13 @@ class _JSONCache(object):
 
         This property lazily loads the cache from disk.
         """
-        if self._cache is None:
-            self.read_cache()
-        return self._cache
+        return self._get_section('dependencies')
+
+    @property
+    def checksums(self):
+        """Checksums of entries known to be valid, keyed like `cache`.
+        """
+        return self._get_section('checksums')
 
     def as_cache_key(self, ireq):
         """Given a requirement, return its cache key.
@@ -144,36 +467,14 @@ class _JSONCache(object):
 
             ("ipython", "2.1.0[nbconvert,notebook]")
         """
-        extras = tuple(sorted(ireq.extras))
-        if not extras:
-            extras_string = ""
-        else:
-            extras_string = "[{}]".format(",".join(extras))
         name = _key_from_req(ireq.req)
         version = get_pinned_version(ireq)
-        return name, "{}{}".format(version, extras_string)
-
-    def read_cache(self):
-        """Reads the cached contents into memory.
-        """
-        if os.path.exists(self._cache_file):
-            self._cache = _read_cache_file(self._cache_file)
-        else:
-            self._cache = {}
-
-    def write_cache(self):
-        """Writes the cache to disk as JSON.
-        """
-        doc = {
-            '__format__': 1,
-            'dependencies': self._cache,
-        }
-        with open(self._cache_file, 'w') as f:
-            json.dump(doc, f, sort_keys=True)
+        return _make_cache_key(name, version, ireq.extras)
 
-    def clear(self):
-        self._cache = {}
-        self.write_cache()
+    def _set_entry(self, key, values):
+        self._set('dependencies', key, values)
+        # The content changed. It needs to be validated again.
+        self._set('checksums', key, _DELETED)
 
     def __contains__(self, ireq):
         pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
@@ -184,23 +485,45 @@ class _JSONCache(object):
         return self.cache[pkgname][pkgversion_and_extras]
 
     def __setitem__(self, ireq, values):
-        pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
-        self.cache.setdefault(pkgname, {})
-        self.cache[pkgname][pkgversion_and_extras] = values
-        self.write_cache()
+        self._set_entry(self.as_cache_key(ireq), values)
 
     def __delitem__(self, ireq):
-        pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
-        try:
-            del self.cache[pkgname][pkgversion_and_extras]
-        except KeyError:
+        if ireq not in self:
             return
-        self.write_cache()
+        self._set_entry(self.as_cache_key(ireq), _DELETED)
 
     def get(self, ireq, default=None):
         pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
         return self.cache.get(pkgname, {}).get(pkgversion_and_extras, default)
 
+    def get_checksum(self, ireq):
+        pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
+        return self.checksums.get(pkgname, {}).get(pkgversion_and_extras)
+
+    def set_checksum(self, ireq, checksum):
+        """Record the entry as valid, so it does not need to be checked again.
+
+        The checksum should cover everything that was validated. An entry
+        whose content no longer matches its checksum should be checked again.
+        """
+        self._set('checksums', self.as_cache_key(ireq), checksum)
+
+    def update(self, entries, checksums=None):
+        """Set multiple entries at once. Call `flush()` to write them to disk.
+
+        `entries` is an iterable of `((name, version, extras), values)`. Keys
+        are built the same way as `as_cache_key()`, without needing an
+        InstallRequirement for each entry. `checksums` optionally maps keys of
+        entries known to be valid to their checksums.
+        """
+        checksums = checksums or {}
+        for (name, version, extras), values in entries:
+            key = _make_cache_key(name, version, extras)
+            self._set_entry(key, values)
+            checksum = checksums.get((name, version, extras))
+            if checksum is not None:
+                self._set('checksums', key, checksum)
+
 
 class DependencyCache(_JSONCache):
     """Cache the dependency of cancidates.
@@ -212,3 +535,217 @@ class RequiresPythonCache(_JSONCache):
     """Cache a candidate's Requires-Python information.
     """
     filename_format = "pyreqcache-py{python_version}.json"
+
+
+class ArtifactDependencyCache(_JSONCache):
+    """Cache dependencies of requirements that have no pinned version.
+
+    Entries are keyed by `(name, identity, extras)` instead of an
+    InstallRequirement, where identity describes the exact artifact, e.g. the
+    content hash of a local archive or directory, or a VCS commit. The value
+    is a `[dependencies, requires_python]` pair.
+    """
+    filename_format = "artifactcache-py{python_version}.json"
+
+    def as_cache_key(self, key):
+        name, identity, extras = key
+        return _make_cache_key(name, identity, extras)
+
+
+class ParsedRequirementCache(_FileCache):
+    """Remember how dependency lines are parsed.
+
+    Each line maps to a `(name, specifier, extras, marker)` tuple, so the
+    requirement can be rebuilt without going through the full line parser.
+    The file is encoded with marshal, which is fast to load but specific to
+    the Python version, hence the version in the filename. It is mapped into
+    memory instead of read into a buffer first.
+
+    Entries written with a different `version` are ignored, and dropped on
+    the next write, since parts are only valid for the parser that produced
+    them.
+    """
+    filename_format = "parsed-py{python_version}.bin"
+    sections = ('requirements',)
+
+    def __init__(self, cache_dir=CACHE_DIR, version=""):
+        self.version = version
+        vistir.mkdir_p(cache_dir)
+        python_version = ".".join(str(digit) for digit in sys.version_info[:2])
+        cache_filename = self.filename_format.format(
+            python_version=python_version,
+        )
+        super(ParsedRequirementCache, self).__init__(
+            os.path.join(cache_dir, cache_filename),
+        )
+
+    def _decode(self, f):
+        if not os.fstat(f.fileno()).st_size:
+            return self._get_empty_sections()
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            # Python 2's marshal does not accept buffers.
+            doc = marshal.loads(mapped if six.PY3 else mapped[:])
+        except (EOFError, TypeError, ValueError):
+            raise CorruptCacheError(self._cache_file)
+        finally:
+            mapped.close()
+        if (not isinstance(doc, dict) or doc.get('__format__') != 1 or
+                not isinstance(doc.get('requirements'), dict)):
+            raise CorruptCacheError(self._cache_file)
+        if doc.get('version', "") != self.version:
+            return self._get_empty_sections()
+        return {'requirements': doc['requirements']}
+
+    def _encode(self, sections):
+        doc = {
+            '__format__': 1,
+            'version': self.version,
+            'requirements': sections['requirements'],
+        }
+        return marshal.dumps(doc)
+
+    @property
+    def cache(self):
+        return self._get_section('requirements')
+
+    def get(self, line, default=None):
+        return self.cache.get(line, default)
+
+    def update(self, entries):
+        """Set parts of multiple lines. Call `flush()` to write them to disk.
+        """
+        for line, parts in entries.items():
+            self._set('requirements', (line,), parts)
+
+
+class SharedDependencyCache(ArtifactDependencyCache):
+    """Cache dependencies of wheels, shared between Python versions.
+
+    A wheel's metadata does not depend on the interpreter reading it, so this
+    is keyed by the wheel's filename and hash instead. Results from building
+    source distributions are NOT stored here, since they may vary.
+    """
+    filename_format = "depcache-shared.json"
+
+
+class IndexPageCache(_FileCache):
+    """Cache parsed content of a project page on a simple index.
+
+    Each page is kept in its own file in ``CACHE_DIR/index-pages``, named by
+    the hash of its URL, so writing one page does not rewrite all others.
+    """
+    sections = ('page',)
+
+    def __init__(self, url, cache_dir=CACHE_DIR):
+        directory = os.path.join(cache_dir, 'index-pages')
+        vistir.mkdir_p(directory)
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        super(IndexPageCache, self).__init__(
+            os.path.join(directory, '{0}.json'.format(digest[:32])),
+        )
+
+    def _decode(self, f):
+        return _decode_json(f, self.sections)
+
+    def _encode(self, sections):
+        return _encode_json(sections)
+
+    @property
+    def page(self):
+        return self._get_section('page')
+
+    def update_page(self, **values):
+        for key, value in values.items():
+            self._set('page', (key,), value)
+        self.write_cache()
+
+
+class VerifiedArtifactCache(_FileCache):
+    """Remember artifacts whose SHA256 hashes are already known.
+
+    Each entry records the size, mtime, and SHA256 of a file. As long as the
+    file's stat data does not change, the recorded hash is trusted, so the
+    file does not need to be read in full again to be verified.
+
+    Only files inside the cache directory are recorded, since artifacts
+    elsewhere (e.g. ephemeral wheels) are not expected to be seen again.
+    """
+    filename = "artifacts.json"
+    sections = ('artifacts',)
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        vistir.mkdir_p(cache_dir)
+        self._directory = os.path.join(os.path.abspath(cache_dir), "")
+        super(VerifiedArtifactCache, self).__init__(
+            os.path.join(cache_dir, self.filename),
+        )
+
+    def _decode(self, f):
+        return _decode_json(f, self.sections)
+
+    def _encode(self, sections):
+        return _encode_json(sections)
+
+    @property
+    def cache(self):
+        return self._get_section('artifacts')
+
+    def _get_fresh_entry(self, path):
+        try:
+            entry = self.cache[path]
+            stat = os.stat(path)
+        except (KeyError, OSError):
+            return None
+        if entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+            return None
+        return entry
+
+    def get_hash(self, path, verify=False):
+        """Get the SHA256 hex digest of the file at `path`.
+
+        The file is only read if it is not recorded, its stat data changed,
+        or `verify` is true.
+        """
+        path = os.path.abspath(path)
+        entry = None if verify else self._get_fresh_entry(path)
+        if entry is not None:
+            return entry['sha256']
+        stat = os.stat(path)
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(8096), b""):
+                h.update(chunk)
+        value = h.hexdigest()
+        self._record(path, stat, value)
+        return value
+
+    def _record(self, path, stat, value):
+        if not path.startswith(self._directory):
+            return
+        self._set('artifacts', (path,), {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha256': value,
+        })
+        self.write_cache()
+
+    def set_hash(self, path, value):
+        """Record the SHA256 hex digest of the file at `path`.
+
+        This is for a digest computed elsewhere, e.g. by pip while verifying
+        a download, so the file does not need to be read again.
+        """
+        path = os.path.abspath(path)
+        self._record(path, os.stat(path), value)
+
+    def is_verified(self, path, hashes):
+        """Check whether the file is recorded to match one of `hashes`.
+
+        `hashes` are formatted as in Pipfile.lock. This never reads the file;
+        unrecorded or changed files are considered not verified.
+        """
+        entry = self._get_fresh_entry(os.path.abspath(path))
+        if entry is None:
+            return False
+        return "sha256:{0}".format(entry['sha256']) in set(hashes or ())
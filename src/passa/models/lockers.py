@@ -1,8 +1,9 @@
 # -*- coding=utf-8 -*-
 
-from __future__ import absolute_import, unicode_literals
+from __future__ import absolute_import, print_function, unicode_literals
 
 import itertools
+import multiprocessing
 
 import resolvelib
 
@@ -10,13 +11,29 @@ import plette
 import requirementslib
 import vistir
 
+from ..internals import profiling
+from ..internals._pip import get_cached_index_hashes
 from ..internals.hashes import get_hashes
+from ..internals.dependencies import flush_caches
 from ..internals.reporters import StdOutReporter
+from ..internals.targets import (
+    format_target, get_environment, get_requires_python, merge_sections,
+)
 from ..internals.traces import trace_graph
-from ..internals.utils import identify_requirment
+from ..internals.utils import filter_sources, identify_requirment
 from .caches import HashCache
 from .metadata import set_metadata
-from .providers import BasicProvider, EagerUpgradeProvider, PinReuseProvider
+from .projects import Project
+from .providers import (
+    BasicProvider, EagerUpgradeProvider, IncrementalProvider, PinReuseProvider,
+)
+
+
+# Shared by all lockers in the process.
+HASH_CACHE = HashCache()
+
+# Key in the lock file's _meta section holding dependencies of each pin.
+LOCKED_DEPENDENCIES_KEY = "passa-dependencies"
 
 
 def _get_requirements(model, section_name):
@@ -30,6 +47,38 @@ def _get_requirements(model, section_name):
     )}
 
 
+def _get_locked_dependencies(lockfile):
+    """Get dependencies of each pin recorded in the lock file.
+    """
+    if not lockfile:
+        return {}
+    return lockfile._data.get("_meta", {}).get(LOCKED_DEPENDENCIES_KEY) or {}
+
+
+def _collect_locked_dependencies(state, provider):
+    """Produce a mapping of dependencies of each named candidate.
+
+    Each value holds the pinned version, the dependency lines, and the
+    Requires-Python of the candidate, as used by the resolver.
+    """
+    entries = {}
+    for identifier, candidate in state.mapping.items():
+        if (not candidate.is_named or
+                identifier not in provider.fetched_dependencies):
+            continue
+        entries[identifier] = {
+            "version": candidate.get_specifier().version,
+            "dependencies": sorted(
+                r.as_line(include_hashes=False)
+                for r in provider.fetched_dependencies[identifier].values()
+            ),
+            "requires_python": provider.collected_requires_pythons.get(
+                identifier, "",
+            ),
+        }
+    return entries
+
+
 def _get_requires_python(pipfile):
     try:
         requires = pipfile.requires
@@ -78,6 +127,19 @@ def _collect_derived_entries(state, traces, identifiers):
     return entries
 
 
+class OfflineLockError(RuntimeError):
+    """Raised if an offline lock needs something not in the local caches.
+    """
+    def __init__(self, missing):
+        super(OfflineLockError, self).__init__(missing)
+        self.missing = missing
+
+    def __str__(self):
+        return "missing from local caches: {0}".format(
+            ", ".join(self.missing),
+        )
+
+
 class AbstractLocker(object):
     """Helper class to produce a new lock file for a project.
 
@@ -88,9 +150,19 @@ class AbstractLocker(object):
     * Perform the actually resolver invocation
     * Convert resolver output into lock file format
     * Update the project to have the new lock file
+
+    If `offline` is true, the lock is performed only with data in local
+    caches (and the existing lock file, for lockers reusing pins). An
+    `OfflineLockError` listing everything missing is raised if that is not
+    enough.
+
+    If `target` is given, the lock is performed for that target environment
+    (see `passa.internals.targets`) instead of any environment.
     """
-    def __init__(self, project):
+    def __init__(self, project, offline=False, target=None):
         self.project = project
+        self.offline = offline
+        self.target = target
         self.default_requirements = _get_requirements(
             project.pipfile, "packages",
         )
@@ -110,6 +182,11 @@ class AbstractLocker(object):
             project.pipfile.get("pipenv", {}).get("allow_prereleases", False),
         )
         self.requires_python = _get_requires_python(project.pipfile)
+        self.resolved_dependencies = None
+        self.environment = None
+        if target is not None:
+            self.requires_python = get_requires_python(target)
+            self.environment = get_environment(target)
 
     def __repr__(self):
         return "<{0} @ {1!r}>".format(type(self).__name__, self.project.root)
@@ -133,34 +210,111 @@ class AbstractLocker(object):
         * Populate markers based on dependency specifications of each
           candidate, and the dependency graph.
         """
+        default, develop = self.lock_sections()
+        lockfile = plette.Lockfile.with_meta_from(self.project.pipfile)
+        lockfile["default"] = default
+        lockfile["develop"] = develop
+        if self.resolved_dependencies:
+            # Recorded so later incremental locks can reuse them.
+            lockfile._data["_meta"][LOCKED_DEPENDENCIES_KEY] = (
+                self.resolved_dependencies
+            )
+        self.project.lockfile = lockfile
+
+    def lock_sections(self):
+        """Lock requirements, and return the default and develop sections.
+        """
+        try:
+            return self._lock_sections()
+        finally:
+            # Entries looked up while locking are written once, at the end.
+            flush_caches()
+
+    def _lock_sections(self):
         provider = self.get_provider()
         reporter = self.get_reporter()
         resolver = resolvelib.Resolver(provider, reporter)
 
-        with vistir.cd(self.project.root):
-            state = resolver.resolve(self.requirements)
-
-        traces = trace_graph(state.graph)
-
-        hash_cache = HashCache()
-        for r in state.mapping.values():
-            if not r.hashes:
-                r.hashes = get_hashes(hash_cache, r)
-
-        set_metadata(
-            state.mapping, traces,
-            provider.fetched_dependencies,
-            provider.collected_requires_pythons,
-        )
-
-        lockfile = plette.Lockfile.with_meta_from(self.project.pipfile)
-        lockfile["default"] = _collect_derived_entries(
-            state, traces, self.default_requirements,
-        )
-        lockfile["develop"] = _collect_derived_entries(
-            state, traces, self.develop_requirements,
-        )
-        self.project.lockfile = lockfile
+        with vistir.cd(self.project.root), profiling.span("resolve", "phase"):
+            try:
+                state = resolver.resolve(self.requirements)
+            except resolvelib.NoVersionsAvailable as e:
+                if not self.offline:
+                    raise
+                raise OfflineLockError(provider.missing + [
+                    "candidates of {0}".format(
+                        e.requirement.as_line(include_hashes=False),
+                    ),
+                ])
+            except resolvelib.ResolutionError:
+                # Missing dependencies may be why resolution failed.
+                if not provider.missing:
+                    raise
+                raise OfflineLockError(provider.missing)
+        if provider.missing:
+            raise OfflineLockError(provider.missing)
+
+        # Dependencies filtered for a target would be wrong for other ones.
+        if self.environment is None:
+            self.resolved_dependencies = _collect_locked_dependencies(
+                state, provider,
+            )
+
+        with profiling.span("trace", "phase"):
+            traces = trace_graph(state.graph)
+
+        with profiling.span("hash", "phase"):
+            self._populate_hashes(state.mapping.values())
+
+        with profiling.span("metadata", "phase"):
+            set_metadata(
+                state.mapping, traces,
+                provider.fetched_dependencies,
+                provider.collected_requires_pythons,
+            )
+            default = _collect_derived_entries(
+                state, traces, self.default_requirements,
+            )
+            develop = _collect_derived_entries(
+                state, traces, self.develop_requirements,
+            )
+        return default, develop
+
+    def _populate_hashes(self, candidates):
+        missing_hashes = []
+        for r in candidates:
+            if r.hashes:
+                continue
+            hashes = None
+            sources = filter_sources(r, self.sources)
+            if r.is_named:
+                # Index pages read while finding candidates list the hashes
+                # of most files, so pip is only needed for the rest.
+                hashes = get_cached_index_hashes(
+                    r.name, r.get_specifier().version, sources,
+                    target=self.target,
+                )
+            if hashes is None and not self.offline:
+                with profiling.span("get_hashes", "hash", package=r.name):
+                    hashes = get_hashes(
+                        HASH_CACHE, r, sources, target=self.target,
+                    )
+                if r.is_named:
+                    HASH_CACHE.set_pinned_hashes(
+                        r, self.sources, hashes, target=self.target,
+                    )
+            elif hashes is None and r.is_named:
+                hashes = HASH_CACHE.get_pinned_hashes(
+                    r, self.sources, target=self.target,
+                )
+                if hashes is None:
+                    missing_hashes.append("hashes of {0}".format(
+                        r.as_line(include_hashes=False),
+                    ))
+            if hashes:
+                r.hashes = hashes
+        if missing_hashes:
+            raise OfflineLockError(sorted(missing_hashes))
 
 
 class BasicLocker(AbstractLocker):
@@ -173,6 +327,8 @@ class BasicLocker(AbstractLocker):
         return BasicProvider(
             self.requirements, self.sources,
             self.requires_python, self.allow_prereleases,
+            offline=self.offline, environment=self.environment,
+            target=self.target,
         )
 
 
@@ -181,10 +337,13 @@ class PinReuseLocker(AbstractLocker):
 
     See :class:`.providers.PinReuseProvider` for more information.
     """
-    def __init__(self, project):
-        super(PinReuseLocker, self).__init__(project)
+    def __init__(self, project, offline=False, target=None):
+        super(PinReuseLocker, self).__init__(
+            project, offline=offline, target=target,
+        )
         pins = _get_requirements(project.lockfile, "develop")
         pins.update(_get_requirements(project.lockfile, "default"))
+        self.locked_dependencies = _get_locked_dependencies(project.lockfile)
         for pin in pins.values():
             pin.markers = None
         self.preferred_pins = pins
@@ -193,8 +352,50 @@ class PinReuseLocker(AbstractLocker):
         return PinReuseProvider(
             self.preferred_pins, self.requirements, self.sources,
             self.requires_python, self.allow_prereleases,
+            offline=self.offline, environment=self.environment,
+            target=self.target,
+        )
+
+
+class IncrementalLocker(PinReuseLocker):
+    """A specialized locker to re-lock only what changed since the last lock.
+
+    Pins in the existing lock file that still satisfy the requirements are
+    kept as-is, without querying the index for other versions. Only new or
+    changed requirements, and dependencies not satisfied by existing pins,
+    are resolved against the index.
+
+    If the kept pins make resolution impossible, this falls back to a full
+    re-lock that prefers existing pins. See
+    :class:`.providers.IncrementalProvider` for more information.
+    """
+    def __init__(self, project, offline=False, target=None):
+        super(IncrementalLocker, self).__init__(
+            project, offline=offline, target=target,
+        )
+        self.incremental = True
+
+    def get_provider(self):
+        if not self.incremental:
+            return super(IncrementalLocker, self).get_provider()
+        return IncrementalProvider(
+            self.locked_dependencies,
+            self.preferred_pins, self.requirements, self.sources,
+            self.requires_python, self.allow_prereleases,
+            offline=self.offline, environment=self.environment,
+            target=self.target,
         )
 
+    def lock(self):
+        try:
+            super(IncrementalLocker, self).lock()
+        except resolvelib.ResolutionError:
+            if not self.incremental:
+                raise
+            print("kept pins conflict with changes, re-locking everything")
+            self.incremental = False
+            super(IncrementalLocker, self).lock()
+
 
 class EagerUpgradeLocker(PinReuseLocker):
     """A specialized locker to handle the "eager" upgrade strategy.
@@ -211,4 +412,82 @@ class EagerUpgradeLocker(PinReuseLocker):
             self.tracked_names, self.preferred_pins,
             self.requirements, self.sources,
             self.requires_python, self.allow_prereleases,
+            offline=self.offline, environment=self.environment,
+            target=self.target,
+        )
+
+
+class TargetLockError(RuntimeError):
+    """Raised if locking fails for one of multiple targets.
+    """
+    def __init__(self, target, reason):
+        super(TargetLockError, self).__init__(target, reason)
+        self.target = target
+        self.reason = reason
+
+    def __str__(self):
+        return "{0}: {1}".format(format_target(self.target), self.reason)
+
+
+def _describe_resolution_error(e):
+    if isinstance(e, resolvelib.NoVersionsAvailable):
+        return "no candidates found for {0}".format(
+            e.requirement.as_line(include_hashes=False),
         )
+    if isinstance(e, resolvelib.ResolutionImpossible):
+        return "conflicting requirements {0}".format(", ".join(
+            r.as_line(include_hashes=False) for r in e.requirements
+        ))
+    return str(e) or type(e).__name__
+
+
+def _lock_target(args):
+    """Lock a project for a target in a worker process.
+
+    Only picklable values are passed back to the parent: plain section
+    mappings, or errors with plain arguments.
+    """
+    root, target, offline = args
+    locker = BasicLocker(Project(root), offline=offline, target=target)
+    try:
+        return locker.lock_sections()
+    except OfflineLockError:
+        raise
+    except resolvelib.ResolutionError as e:
+        raise TargetLockError(target, _describe_resolution_error(e))
+
+
+class MultiTargetLocker(object):
+    """A locker to lock a project for multiple target environments.
+
+    Each target is resolved separately in a worker process. Workers share
+    the on-disk caches, so metadata fetched for one target is reused by
+    others. Results are merged into one lock file, with entries not needed
+    by every target marked with the targets needing them. See
+    :func:`.internals.targets.merge_sections` for more information.
+    """
+    def __init__(self, project, targets, offline=False, workers=None):
+        self.project = project
+        self.targets = list(targets)
+        self.offline = offline
+        self.workers = workers or len(self.targets)
+
+    def __repr__(self):
+        return "<{0} @ {1!r}>".format(type(self).__name__, self.project.root)
+
+    def lock(self):
+        args = [(self.project.root, t, self.offline) for t in self.targets]
+        pool = multiprocessing.Pool(min(self.workers, len(args)))
+        try:
+            results = pool.map(_lock_target, args)
+        finally:
+            pool.close()
+            pool.join()
+        lockfile = plette.Lockfile.with_meta_from(self.project.pipfile)
+        lockfile["default"] = merge_sections(
+            self.targets, [default for default, _ in results],
+        )
+        lockfile["develop"] = merge_sections(
+            self.targets, [develop for _, develop in results],
+        )
+        self.project.lockfile = lockfile
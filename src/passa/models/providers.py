@@ -6,8 +6,12 @@ import os
 
 import resolvelib
 
+from ..internals import profiling
 from ..internals.candidates import find_candidates
-from ..internals.dependencies import get_dependencies
+from ..internals.dependencies import (
+    DependencyCacheMiss, get_dependencies, parse_dependencies,
+)
+from ..internals.markers import get_without_extra
 from ..internals.utils import (
     filter_sources, get_allow_prereleases, identify_requirment, strip_extras,
 )
@@ -20,12 +24,24 @@ class BasicProvider(resolvelib.AbstractProvider):
     """Provider implementation to interface with `requirementslib.Requirement`.
     """
     def __init__(self, root_requirements, sources,
-                 requires_python, allow_prereleases):
+                 requires_python, allow_prereleases, offline=False,
+                 environment=None, target=None):
         self.sources = sources
         self.requires_python = requires_python
         self.allow_prereleases = bool(allow_prereleases)
         self.invalid_candidates = set()
 
+        # If given, dependencies with markers not matching this environment
+        # are dropped, and only wheels installable for the target are
+        # candidates. This is used to lock for a specific target.
+        self.environment = environment
+        self.target = target
+
+        # In offline mode, only local caches are used. Entries not found are
+        # collected, so they can all be reported at once.
+        self.offline = offline
+        self.missing = []
+
         # Remember requirements of each pinned candidate. The resolver calls
         # `get_dependencies()` only when it wants to repin, so the last time
         # the dependencies we got when it is last called on a package, are
@@ -48,10 +64,14 @@ class BasicProvider(resolvelib.AbstractProvider):
 
     def find_matches(self, requirement):
         sources = filter_sources(requirement, self.sources)
-        candidates = find_candidates(
-            requirement, sources, self.requires_python,
-            get_allow_prereleases(requirement, self.allow_prereleases),
-        )
+        with profiling.span(
+                "find_matches", "provider",
+                requirement=lambda: self.identify(requirement)):
+            candidates = find_candidates(
+                requirement, sources, self.requires_python,
+                get_allow_prereleases(requirement, self.allow_prereleases),
+                offline=self.offline, target=self.target,
+            )
         return candidates
 
     def is_satisfied_by(self, requirement, candidate):
@@ -88,12 +108,25 @@ class BasicProvider(resolvelib.AbstractProvider):
 
         return requirement.as_ireq().specifier.contains(version)
 
+    def _applies(self, dependency):
+        if self.environment is None:
+            return True
+        marker = get_without_extra(dependency.markers)
+        return marker is None or marker.evaluate(self.environment)
+
     def get_dependencies(self, candidate):
         sources = filter_sources(candidate, self.sources)
         try:
-            dependencies, requires_python = get_dependencies(
-                candidate, sources=sources,
-            )
+            with profiling.span(
+                    "get_dependencies", "provider",
+                    candidate=lambda: candidate.as_line(include_hashes=False)):
+                dependencies, requires_python = get_dependencies(
+                    candidate, sources=sources, offline=self.offline,
+                )
+        except DependencyCacheMiss as e:
+            self.missing.append("dependencies of {0}".format(e))
+            dependencies = []
+            requires_python = ""
         except Exception as e:
             if os.environ.get("PASSA_NO_SUPPRESS_EXCEPTIONS"):
                 raise
@@ -108,7 +141,8 @@ class BasicProvider(resolvelib.AbstractProvider):
         # packages are not added via this code path. (sarugaku/passa#15)
         dependencies = [
             dependency for dependency in dependencies
-            if dependency.normalized_name not in PROTECTED_PACKAGE_NAMES
+            if dependency.normalized_name not in PROTECTED_PACKAGE_NAMES and
+            self._applies(dependency)
         ]
         if candidate.extras:
             # HACK: If this candidate has extras, add the original candidate
@@ -145,6 +179,47 @@ class PinReuseProvider(BasicProvider):
         return candidates
 
 
+class IncrementalProvider(PinReuseProvider):
+    """A provider that keeps preferred pins without looking for alternatives.
+
+    If a requirement is satisfied by its preferred pin, the pin is the only
+    candidate, so the index is not queried at all. Only new requirements, and
+    ones whose pins no longer satisfy them, are looked up. This means the
+    resolver cannot backtrack out of a kept pin; the caller should fall back
+    to `PinReuseProvider` if resolution fails.
+
+    `locked_dependencies` holds dependencies recorded in the lock file for
+    each pin (see `AbstractLocker.lock()`). They are used for kept pins
+    instead of looking dependencies up again.
+    """
+    def __init__(self, locked_dependencies, *args, **kwargs):
+        super(IncrementalProvider, self).__init__(*args, **kwargs)
+        self.locked_dependencies = locked_dependencies
+
+    def find_matches(self, requirement):
+        pin = self.preferred_pins.get(self.identify(requirement))
+        if pin is not None and self.is_satisfied_by(requirement, pin):
+            return [pin]
+        return super(IncrementalProvider, self).find_matches(requirement)
+
+    def get_dependencies(self, candidate):
+        key = self.identify(candidate)
+        locked = self.locked_dependencies.get(key)
+        if (locked is None or not candidate.is_named or
+                candidate.get_specifier().version != locked.get("version")):
+            return super(IncrementalProvider, self).get_dependencies(candidate)
+        dependencies = [
+            dependency
+            for dependency in parse_dependencies(locked["dependencies"])
+            if self._applies(dependency)
+        ]
+        self.fetched_dependencies[key] = {
+            self.identify(r): r for r in dependencies
+        }
+        self.collected_requires_pythons[key] = locked.get("requires_python", "")
+        return dependencies
+
+
 class EagerUpgradeProvider(PinReuseProvider):
     """A specialized provider to handle an "eager" upgrade strategy.
 
@@ -10,24 +10,30 @@ import sysconfig
 
 import pkg_resources
 
-import packaging.markers
 import packaging.version
 import requirementslib
 
 from ..internals._pip import uninstall, EditableInstaller, WheelInstaller
+from ..internals.bytecode import compile_files
+from ..internals.markers import MarkerEvaluator
+from ..internals.uninstallers import BatchUninstaller
 
 
-def _is_installation_local(name):
+def _is_distribution_local(dist):
     """Check whether the distribution is in the current Python installation.
 
     This is used to distinguish packages seen by a virtual environment. A venv
     may be able to see global packages, but we don't want to mess with them.
     """
-    loc = os.path.normcase(pkg_resources.working_set.by_key[name].location)
+    loc = os.path.normcase(dist.location)
     pre = os.path.normcase(sys.prefix)
     return os.path.commonprefix([loc, pre]) == pre
 
 
+def _is_installation_local(name):
+    return _is_distribution_local(pkg_resources.working_set.by_key[name])
+
+
 def _is_up_to_date(distro, version):
     # This is done in strings to avoid type mismatches caused by vendering.
     return str(version) == str(packaging.version.parse(distro.version))
@@ -113,25 +119,40 @@ PROTECTED_FROM_CLEAN = {"setuptools", "pip", "wheel"}
 
 
 def _clean(names):
-    cleaned = set()
-    for name in names:
-        if name in PROTECTED_FROM_CLEAN:
-            continue
-        with _remove_package(name) as uninst:
+    """Remove installed distributions of given names.
+
+    Distributions installed from wheels are removed together in one batch.
+    Others (e.g. eggs and develop installs) are removed by pip one by one.
+    """
+    by_key = pkg_resources.working_set.by_key
+    dists = [
+        by_key[name] for name in names
+        if name not in PROTECTED_FROM_CLEAN and name in by_key and
+        _is_distribution_local(by_key[name])
+    ]
+    uninstaller = BatchUninstaller(dists, sys.prefix)
+    with uninstaller:
+        cleaned = set(uninstaller.names)
+    for dist in uninstaller.unsupported:
+        with _remove_package(dist.key) as uninst:
             if uninst:
-                cleaned.add(name)
+                cleaned.add(dist.key)
     return cleaned
 
 
 class Synchronizer(object):
     """Helper class to install packages from a project's lock file.
     """
-    def __init__(self, project, default, develop, clean_unneeded):
+    def __init__(self, project, default, develop, clean_unneeded,
+                 link=None, paranoid=False, compile_bytecode=True):
         self._root = project.root   # Only for repr.
         self.packages = _get_packages(project.lockfile, default, develop)
         self.sources = project.lockfile.meta.sources._data
         self.paths = _build_paths()
         self.clean_unneeded = clean_unneeded
+        self.link = link
+        self.paranoid = paranoid
+        self.compile_bytecode = compile_bytecode
 
     def __repr__(self):
         return "<{0} @ {1!r}>".format(type(self).__name__, self._root)
@@ -151,19 +172,23 @@ class Synchronizer(object):
 
         # TODO: Specify installation order? (pypa/pipenv#2274)
         installers = []
+        evaluator = MarkerEvaluator()
         for name, package in self.packages.items():
             r = requirementslib.Requirement.from_pipfile(name, package)
             name = r.normalized_name
             if name in groupcoll.uptodate:
                 continue
             markers = r.markers
-            if markers and not packaging.markers.Marker(markers).evaluate():
+            if markers and not evaluator.evaluate(markers):
                 continue
             r.markers = None
             if r.editable:
                 installer = EditableInstaller(r)
             else:
-                installer = WheelInstaller(r, self.sources, self.paths)
+                installer = WheelInstaller(
+                    r, self.sources, self.paths,
+                    link=self.link, paranoid=self.paranoid,
+                )
             try:
                 installer.prepare()
             except Exception as e:
@@ -175,6 +200,7 @@ class Synchronizer(object):
             else:
                 installers.append((name, installer))
 
+        sources = []
         for name, installer in installers:
             if name in groupcoll.outdated:
                 name_to_remove = name
@@ -190,11 +216,16 @@ class Synchronizer(object):
                     r.as_line(include_hashes=False), e,
                 ))
                 continue
+            sources.extend(installer.get_python_sources())
             if name in groupcoll.outdated or name in groupcoll.noremove:
                 updated.add(name)
             else:
                 installed.add(name)
 
+        # Only compile files installed in this run, in parallel.
+        if self.compile_bytecode and not sys.dont_write_bytecode:
+            compile_files(sources)
+
         return installed, updated, cleaned
 
 
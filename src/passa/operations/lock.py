@@ -5,6 +5,8 @@ from __future__ import absolute_import, print_function, unicode_literals
 from resolvelib import NoVersionsAvailable, ResolutionImpossible
 
 from passa.internals.reporters import print_requirement
+from passa.internals.targets import TargetConflictError, format_target
+from passa.models.lockers import OfflineLockError, TargetLockError
 
 
 def lock(locker):
@@ -23,6 +25,17 @@ def lock(locker):
         print("\nCANNOT RESOLVE.\nOFFENDING REQUIREMENTS:")
         for r in e.requirements:
             print_requirement(r)
+    except OfflineLockError as e:
+        print("\nCANNOT LOCK OFFLINE.\nMISSING FROM LOCAL CACHES:")
+        for entry in e.missing:
+            print("{:>40}".format(entry))
+    except TargetLockError as e:
+        print("\nCANNOT RESOLVE FOR {0}:".format(format_target(e.target)))
+        print("{:>40}".format(e.reason))
+    except TargetConflictError as e:
+        print("\nCANNOT MERGE TARGETS. CONFLICTING PINS:")
+        for entry in e.conflicts:
+            print("{:>40}".format(entry))
     else:
         success = True
     return success
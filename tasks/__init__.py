@@ -1,6 +1,6 @@
 import invoke
 
-from . import admin, package
+from . import admin, benchmark, package
 
 
 def add_tasks(module, prefix=None):
@@ -15,4 +15,5 @@ def add_tasks(module, prefix=None):
 
 namespace = invoke.Collection()
 add_tasks(admin)
+add_tasks(benchmark)
 add_tasks(package)
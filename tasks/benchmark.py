@@ -0,0 +1,171 @@
+import json
+import os
+import pathlib
+import re
+import subprocess
+import sys
+import time
+
+import invoke
+
+from passa.cli import COMMANDS
+
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+BUDGET_FILE = pathlib.Path(__file__).resolve().with_name('import-budget.json')
+
+# Modules that are slow to import, and should only be loaded when needed.
+HEAVY_MODULES = [
+    'distlib', 'pip', 'pip_shims', 'plette', 'requirementslib', 'resolvelib',
+    'tomlkit', 'vistir',
+]
+
+STARTUP_COMMANDS = [
+    ['--version'],
+    ['--help'],
+    ['freeze'],
+]
+
+# Run a command in a fresh interpreter, and report what it imported.
+_PROBE = '''
+import json, sys
+from passa.cli import main
+failed = False
+try:
+    main(sys.argv[1:])
+except SystemExit:
+    pass
+except Exception:
+    failed = True
+roots = {name.split('.', 1)[0] for name in sys.modules}
+sys.__stdout__.write('\\n' + json.dumps({
+    'modules': len(sys.modules),
+    'heavy': sorted(roots.intersection(%r)),
+    'failed': failed,
+}) + '\\n')
+''' % (HEAVY_MODULES,)
+
+
+def _probe(args):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', _PROBE] + args,
+        cwd=str(ROOT), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        env={**os.environ, 'PASSA_NO_DAEMON': '1'}, check=False,
+    )
+    elapsed = time.perf_counter() - start
+    report = json.loads(result.stdout.decode('utf-8').splitlines()[-1])
+    return elapsed, report
+
+
+@invoke.task(help={'repeat': 'number of runs per command (best is kept)'})
+def startup(ctx, repeat=5):
+    """Measure startup time and imports of common CLI invocations.
+    """
+    for args in STARTUP_COMMANDS:
+        runs = [_probe(args) for _ in range(repeat)]
+        elapsed = min(t for t, _ in runs)
+        report = runs[0][1]
+        heavy = ', '.join(report['heavy']) or '-'
+        status = '  (failed)' if report['failed'] else ''
+        print(f'[startup] passa {" ".join(args):<12} {elapsed * 1000:7.1f} ms '
+              f'{report["modules"]:5d} modules  heavy: {heavy}{status}')
+
+
+_RUN_CLI = '''
+import sys
+from passa.cli import main
+try:
+    main(sys.argv[1:])
+except SystemExit:
+    pass
+'''
+
+_IMPORTTIME_LINE_RE = re.compile(
+    r'^import time:\s*(\d+) \|\s*(\d+) \|( *)(\S+)$',
+)
+
+
+def _iter_import_targets():
+    """Yield (name, python arguments) of each measurement.
+    """
+    yield 'passa --version', ['-c', _RUN_CLI, '--version']
+    for command, _ in COMMANDS:
+        yield f'passa {command} --help', ['-c', _RUN_CLI, command, '--help']
+    for module in ('passa.internals._pip', 'passa.models.lockers',
+                   'passa.models.synchronizers'):
+        yield f'import {module}', ['-c', f'import {module}']
+
+
+def _measure_imports(args):
+    """Run Python with -X importtime, and parse its report.
+
+    Returns the total import time in milliseconds, the raw report, and
+    (cumulative microseconds, module) of each top-level import. Raises
+    RuntimeError if the command fails.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + args,
+        cwd=str(ROOT), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        env={**os.environ, 'PASSA_NO_DAEMON': '1'}, check=False,
+    )
+    report = result.stderr.decode('utf-8')
+    if result.returncode != 0:
+        raise RuntimeError(report.strip().splitlines()[-1])
+    total = 0
+    top_level = []
+    for line in report.splitlines():
+        match = _IMPORTTIME_LINE_RE.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, module = match.groups()
+        total += int(own)
+        if len(indent) == 1:
+            top_level.append((int(cumulative), module))
+    return total / 1000, report, top_level
+
+
+def _read_budgets():
+    with BUDGET_FILE.open() as f:
+        return json.load(f)
+
+
+@invoke.task(help={
+    'repeat': 'number of runs per measurement (best is kept)',
+    'output': 'directory to write -X importtime reports into',
+    'scale': 'multiply budgets by this, e.g. on slow machines',
+    'top': 'number of slowest top-level imports to show for each',
+})
+def importtime(ctx, repeat=3, output='build/importtime', scale=1.0, top=0):
+    """Check import time of CLI commands and core modules against budgets.
+
+    Budgets (in milliseconds) are read from tasks/import-budget.json. Fails
+    if any measurement exceeds its budget, or cannot run.
+    """
+    budgets = _read_budgets()
+    output_dir = ROOT.joinpath(output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    failures = []
+    for name, args in _iter_import_targets():
+        budget = budgets.get(name, budgets['default']) * scale
+        try:
+            runs = [_measure_imports(args) for _ in range(repeat)]
+        except RuntimeError as e:
+            print(f'[importtime] {name:<34}   FAILED  {e}')
+            failures.append(name)
+            continue
+        total, report, top_level = min(runs, key=lambda run: run[0])
+        slug = re.sub(r'[^\w.]+', '-', name).strip('-')
+        output_dir.joinpath(f'{slug}.txt').write_text(report)
+        status = 'ok' if total <= budget else 'OVER'
+        print(f'[importtime] {name:<34} {total:8.1f} ms '
+              f'(budget {budget:.0f} ms) {status}')
+        for cumulative, module in sorted(top_level, reverse=True)[:top]:
+            print(f'[importtime]     {cumulative / 1000:8.1f} ms  {module}')
+        if total > budget:
+            failures.append(name)
+    if failures:
+        raise invoke.Exit(
+            f'[importtime] Failed: {", ".join(failures)}', code=1,
+        )
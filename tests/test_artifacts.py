@@ -0,0 +1,25 @@
+# -*- coding=utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals
+
+from passa.internals.artifacts import get_tree_digest
+
+
+def test_get_tree_digest(tmpdir):
+    tmpdir.join("setup.py").write("from setuptools import setup\n")
+    package = tmpdir.mkdir("foo")
+    package.join("__init__.py").write("")
+    digest = get_tree_digest(str(tmpdir))
+
+    # Build output and VCS metadata are ignored.
+    tmpdir.mkdir("foo.egg-info").join("PKG-INFO").write("Name: foo\n")
+    tmpdir.mkdir(".git").join("HEAD").write("ref: refs/heads/master\n")
+    package.join("__init__.pyc").write("")
+    assert get_tree_digest(str(tmpdir)) == digest
+
+    # Renaming or modifying a file changes the digest.
+    package.join("__init__.py").rename(package.join("bar.py"))
+    renamed_digest = get_tree_digest(str(tmpdir))
+    assert renamed_digest != digest
+    package.join("bar.py").write("import os\n")
+    assert get_tree_digest(str(tmpdir)) != renamed_digest
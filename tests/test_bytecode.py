@@ -0,0 +1,30 @@
+import os
+import sys
+
+try:
+    from importlib.util import cache_from_source
+except ImportError:
+    def cache_from_source(path):
+        return path + "c"
+
+from passa.internals.bytecode import compile_files, suppress_bytecode
+
+
+def test_compile_files_skips_invalid(tmpdir):
+    good = [tmpdir.join("m{0}.py".format(i)) for i in range(3)]
+    for i, path in enumerate(good):
+        path.write("x = {0}\n".format(i))
+    bad = tmpdir.join("bad.py")
+    bad.write("def (:\n")
+
+    paths = [str(p) for p in good + [bad]]
+    assert compile_files(paths, workers=2) == [str(bad)]
+    for path in good:
+        assert os.path.isfile(cache_from_source(str(path)))
+
+
+def test_suppress_bytecode():
+    value = sys.dont_write_bytecode
+    with suppress_bytecode():
+        assert sys.dont_write_bytecode
+    assert sys.dont_write_bytecode == value
@@ -0,0 +1,126 @@
+import marshal
+import multiprocessing
+
+import py
+import pytest
+
+# Skip where the installed pip-shims does not match pip; passa needs
+# pip_shims.utils (see passa.internals._pip_shims). Errors in passa itself
+# must still fail.
+pip_shims = pytest.importorskip("pip_shims")
+if not hasattr(pip_shims, "utils"):
+    pytest.skip("pip-shims {0} does not match pip".format(
+        pip_shims.__version__,
+    ), allow_module_level=True)
+
+from passa.models import caches
+
+
+def _get_corrupt_files(tmpdir):
+    return [p for p in tmpdir.listdir() if ".corrupt-" in p.basename]
+
+
+@pytest.mark.parametrize("content", [
+    b"not json",
+    b"[]",
+    b'{"dependencies": {}}',
+    b'{"__format__": 2, "dependencies": {}}',
+    b'{"__format__": 1, "dependencies": []}',
+])
+def test_corrupt_file_is_quarantined(tmpdir, content):
+    cache = caches.DependencyCache(str(tmpdir))
+    py.path.local(cache._cache_file).write_binary(content)
+    assert cache.cache == {}
+    assert len(_get_corrupt_files(tmpdir)) == 1
+
+
+def test_only_latest_corrupt_file_is_kept(tmpdir):
+    cache = caches.ParsedRequirementCache(str(tmpdir))
+    path = py.path.local(cache._cache_file)
+    tmpdir.join("{0}.corrupt-1".format(path.basename)).write("old")
+    content = marshal.dumps(["not", "a", "dict"])
+    path.write_binary(content)
+    assert cache.cache == {}
+    corrupt_files = _get_corrupt_files(tmpdir)
+    assert len(corrupt_files) == 1
+    assert corrupt_files[0].read_binary() == content
+
+
+def test_changes_are_written_on_flush(tmpdir):
+    cache = caches.ArtifactDependencyCache(str(tmpdir))
+    cache[("foo", "abc", ())] = [["bar"], ""]
+    assert caches.ArtifactDependencyCache(str(tmpdir)).cache == {}
+    cache.flush()
+    reader = caches.ArtifactDependencyCache(str(tmpdir))
+    assert reader.get(("foo", "abc", ())) == [["bar"], ""]
+
+
+def test_parsed_requirements_of_other_version_are_ignored(tmpdir):
+    cache = caches.ParsedRequirementCache(str(tmpdir), version="1:1.0")
+    cache.update({"foo": ("foo", "", (), None)})
+    cache.flush()
+    reader = caches.ParsedRequirementCache(str(tmpdir), version="1:1.0")
+    assert reader.get("foo") == ("foo", "", (), None)
+    reader = caches.ParsedRequirementCache(str(tmpdir), version="1:2.0")
+    assert reader.get("foo") is None
+    assert not _get_corrupt_files(tmpdir)
+
+
+def _write_entries(cache_dir, name):
+    cache = caches.DependencyCache(cache_dir)
+    for i in range(20):
+        cache.update([((name, "1.{0}".format(i), ()), [])])
+        cache.flush()
+
+
+def test_concurrent_writers_keep_all_entries(tmpdir):
+    names = ["foo", "bar", "baz", "qux"]
+    processes = [
+        multiprocessing.Process(target=_write_entries, args=(str(tmpdir), n))
+        for n in names
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    cache = caches.DependencyCache(str(tmpdir)).cache
+    assert sorted(cache) == sorted(names)
+    assert all(len(cache[name]) == 20 for name in names)
+    assert not _get_corrupt_files(tmpdir)
+
+
+def test_shared_dependency_cache(tmpdir):
+    key = ("foo", "foo-1.0-py2.py3-none-any.whl#sha256=abc", ("bar",))
+    cache = caches.SharedDependencyCache(str(tmpdir))
+    cache[key] = [["baz>=1"], ""]
+    cache.flush()
+    assert tmpdir.join("depcache-shared.json").check()
+    reader = caches.SharedDependencyCache(str(tmpdir))
+    assert reader.get(key) == [["baz>=1"], ""]
+    assert reader.get(("foo", key[1], ())) is None
+
+
+def test_write_caches_together(tmpdir, monkeypatch):
+    dependency_cache = caches.DependencyCache(str(tmpdir))
+    requires_python_cache = caches.RequiresPythonCache(str(tmpdir))
+    dependency_cache.update([(("foo", "1.0", ()), ["bar"])])
+    requires_python_cache.update([(("foo", "1.0", ()), ">=2.7")])
+
+    def fail(sections):
+        raise ValueError("cannot encode")
+
+    monkeypatch.setattr(dependency_cache, "_encode", fail)
+    with pytest.raises(ValueError):
+        caches.write_caches([requires_python_cache, dependency_cache])
+    assert tmpdir.listdir(lambda p: p.ext == ".json") == []
+
+    monkeypatch.undo()
+    caches.write_caches([requires_python_cache, dependency_cache])
+    assert caches.DependencyCache(str(tmpdir)).cache == {
+        "foo": {"1.0": ["bar"]},
+    }
+    assert caches.RequiresPythonCache(str(tmpdir)).cache == {
+        "foo": {"1.0": ">=2.7"},
+    }
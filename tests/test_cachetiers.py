@@ -0,0 +1,101 @@
+# -*- coding=utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals
+
+import os
+
+import pytest
+
+from passa.internals import cachetiers
+from passa.internals.cachetiers import (
+    GRACE_PERIOD, LookupStats, parse_size, prune, read_lookup_stats,
+)
+
+
+@pytest.mark.parametrize("value, size", [
+    ("123", 123),
+    ("2K", 2048),
+    ("1.5M", 1572864),
+    ("10GB", 10737418240),
+    ("1gib", 1073741824),
+])
+def test_parse_size(value, size):
+    assert parse_size(value) == size
+
+
+def _make_entry(path, size, accessed):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    os.utime(path, (accessed, accessed))
+
+
+def test_prune(tmpdir):
+    now = 1000000000
+    cache_dir = str(tmpdir)
+    old = os.path.join(cache_dir, "pkgs", "old.tar.gz")
+    used = os.path.join(cache_dir, "wheels", "used.whl")
+    store = os.path.join(cache_dir, "wheel-store", "abc", "foo.py")
+    recent = os.path.join(cache_dir, "pkgs", "recent.tar.gz")
+    _make_entry(old, 100, now - 86400 * 30)
+    _make_entry(used, 100, now - 86400 * 2)
+    _make_entry(store, 100, now - 86400)
+    os.utime(os.path.dirname(store), (now - 86400, now - 86400))
+    _make_entry(recent, 1000, now - GRACE_PERIOD // 2)
+    old_metadata = os.path.join(cache_dir, "depcache-py2.6.json")
+    metadata = os.path.join(cache_dir, "depcache-py3.7.json")
+    _make_entry(old_metadata, 10, now - 86400 * 60)
+    _make_entry(metadata, 10, now - GRACE_PERIOD // 2)
+    # Lock files and files being written are never entries, however old.
+    lock = os.path.join(cache_dir, "index-pages", "foo.json.lock")
+    temporary = os.path.join(cache_dir, "index-pages", ".tmp-abc")
+    temporary_metadata = os.path.join(cache_dir, ".tmp-def.json")
+    for path in (lock, temporary, temporary_metadata):
+        _make_entry(path, 0, now - 86400 * 60)
+
+    # By age.
+    removed = prune(cache_dir, max_age=86400 * 7, now=now)
+    assert [item.path for item in removed] == [old_metadata, old]
+    assert not os.path.exists(old)
+    assert not os.path.exists(old_metadata)
+    assert os.path.exists(metadata)
+
+    # By size, least recently used first, never the recently used.
+    removed = prune(cache_dir, max_size=0, dry_run=True, now=now)
+    assert [item.path for item in removed] == [
+        used, os.path.dirname(store),
+    ]
+    assert os.path.exists(used)
+    prune(cache_dir, max_size=1110, now=now)
+    assert not os.path.exists(used)
+    assert os.path.exists(store)
+    assert os.path.exists(recent)
+    assert os.path.exists(lock)
+    assert os.path.exists(temporary)
+    assert os.path.exists(temporary_metadata)
+
+
+def test_lookup_stats(tmpdir):
+    for labels in (["cache", "cache", "pip"], ["cache", "json"]):
+        stats = LookupStats(str(tmpdir))
+        for label in labels:
+            stats.record(label)
+        stats.flush()
+    counts = read_lookup_stats(str(tmpdir))
+    assert counts == {"cache": 3, "pip": 1, "json": 1}
+
+
+def test_lookup_stats_are_compacted(tmpdir, monkeypatch):
+    monkeypatch.setattr(cachetiers, "STATS_MAX_SIZE", 100)
+    for _ in range(20):
+        stats = LookupStats(str(tmpdir))
+        stats.record("cache")
+        stats.record("pip")
+        stats.flush()
+    path = tmpdir.join(cachetiers.STATS_FILENAME)
+    assert path.size() <= 100
+    assert len(path.readlines()) < 20
+    assert read_lookup_stats(str(tmpdir)) == {"cache": 20, "pip": 20}
+    assert tmpdir.listdir() == [path]
@@ -0,0 +1,34 @@
+# -*- coding=utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals
+
+import importlib
+import subprocess
+import sys
+
+import pytest
+
+from passa.cli import COMMANDS
+
+
+@pytest.mark.parametrize("name, description", COMMANDS)
+def test_command_registry(name, description):
+    module = importlib.import_module("passa.cli.{0}".format(name))
+    assert module.Command.name == name
+    assert module.Command.description == description
+
+
+def test_help_imports_no_commands():
+    code = (
+        "import sys\n"
+        "from passa.cli import main\n"
+        "try:\n"
+        "    main(['--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(sorted(m for m in sys.modules if m.startswith('passa.')))\n"
+    )
+    output = subprocess.check_output([sys.executable, "-c", code])
+    modules = output.decode("utf-8").strip().splitlines()[-1]
+    assert "passa.cli.lock" not in modules
+    assert "passa.models" not in modules
@@ -0,0 +1,117 @@
+# -*- coding=utf-8 -*-
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import socket
+import tempfile
+import threading
+
+import pytest
+
+from passa.internals import daemon
+
+
+pytestmark = pytest.mark.skipif(
+    not daemon.is_supported(), reason="requires Unix sockets",
+)
+
+
+class _Collector(object):
+
+    def __init__(self, output):
+        self.output = output
+
+    def write(self, text):
+        self.output.append(text)
+
+    def flush(self):
+        pass
+
+
+def _fake_run_command(argv):
+    print("running", " ".join(argv))
+    return 3
+
+
+def _serve_one(path, environ):
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+
+    def handle_one():
+        connection, _ = server.accept()
+        try:
+            daemon._handle(connection, environ)
+        finally:
+            connection.close()
+            server.close()
+
+    thread = threading.Thread(target=handle_one)
+    thread.start()
+    return thread
+
+
+def test_forward(tmpdir, monkeypatch):
+    monkeypatch.delenv("PASSA_NO_DAEMON", raising=False)
+    monkeypatch.setattr(daemon, "_run_command", _fake_run_command)
+    monkeypatch.setattr(daemon, "_forget_request_state", lambda: None)
+    path = str(tmpdir.join("daemon.sock"))
+    assert daemon.forward(["lock"], path) is None   # Not running yet.
+
+    thread = _serve_one(path, daemon._get_environ())
+    try:
+        output = []
+        monkeypatch.setattr(daemon.sys, "stdout", _Collector(output))
+        status = daemon.forward(["lock", "--offline"], path)
+    finally:
+        thread.join()
+    assert status == 3
+    assert "".join(output) == "running lock --offline\n"
+
+
+def test_forward_refused_for_other_environment(tmpdir, monkeypatch):
+    monkeypatch.delenv("PASSA_NO_DAEMON", raising=False)
+    monkeypatch.setattr(daemon, "_run_command", _fake_run_command)
+    monkeypatch.setenv("PIP_INDEX_URL", "https://mirror.example.com/simple")
+    path = str(tmpdir.join("daemon.sock"))
+    environ = daemon._get_environ()
+    environ["PIP_INDEX_URL"] = "https://pypi.org/simple"
+
+    thread = _serve_one(path, environ)
+    try:
+        status = daemon.forward(["lock"], path)
+    finally:
+        thread.join()
+    assert status is None
+
+
+def test_socket_dir_must_be_private(tmpdir, monkeypatch):
+    monkeypatch.delenv("PASSA_DAEMON_SOCKET", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmpdir))
+    directory = tmpdir.mkdir("passa-{0}".format(os.getuid()))
+    directory.chmod(0o777)
+    with pytest.raises(OSError):
+        daemon.get_socket_path()
+    with pytest.raises(RuntimeError):
+        daemon.serve()
+    assert daemon.ping() is None
+
+    directory.chmod(0o700)
+    assert daemon.get_socket_path() == str(directory.join("passa-daemon.sock"))
+
+
+def test_clients_do_not_create_socket_dir(tmpdir, monkeypatch):
+    monkeypatch.delenv("PASSA_DAEMON_SOCKET", raising=False)
+    monkeypatch.delenv("PASSA_NO_DAEMON", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmpdir))
+    assert daemon.forward(["lock"]) is None
+    assert daemon.ping() is None
+    with pytest.raises(OSError):
+        daemon.get_socket_path()
+    assert tmpdir.listdir() == []
+
+    path = daemon.get_socket_path(create=True)
+    assert os.path.isdir(os.path.dirname(path))
@@ -0,0 +1,241 @@
+import pytest
+
+from passa.internals.cachetiers import LookupStats
+
+# Skip where the installed pip-shims does not match pip; passa needs
+# pip_shims.utils (see passa.internals._pip_shims). Errors in passa itself
+# must still fail.
+pip_shims = pytest.importorskip("pip_shims")
+if not hasattr(pip_shims, "utils"):
+    pytest.skip("pip-shims {0} does not match pip".format(
+        pip_shims.__version__,
+    ), allow_module_level=True)
+
+requirementslib = pytest.importorskip("requirementslib")
+
+from passa.internals import dependencies
+from passa.models import caches
+
+
+@pytest.fixture()
+def cache_dir(tmpdir, monkeypatch):
+    cache_dir = tmpdir.mkdir("cache")
+    for name, cache_class in [
+            ("DEPENDENCY_CACHE", caches.DependencyCache),
+            ("REQUIRES_PYTHON_CACHE", caches.RequiresPythonCache),
+            ("ARTIFACT_DEPENDENCY_CACHE", caches.ArtifactDependencyCache),
+            ("PARSED_REQUIREMENT_CACHE", caches.ParsedRequirementCache),
+            ("SHARED_DEPENDENCY_CACHE", caches.SharedDependencyCache)]:
+        monkeypatch.setattr(dependencies, name, cache_class(str(cache_dir)))
+    monkeypatch.setattr(
+        dependencies, "LOOKUP_STATS", LookupStats(str(cache_dir)),
+    )
+    monkeypatch.setattr(dependencies, "_PARSED_LINES", {})
+    monkeypatch.setattr(dependencies, "_UNSAVED_PARSED_PARTS", {})
+    return cache_dir
+
+
+def _ireq(line):
+    return requirementslib.Requirement.from_line(line).as_ireq()
+
+
+def test_cache_read_does_not_write(cache_dir, monkeypatch):
+    ireq = _ireq("foo==1.0")
+    dependencies._set_cached_dependencies(ireq, ["bar>=1"], ">=2.7")
+    dependencies.flush_caches()
+    cache = caches.DependencyCache(str(cache_dir))
+    monkeypatch.setattr(dependencies, "DEPENDENCY_CACHE", cache)
+    result = dependencies._get_dependencies_from_cache(ireq)
+    assert result == (["bar>=1"], ">=2.7")
+    assert not cache._changes
+
+
+def test_cache_unchecked_entry(cache_dir, monkeypatch):
+    ireq = _ireq("foo==1.0")
+    dependencies.DEPENDENCY_CACHE[ireq] = ["bar>=1"]
+    dependencies.REQUIRES_PYTHON_CACHE[ireq] = ""
+    dependencies.flush_caches()
+    result = dependencies._get_dependencies_from_cache(ireq)
+    assert result == (["bar>=1"], "")
+
+    # The checksum is recorded after the first validation, so the entry is
+    # not validated again.
+    dependencies.flush_caches()
+    cache = caches.DependencyCache(str(cache_dir))
+    assert cache.get_checksum(ireq) is not None
+    monkeypatch.setattr(dependencies, "DEPENDENCY_CACHE", cache)
+    validated = []
+    is_cache_valid = dependencies._is_cache_valid
+    monkeypatch.setattr(dependencies, "_is_cache_valid", lambda *args: (
+        validated.append(args) or is_cache_valid(*args)
+    ))
+    assert dependencies._get_dependencies_from_cache(ireq) == result
+    assert not validated
+    assert not cache._changes
+
+    # A package depending on itself is broken, and not marked as valid.
+    dependencies._set_cached_dependencies(ireq, ["foo>=1"], "")
+    assert dependencies.DEPENDENCY_CACHE.get_checksum(ireq) is None
+    assert dependencies._get_dependencies_from_cache(ireq) is None
+    assert ireq not in dependencies.DEPENDENCY_CACHE
+
+
+def test_dependencies_not_shared(cache_dir):
+    line = "bar[baz]>=1"
+    requirement = requirementslib.Requirement.from_line("foo==1.0")
+    dependencies._set_cached_dependencies(
+        requirement.as_ireq(), [line], "",
+    )
+    [dep], _ = dependencies.get_dependencies(requirement, [])
+    dep.req.version = ">=2"
+    [dep], _ = dependencies.get_dependencies(requirement, [])
+    assert dep.req.version == ">=1"
+
+
+def test_parsed_parts_are_saved(cache_dir):
+    line = "bar[baz]>=1; python_version >= '2.7'"
+    expected = dependencies._parse_requirement_line(line)
+    dependencies.flush_caches()
+    parts = dependencies.PARSED_REQUIREMENT_CACHE.get(line)
+    assert parts[:3] == ("bar", ">=1", ("baz",))
+
+    dependencies._PARSED_LINES.clear()
+    rebuilt = dependencies._parse_requirement_line(line)
+    assert rebuilt is not expected
+    assert (dependencies._get_requirement_signature(rebuilt) ==
+            dependencies._get_requirement_signature(expected))
+
+
+def test_parsed_parts_are_verified(cache_dir, monkeypatch):
+    def rebuild(parts):
+        return requirementslib.Requirement.from_line("other")
+
+    monkeypatch.setattr(dependencies, "_requirement_from_parts", rebuild)
+    assert dependencies._parse_requirement_line("bar>=1").name == "bar"
+    assert dependencies._parse_requirement_line("baz").name == "baz"
+    assert not dependencies._UNSAVED_PARSED_PARTS
+
+
+def test_flush_tolerates_parsed_parts_errors(cache_dir, monkeypatch):
+    def fail(entries):
+        raise IOError("read-only")
+
+    dependencies._parse_requirement_line("bar>=1")
+    monkeypatch.setattr(dependencies.PARSED_REQUIREMENT_CACHE, "update", fail)
+    dependencies.flush_caches()
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, info=None):
+        self.status_code = status_code
+        self.info = info
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            error = dependencies.requests.HTTPError(self.status_code)
+            error.response = self
+            raise error
+
+    def json(self):
+        return {"info": self.info}
+
+
+class FakeSession(object):
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+        response = self.responses[url.split("/pypi/")[0]]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.mark.parametrize("failure, missed", [
+    (FakeResponse(404), True),
+    (FakeResponse(503), False),
+    (dependencies.requests.Timeout("timed out"), False),
+])
+def test_json_api_misses_per_index(monkeypatch, failure, missed):
+    info = {"requires_python": "", "requires_dist": ["bar>=1"]}
+    session = FakeSession({
+        "https://private.example.com": failure,
+        "https://pypi.org": FakeResponse(200, info),
+    })
+    monkeypatch.setattr(dependencies, "JSON_API_SESSION", session)
+    monkeypatch.setattr(dependencies, "_JSON_API_MISSES", set())
+    sources = [
+        {"name": "private", "url": "https://private.example.com/simple"},
+        {"name": "pypi", "url": "https://pypi.org/simple"},
+    ]
+    for line in ("foo==1.0", "foo==1.0", "baz==2.0"):
+        deps, _ = dependencies._get_dependencies_from_json(_ireq(line), sources)
+        assert deps == ["bar>=1"]
+    # A miss only skips the same package version, not the whole index.
+    private_urls = [url for url in session.urls if "private" in url]
+    assert private_urls == [
+        "https://private.example.com/pypi/foo/1.0/json",
+    ] * (1 if missed else 2) + [
+        "https://private.example.com/pypi/baz/2.0/json",
+    ]
+
+
+def test_json_results_are_shared(cache_dir, monkeypatch):
+    identity = "foo-1.0-py2.py3-none-any.whl#sha256=abc"
+    monkeypatch.setattr(
+        dependencies, "_get_dependencies_from_json",
+        lambda ireq, sources: (["bar>=1"], ">=2.7"),
+    )
+    monkeypatch.setattr(
+        dependencies, "find_wheel_identity", lambda ireq, sources: identity,
+    )
+    requirement = requirementslib.Requirement.from_line("foo[baz]==1.0")
+    dependencies.get_dependencies(requirement, [])
+    dependencies.flush_caches()
+
+    shared = caches.SharedDependencyCache(str(cache_dir))
+    key = ("foo", identity, ("baz",))
+    assert shared.get(key) == [["bar>=1"], ">=2.7"]
+
+
+@pytest.mark.parametrize("line, extras, expected", [
+    ("bar (>=1)", (), "bar>=1"),
+    ("bar (>=1) ; python_version < '3'", (), "bar>=1 ; python_version < '3'"),
+    ("bar (>=1) ; extra == 'baz'", (), None),
+    ("bar (>=1) ; extra == 'baz'", ("baz",), "bar>=1"),
+    ("bar[qux] ; python_version < '3' and extra == 'baz'", ("baz",),
+     "bar[qux] ; python_version < '3'"),
+])
+def test_filter_requirement_line(line, extras, expected):
+    assert dependencies._filter_requirement_line(line, extras) == expected
+
+
+def test_import_dependencies(cache_dir):
+    from passa.internals.mirrors import MetadataRecord
+
+    record = MetadataRecord(
+        name="foo", version="1.0", requires_python=">=2.7",
+        requires_dist=[
+            "bar (>=1)",
+            "baz ; extra == 'a'",
+            "qux ; extra == 'a' or extra == 'b'",
+        ],
+        extras=["b", "a"],
+    )
+    assert dependencies.import_dependencies([record]) == 1
+
+    dependency_cache = caches.DependencyCache(str(cache_dir))
+    requires_python_cache = caches.RequiresPythonCache(str(cache_dir))
+    for line, expected in [
+            ("foo==1.0", ["bar>=1"]),
+            ("foo[a]==1.0", ["bar>=1", "baz", "qux"]),
+            ("foo[b]==1.0", ["bar>=1", "qux"]),
+            ("foo[a,b]==1.0", ["bar>=1", "baz", "qux"])]:
+        ireq = _ireq(line)
+        assert dependency_cache[ireq] == expected
+        assert requires_python_cache[ireq] == ">=2.7"
+        assert dependency_cache.get_checksum(ireq) is not None
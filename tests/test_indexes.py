@@ -0,0 +1,160 @@
+# -*- coding=utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals
+
+import time
+
+from passa.internals.indexes import (
+    PAGE_FORMAT, fetch_index_entries, get_version_hashes, iter_candidates,
+    parse_index_page,
+)
+from passa.internals.targets import Target
+
+
+PAGE = """\
+<html><body>
+<a href="../../packages/foo_bar-1.0-py2.py3-none-any.whl#sha256=aaa"
+   data-requires-python="&gt;=2.7">foo_bar-1.0-py2.py3-none-any.whl</a>
+<a href="../../packages/foo-bar-1.0.tar.gz#sha256=bbb">foo-bar-1.0.tar.gz</a>
+<a href="../../packages/foo-bar-1.1.tar.gz">foo-bar-1.1.tar.gz</a>
+<a href="../../packages/foo-bar-2.0.tar.gz#sha256=ccc"
+   data-yanked="">foo-bar-2.0.tar.gz</a>
+<a href="../../packages/foo-bar-1.0.exe">foo-bar-1.0.exe</a>
+</body></html>
+"""
+
+
+def test_parse_index_page():
+    entries = parse_index_page(
+        PAGE, "https://example.com/simple/foo-bar/", "Foo.Bar",
+    )
+    assert [(e["filename"], e["version"], e["hash"]) for e in entries] == [
+        ("foo_bar-1.0-py2.py3-none-any.whl", "1.0", "sha256:aaa"),
+        ("foo-bar-1.0.tar.gz", "1.0", "sha256:bbb"),
+        ("foo-bar-1.1.tar.gz", "1.1", None),
+        ("foo-bar-2.0.tar.gz", "2.0", "sha256:ccc"),
+    ]
+    assert [e["yanked"] for e in entries] == [False, False, False, True]
+    assert entries[0]["url"] == (
+        "https://example.com/packages/foo_bar-1.0-py2.py3-none-any.whl"
+    )
+    assert entries[0]["requires_python"] == ">=2.7"
+
+
+def test_get_version_hashes():
+    entries = parse_index_page(
+        PAGE, "https://example.com/simple/foo-bar/", "foo-bar",
+    )
+    assert get_version_hashes(entries, "1.0") == {"sha256:aaa", "sha256:bbb"}
+    assert get_version_hashes(entries, "1.1") is None
+    assert get_version_hashes(entries, "2.0") == {"sha256:ccc"}
+    assert get_version_hashes(entries, "3.0") == set()
+
+
+def test_iter_candidates_yanked():
+    entries = parse_index_page(
+        PAGE, "https://example.com/simple/foo-bar/", "foo-bar",
+    )
+    versions = [str(c.version) for c in iter_candidates(entries)]
+    assert versions == ["1.0", "1.0", "1.1"]
+    versions = [str(c.version) for c in iter_candidates(entries, True)]
+    assert versions == ["1.0", "1.0", "1.1", "2.0"]
+
+
+def test_iter_candidates_for_target():
+    entries = [
+        {"name": "foo", "version": "1.0", "filename": filename,
+         "url": "https://example.com/{0}".format(filename),
+         "requires_python": "", "hash": None}
+        for filename in (
+            "foo-1.0-cp37-cp37m-win32.whl",
+            "foo-1.0-cp37-cp37m-manylinux1_x86_64.whl",
+            "foo-1.0-cp36-cp36m-win_amd64.whl",
+        )
+    ]
+    candidates = iter_candidates(entries, target=Target("3.7", "win32"))
+    assert [c.filename for c in candidates] == [
+        "foo-1.0-cp37-cp37m-win32.whl",
+    ]
+
+
+class FakePageCache(object):
+
+    def __init__(self, page=None):
+        self.page = dict(page or {})
+
+    def update_page(self, **values):
+        self.page.update(values)
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+        self.url = None
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class FakeSession(object):
+
+    def __init__(self, response):
+        self.response = response
+        self.requests = []
+
+    def get(self, url, headers, verify):
+        self.requests.append(headers)
+        return self.response
+
+
+URL = "https://example.com/simple/foo-bar/"
+
+
+def test_fetch_index_entries_within_ttl():
+    cache = FakePageCache({
+        "entries": [], "fetched": time.time(), "format": PAGE_FORMAT,
+    })
+    session = FakeSession(None)
+    assert fetch_index_entries(URL, "foo-bar", cache, session, 60) == []
+    assert session.requests == []
+
+
+def test_fetch_index_entries_revalidates():
+    cached_entries = parse_index_page(PAGE, URL, "foo-bar")
+    cache = FakePageCache({
+        "entries": cached_entries, "fetched": time.time() - 120,
+        "format": PAGE_FORMAT, "etag": '"abc"',
+        "last_modified": "Mon, 01 Jan 2018 00:00:00 GMT",
+    })
+    session = FakeSession(FakeResponse(304))
+    entries = fetch_index_entries(URL, "foo-bar", cache, session, 60)
+    assert entries == cached_entries
+    assert session.requests[0]["If-None-Match"] == '"abc"'
+    assert session.requests[0]["If-Modified-Since"] == (
+        "Mon, 01 Jan 2018 00:00:00 GMT"
+    )
+    assert time.time() - cache.page["fetched"] < 60
+
+
+def test_fetch_index_entries_changed():
+    cache = FakePageCache({
+        "entries": [], "fetched": 0, "format": PAGE_FORMAT, "etag": '"abc"',
+    })
+    session = FakeSession(FakeResponse(200, PAGE, {"ETag": '"def"'}))
+    entries = fetch_index_entries(URL, "foo-bar", cache, session, 60)
+    assert len(entries) == 4
+    assert cache.page["entries"] == entries
+    assert cache.page["etag"] == '"def"'
+
+
+def test_fetch_index_entries_old_format():
+    # Pages cached in an older format are fetched unconditionally.
+    cache = FakePageCache({"entries": [], "fetched": time.time(), "etag": "x"})
+    session = FakeSession(FakeResponse(404))
+    assert fetch_index_entries(URL, "foo-bar", cache, session, 60) == []
+    assert "If-None-Match" not in session.requests[0]
+    assert cache.page["format"] == PAGE_FORMAT
@@ -0,0 +1,21 @@
+import io
+
+import pytest
+
+from passa.actions.init import init_project
+
+
+def test_init_project(tmpdir, monkeypatch):
+    monkeypatch.setenv("PIP_INDEX_URL", "https://pypi.org/simple")
+    monkeypatch.setenv("PIP_EXTRA_INDEX_URL", "https://mirror.example.com/simple")
+    root = tmpdir.join("project")
+    assert init_project(root=str(root), python_version="3.7") == 0
+
+    with io.open(str(root.join("Pipfile")), encoding="utf-8") as f:
+        content = f.read()
+    assert 'url = "https://pypi.org/simple"' in content
+    assert 'url = "https://mirror.example.com/simple"' in content
+    assert 'python_version = "3.7"' in content
+
+    with pytest.raises(RuntimeError):
+        init_project(root=str(root))
@@ -0,0 +1,93 @@
+import io
+import zipfile
+
+import pytest
+
+from passa.internals.lazywheels import (
+    RangeRequestUnsupported, read_wheel_metadata,
+)
+
+
+class FakeResponse(object):
+    def __init__(self, url, status_code, headers=None, content=b""):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession(object):
+    """Serve a file, recording the ranges requested.
+    """
+    def __init__(self, content, accept_ranges=True, content_length=True,
+                 offset=0):
+        self.content = content
+        self.accept_ranges = accept_ranges
+        self.content_length = content_length
+        self.offset = offset    # Serve ranges shifted by this, if not 0.
+        self.ranges = []
+        self.encodings = []
+
+    def head(self, url, allow_redirects=False, headers=None):
+        self.encodings.append(headers["Accept-Encoding"])
+        headers = {}
+        if self.content_length:
+            headers["Content-Length"] = str(len(self.content))
+        if self.accept_ranges:
+            headers["Accept-Ranges"] = "bytes"
+        return FakeResponse(url, 200, headers)
+
+    def get(self, url, headers=None):
+        self.encodings.append(headers["Accept-Encoding"])
+        start, end = headers["Range"][len("bytes="):].split("-")
+        start, end = int(start), int(end)
+        self.ranges.append((start, end))
+        start, end = max(0, start - self.offset), max(0, end - self.offset)
+        content_range = "bytes {0}-{1}/{2}".format(
+            start, end, len(self.content),
+        )
+        return FakeResponse(
+            url, 206, headers={"Content-Range": content_range},
+            content=self.content[start:end + 1],
+        )
+
+
+def _build_wheel(padding):
+    f = io.BytesIO()
+    with zipfile.ZipFile(f, "w") as zf:
+        zf.writestr("foo/__init__.py", padding)
+        zf.writestr("foo-1.0.dist-info/METADATA", "Name: foo\nVersion: 1.0\n")
+        zf.writestr("foo-1.0.dist-info/RECORD", "")
+    return f.getvalue()
+
+
+def test_read_wheel_metadata_partial():
+    content = _build_wheel(b"x" * 100000)
+    session = FakeSession(content)
+    metadata = read_wheel_metadata("https://example.com/foo.whl", session)
+    assert metadata == "Name: foo\nVersion: 1.0\n"
+    fetched = sum(end - start + 1 for start, end in session.ranges)
+    assert fetched < len(content) // 2
+    assert set(session.encodings) == {"identity"}
+
+
+def test_read_wheel_metadata_wrong_range():
+    session = FakeSession(_build_wheel(b"x" * 100000), offset=1)
+    with pytest.raises(RangeRequestUnsupported):
+        read_wheel_metadata("https://example.com/foo.whl", session)
+
+
+def test_read_wheel_metadata_range_unsupported():
+    session = FakeSession(_build_wheel(b""), accept_ranges=False)
+    with pytest.raises(RangeRequestUnsupported):
+        read_wheel_metadata("https://example.com/foo.whl", session)
+
+
+def test_read_wheel_metadata_without_content_length():
+    session = FakeSession(_build_wheel(b""), content_length=False)
+    with pytest.raises(RangeRequestUnsupported):
+        read_wheel_metadata("https://example.com/foo.whl", session)
+    assert session.ranges == []
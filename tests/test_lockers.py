@@ -0,0 +1,262 @@
+import functools
+import os
+
+import pytest
+
+from passa.internals.cachetiers import LookupStats
+from passa.models.projects import Project
+
+# Skip where the installed pip-shims does not match pip; passa needs
+# pip_shims.utils (see passa.internals._pip_shims). Errors in passa itself
+# must still fail.
+pip_shims = pytest.importorskip("pip_shims")
+if not hasattr(pip_shims, "utils"):
+    pytest.skip("pip-shims {0} does not match pip".format(
+        pip_shims.__version__,
+    ), allow_module_level=True)
+
+requirementslib = pytest.importorskip("requirementslib")
+
+from passa.internals import _pip, dependencies
+from passa.models import caches, lockers
+
+
+PIPFILE = """
+[[source]]
+name = "pypi"
+url = "https://pypi.org/simple"
+verify_ssl = true
+
+[packages]
+six = "*"
+"""
+
+SOURCES = [
+    {"name": "pypi", "url": "https://pypi.org/simple", "verify_ssl": True},
+]
+
+
+@pytest.fixture()
+def cache_dir(tmpdir, monkeypatch):
+    cache_dir = tmpdir.mkdir("cache")
+    for name, cache_class in [
+            ("DEPENDENCY_CACHE", caches.DependencyCache),
+            ("REQUIRES_PYTHON_CACHE", caches.RequiresPythonCache),
+            ("ARTIFACT_DEPENDENCY_CACHE", caches.ArtifactDependencyCache),
+            ("PARSED_REQUIREMENT_CACHE", caches.ParsedRequirementCache),
+            ("SHARED_DEPENDENCY_CACHE", caches.SharedDependencyCache)]:
+        monkeypatch.setattr(dependencies, name, cache_class(str(cache_dir)))
+    monkeypatch.setattr(
+        dependencies, "LOOKUP_STATS", LookupStats(str(cache_dir)),
+    )
+    monkeypatch.setattr(lockers, "HASH_CACHE", caches.HashCache(
+        directory=str(cache_dir.join("hash-cache")),
+    ))
+    monkeypatch.setattr(_pip, "IndexPageCache", functools.partial(
+        caches.IndexPageCache, cache_dir=str(cache_dir),
+    ))
+    monkeypatch.setattr(_pip, "_INDEX_PAGE_ENTRIES", {})
+    return cache_dir
+
+
+@pytest.fixture()
+def project(tmpdir):
+    root = tmpdir.mkdir("project")
+    root.join("Pipfile").write(PIPFILE)
+    return Project(root=str(root))
+
+
+def _index_entry(filename, version, digest, yanked=False):
+    return {
+        "name": "six", "version": version, "filename": filename,
+        "url": "https://files.example.com/{0}".format(filename),
+        "requires_python": "", "hash": "sha256:{0}".format(digest),
+        "yanked": yanked,
+    }
+
+
+def _fail_get_hashes(*args, **kwargs):
+    raise AssertionError("hashes should come from index pages")
+
+
+@pytest.mark.parametrize("specifier, version", [
+    ("*", "1.11.0"),
+    ("==1.12.0", "1.12.0"),     # Yanked files can satisfy an exact pin.
+])
+def test_lock_with_index_pages(cache_dir, project, monkeypatch,
+                               specifier, version):
+    project.pipfile["packages"]["six"] = specifier
+    _pip._INDEX_PAGE_ENTRIES["https://pypi.org/simple/six/"] = [
+        _index_entry("six-1.11.0.tar.gz", "1.11.0", "aaa"),
+        _index_entry("six-1.11.0-py2.py3-none-any.whl", "1.11.0", "bbb"),
+        _index_entry("six-1.12.0.tar.gz", "1.12.0", "ccc", yanked=True),
+    ]
+    for line in ("six==1.11.0", "six==1.12.0"):
+        ireq = requirementslib.Requirement.from_line(line).as_ireq()
+        dependencies.DEPENDENCY_CACHE[ireq] = []
+        dependencies.REQUIRES_PYTHON_CACHE[ireq] = ""
+    monkeypatch.setattr(lockers, "get_hashes", _fail_get_hashes)
+
+    lockers.BasicLocker(project).lock()
+
+    entry = project.lockfile["default"]["six"]._data
+    assert entry["version"] == "=={0}".format(version)
+    assert entry["hashes"] == {
+        "1.11.0": ["sha256:aaa", "sha256:bbb"],
+        "1.12.0": ["sha256:ccc"],
+    }[version]
+
+
+def test_offline_lock_from_warm_caches(cache_dir, project):
+    six = requirementslib.Requirement.from_line("six==1.11.0")
+    dependencies.DEPENDENCY_CACHE[six.as_ireq()] = []
+    dependencies.REQUIRES_PYTHON_CACHE[six.as_ireq()] = ""
+    lockers.HASH_CACHE.set_pinned_hashes(six, SOURCES, {"sha256:abc"})
+
+    lockers.BasicLocker(project, offline=True).lock()
+
+    entry = project.lockfile["default"]["six"]._data
+    assert entry["version"] == "==1.11.0"
+    assert entry["hashes"] == ["sha256:abc"]
+
+
+def test_offline_lock_reports_cold_caches(cache_dir, project):
+    with pytest.raises(lockers.OfflineLockError) as ctx:
+        lockers.BasicLocker(project, offline=True).lock()
+    assert ctx.value.missing == ["candidates of six"]
+
+    six = requirementslib.Requirement.from_line("six==1.11.0")
+    dependencies.DEPENDENCY_CACHE[six.as_ireq()] = []
+    dependencies.REQUIRES_PYTHON_CACHE[six.as_ireq()] = ""
+    with pytest.raises(lockers.OfflineLockError) as ctx:
+        lockers.BasicLocker(project, offline=True).lock()
+    assert ctx.value.missing == ["hashes of six==1.11.0"]
+    assert project.lockfile is None
+
+
+def test_lock_projects_continues_after_failures(cache_dir, tmpdir, capsys):
+    from passa.actions.lock import lock_projects
+
+    six = requirementslib.Requirement.from_line("six==1.11.0")
+    dependencies.DEPENDENCY_CACHE[six.as_ireq()] = []
+    dependencies.REQUIRES_PYTHON_CACHE[six.as_ireq()] = ""
+    lockers.HASH_CACHE.set_pinned_hashes(six, SOURCES, {"sha256:abc"})
+
+    broken = tmpdir.mkdir("broken")
+    broken.join("Pipfile").write("[packages\n")
+    cold = tmpdir.mkdir("cold")
+    cold.join("Pipfile").write(PIPFILE.replace("six", "cold-package"))
+    good = tmpdir.mkdir("good")
+    good.join("Pipfile").write(PIPFILE)
+    roots = [str(broken), str(cold), str(good)]
+
+    assert lock_projects(roots, offline=True) == 1
+    assert good.join("Pipfile.lock").check()
+    assert not cold.join("Pipfile.lock").check()
+    out = capsys.readouterr().out
+    failures = out.split("Failed to lock:")[-1].strip().splitlines()
+    assert [line.split()[0] for line in failures] == [str(broken), str(cold)]
+    assert failures[1].endswith("(cannot resolve)")
+
+
+def _write_lockfile(project, pins):
+    import json
+
+    lockfile = {
+        "_meta": {
+            "hash": {"sha256": "0" * 64}, "pipfile-spec": 6,
+            "requires": {}, "sources": SOURCES,
+        },
+        "default": {
+            name: {"version": "=={0}".format(version), "hashes": ["sha256:abc"]}
+            for name, version in pins.items()
+        },
+        "develop": {},
+    }
+    with open(os.path.join(project.root, "Pipfile.lock"), "w") as f:
+        json.dump(lockfile, f)
+    return Project(root=project.root)
+
+
+def _cache_dependencies(line, deps):
+    requirement = requirementslib.Requirement.from_line(line)
+    dependencies.DEPENDENCY_CACHE[requirement.as_ireq()] = deps
+    dependencies.REQUIRES_PYTHON_CACHE[requirement.as_ireq()] = ""
+    lockers.HASH_CACHE.set_pinned_hashes(requirement, SOURCES, {"sha256:abc"})
+
+
+def _fail_find_candidates(*args, **kwargs):
+    raise AssertionError("the index should not be queried")
+
+
+def test_incremental_provider_keeps_satisfied_pin(monkeypatch):
+    from passa.models import providers
+
+    pin = requirementslib.Requirement.from_line("six==1.11.0")
+    provider = providers.IncrementalProvider(
+        {}, {"six": pin}, {}, SOURCES, "", False,
+    )
+    monkeypatch.setattr(providers, "find_candidates", _fail_find_candidates)
+    requirement = requirementslib.Requirement.from_line("six>=1.10")
+    assert provider.find_matches(requirement) == [pin]
+
+    candidates = [requirementslib.Requirement.from_line("six==1.12.0")]
+    monkeypatch.setattr(
+        providers, "find_candidates", lambda *args, **kwargs: candidates,
+    )
+    requirement = requirementslib.Requirement.from_line("six>=1.12")
+    assert provider.find_matches(requirement) == candidates
+
+
+def test_incremental_lock_reuses_locked_dependencies(
+        cache_dir, project, monkeypatch):
+    from passa.models import providers
+
+    project.pipfile["packages"]["foo"] = "*"
+    project._p.write()
+    _cache_dependencies("foo==1.0", ["six>=1.10"])
+    _cache_dependencies("six==1.11.0", [])
+    lockers.BasicLocker(project, offline=True).lock()
+    project._l.write()
+    locked = project.lockfile._data["_meta"][lockers.LOCKED_DEPENDENCIES_KEY]
+    assert locked["foo"] == {
+        "version": "1.0", "dependencies": ["six>=1.10"], "requires_python": "",
+    }
+
+    # Only the new requirement's dependencies are looked up.
+    looked_up = []
+
+    def get_dependencies(requirement, sources, offline=False):
+        looked_up.append(requirement.name)
+        return [], ""
+
+    monkeypatch.setattr(providers, "get_dependencies", get_dependencies)
+    project = Project(root=project.root)
+    project.pipfile["packages"]["bar"] = "*"
+    project._p.write()
+    _cache_dependencies("bar==2.0", [])
+    locker = lockers.IncrementalLocker(project, offline=True)
+    locker.lock()
+
+    assert locker.incremental
+    assert looked_up == ["bar"]
+    assert sorted(project.lockfile["default"]._data) == ["bar", "foo", "six"]
+    locked = project.lockfile._data["_meta"][lockers.LOCKED_DEPENDENCIES_KEY]
+    assert locked["foo"]["dependencies"] == ["six>=1.10"]
+
+
+def test_incremental_lock_falls_back_to_full_relock(cache_dir, project):
+    # The kept pin of six conflicts with what the new foo requires.
+    project.pipfile["packages"]["foo"] = "*"
+    project._p.write()
+    project = _write_lockfile(project, {"six": "1.11.0"})
+    _cache_dependencies("foo==1.0", ["six<1.11"])
+    _cache_dependencies("six==1.10.0", [])
+    _cache_dependencies("six==1.11.0", [])
+
+    locker = lockers.IncrementalLocker(project, offline=True)
+    locker.lock()
+
+    assert not locker.incremental
+    assert project.lockfile["default"]["six"]._data["version"] == "==1.10.0"
+    assert project.lockfile["default"]["foo"]._data["version"] == "==1.0"
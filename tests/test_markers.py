@@ -1,6 +1,6 @@
 from packaging.markers import Marker
 
-from passa.internals.markers import get_without_extra
+from passa.internals.markers import MarkerEvaluator, get_without_extra
 
 
 def test_strip_marker_extra_noop():
@@ -64,3 +64,13 @@ def test_strip_marker_extra_crazy_cancelled():
         '(extra == "huh" or extra == "bar")',
     ))
     assert marker is None
+
+
+def test_marker_evaluator_memoizes():
+    evaluator = MarkerEvaluator({"os_name": "nt"})
+    assert evaluator.evaluate('os_name == "nt"')
+    assert not evaluator.evaluate(Marker('os_name == "posix"'))
+
+    # A cached result is returned without re-evaluating the marker.
+    evaluator.environment = {"os_name": "posix"}
+    assert evaluator.evaluate('os_name == "nt"')
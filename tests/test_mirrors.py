@@ -0,0 +1,41 @@
+# -*- coding=utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals
+
+import json
+import zipfile
+
+from passa.internals.mirrors import iter_metadata_records
+
+
+METADATA = """\
+Metadata-Version: 2.1
+Name: foo
+Version: 1.0
+Requires-Python: >=3.6
+Requires-Dist: bar (>=1)
+Requires-Dist: baz ; extra == 'qux'
+Provides-Extra: qux
+
+Long description.
+"""
+
+
+def test_iter_metadata_records(tmpdir):
+    wheel = tmpdir.join("foo-1.0-py3-none-any.whl")
+    with zipfile.ZipFile(str(wheel), "w") as zf:
+        zf.writestr("foo-1.0.dist-info/METADATA", METADATA)
+    tmpdir.mkdir("sub").join("spam.json").write(json.dumps([
+        {"info": {"name": "spam", "version": "2.0", "requires_dist": []}},
+        {"info": {"name": "eggs", "version": "3.0", "requires_dist": None}},
+    ]))
+    tmpdir.join("broken-1.0-py3-none-any.whl").write("not a zip")
+
+    records = sorted(iter_metadata_records([str(tmpdir)]))
+    assert [(r.name, r.version) for r in records] == [
+        ("foo", "1.0"), ("spam", "2.0"),
+    ]
+    foo = records[0]
+    assert foo.requires_dist == ["bar (>=1)", "baz ; extra == 'qux'"]
+    assert foo.requires_python == ">=3.6"
+    assert foo.extras == ["qux"]
@@ -0,0 +1,114 @@
+import hashlib
+import os
+
+import pytest
+
+# Skip where the installed pip-shims does not match pip; passa needs
+# pip_shims.utils (see passa.internals._pip_shims). Errors in passa itself
+# must still fail.
+pip_shims = pytest.importorskip("pip_shims")
+if not hasattr(pip_shims, "utils"):
+    pytest.skip("pip-shims {0} does not match pip".format(
+        pip_shims.__version__,
+    ), allow_module_level=True)
+
+from passa.internals import _pip
+from passa.models import caches
+
+
+CONTENT = b"not really a wheel"
+
+FILENAME = "six-1.11.0-py2.py3-none-any.whl"
+
+HASHES = ["sha256:{0}".format(hashlib.sha256(CONTENT).hexdigest())]
+
+
+class FakeFinder(object):
+    session = None
+
+
+@pytest.fixture()
+def build(tmpdir, monkeypatch):
+    cache_dir = tmpdir.mkdir("cache")
+    download_dir = cache_dir.mkdir("wheels")
+    build_dir = tmpdir.mkdir("build")
+    cache = caches.VerifiedArtifactCache(str(cache_dir))
+    unpacked = []
+
+    def unpack_url(link, location, download_dir, hashes, **kwargs):
+        path = os.path.join(download_dir, link.filename)
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(CONTENT)
+        hashes.check_against_path(path)
+        unpacked.append(path)
+
+    def get_hash(path, verify=False):
+        raise AssertionError("artifact should not be hashed again")
+
+    monkeypatch.setattr(_pip, "ARTIFACT_CACHE", cache)
+    monkeypatch.setattr(_pip, "unpack_url", unpack_url)
+    monkeypatch.setattr(_pip, "_get_finder", lambda sources: FakeFinder())
+    monkeypatch.setattr(_pip, "_prepare_wheel_building_kwargs", lambda ireq: {
+        "build_dir": str(build_dir),
+        "download_dir": str(download_dir),
+        "wheel_download_dir": str(download_dir),
+    })
+    monkeypatch.setattr(cache, "get_hash", get_hash)
+
+    def build(paranoid=False):
+        ireq = pip_shims.InstallRequirement.from_line("six==1.11.0")
+        ireq.link = pip_shims.Link(
+            "https://files.example.com/{0}".format(FILENAME),
+        )
+        del unpacked[:]
+        wheel = _pip.build_wheel(ireq, [], HASHES, paranoid=paranoid)
+        assert wheel.filename == FILENAME
+        return list(unpacked)
+
+    build.artifact = str(download_dir.join(FILENAME))
+    build.cache = cache
+    return build
+
+
+def test_build_wheel_records_verified_hash(build):
+    assert build() == [build.artifact]
+    assert build.cache.is_verified(build.artifact, HASHES)
+
+
+def test_build_wheel_skips_verified_artifact(build):
+    build()
+    assert build() == []
+
+
+def test_build_wheel_paranoid_verifies_again(build):
+    build()
+    assert build(paranoid=True) == [build.artifact]
+    with open(build.artifact, "wb") as f:
+        f.write(b"tampered")
+    with pytest.raises(Exception) as excinfo:
+        build(paranoid=True)
+    assert excinfo.typename == "HashMismatch"
+
+
+class FakeIndexFinder(object):
+
+    def __init__(self, url):
+        self.url = url
+
+    def find_requirement(self, ireq, upgrade):
+        return pip_shims.Link(self.url)
+
+
+@pytest.mark.parametrize("url, identity", [
+    ("https://files.example.com/{0}#sha256=abc".format(FILENAME),
+     "{0}#sha256=abc".format(FILENAME)),
+    ("https://files.example.com/{0}".format(FILENAME), None),
+    ("https://files.example.com/six-1.11.0.tar.gz#sha256=abc", None),
+])
+def test_find_wheel_identity(monkeypatch, url, identity):
+    finder = FakeIndexFinder(url)
+    monkeypatch.setattr(_pip, "_get_finder", lambda sources: finder)
+    ireq = pip_shims.InstallRequirement.from_line("six==1.11.0")
+    assert _pip.find_wheel_identity(ireq, []) == identity
+    assert ireq.link.url == url
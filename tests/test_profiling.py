@@ -0,0 +1,66 @@
+# -*- coding=utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+from passa.internals import profiling
+
+
+class _FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 0.5
+        return self.now
+
+
+def _fail():
+    raise AssertionError("arguments should not be computed")
+
+
+def test_span_and_count_without_profiler():
+    assert profiling.get_profiler() is None
+    with profiling.span("resolve", "phase", requirement=_fail):
+        profiling.count("hits")
+
+
+def test_profiler():
+    profiler = profiling.Profiler(clock=_FakeClock())
+    previous = profiling.set_profiler(profiler)
+    try:
+        with profiling.span("resolve", "phase"):
+            with profiling.span("find_matches", "provider", requirement="a"):
+                profiling.count("hits")
+            with profiling.span("find_matches", "provider",
+                                requirement=lambda: "b"):
+                profiling.count("hits")
+    finally:
+        profiling.set_profiler(previous)
+
+    data = profiler.to_json()
+    assert data["counters"] == {"hits": 2}
+    assert data["totals"] == {
+        "phase:resolve": {"duration": 2.5, "count": 1},
+        "provider:find_matches": {"duration": 1.0, "count": 2},
+    }
+
+    trace = profiler.to_chrome_trace()["traceEvents"]
+    assert [(e["name"], e["ph"]) for e in trace] == [
+        ("find_matches", "X"), ("find_matches", "X"), ("resolve", "X"),
+        ("hits", "C"),
+    ]
+    assert trace[0]["args"] == {"requirement": "a"}
+    assert trace[2]["dur"] == 2.5e6
+
+
+def test_profile_to(tmpdir):
+    path = tmpdir.join("profile.json")
+    with profiling.profile_to(str(path), "chrome"):
+        with profiling.span("hash", "phase"):
+            pass
+    assert profiling.get_profiler() is None
+    names = [e["name"] for e in json.loads(path.read())["traceEvents"]]
+    assert names == ["hash", "total"]
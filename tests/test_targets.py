@@ -0,0 +1,74 @@
+# -*- coding=utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+
+from passa.internals.targets import (
+    Target, TargetConflictError, get_environment, is_artifact_supported,
+    merge_sections, parse_target,
+)
+
+
+def test_parse_target():
+    assert parse_target("3.8-linux") == Target("3.8", "linux")
+    assert parse_target("3.7.3-win32") == Target("3.7.3", "win32")
+    for value in ["3.8", "linux", "3-linux", "3.x-linux"]:
+        with pytest.raises(ValueError):
+            parse_target(value)
+
+
+def test_get_environment():
+    environment = get_environment(Target("2.7", "win32"))
+    assert environment["python_full_version"] == "2.7.0"
+    assert environment["platform_system"] == "Windows"
+    assert environment["os_name"] == "nt"
+
+
+@pytest.mark.parametrize("filename, supported", [
+    ("foo-1.0.tar.gz", True),
+    ("foo-1.0-py2.py3-none-any.whl", True),
+    ("foo-1.0-cp38-cp38-manylinux1_x86_64.whl", True),
+    ("foo-1.0-cp36-abi3-manylinux2010_x86_64.whl", True),
+    ("foo-1.0-cp39-abi3-manylinux2010_x86_64.whl", False),
+    ("foo-1.0-cp37-cp37m-manylinux1_x86_64.whl", False),
+    ("foo-1.0-cp38-cp38-win_amd64.whl", False),
+    ("foo-1.0-py2-none-any.whl", False),
+])
+def test_is_artifact_supported(filename, supported):
+    assert is_artifact_supported(filename, Target("3.8", "linux")) == supported
+
+
+def test_merge_sections():
+    linux = Target("3.8", "linux")
+    windows = Target("3.8", "win32")
+    merged = merge_sections([linux, windows], [
+        {
+            "foo": {"version": "==1.0", "hashes": ["sha256:a"]},
+            "bar": {"version": "==2.0", "markers": "python_version >= '3'"},
+        },
+        {
+            "foo": {"version": "==1.0", "hashes": ["sha256:b"]},
+            "colorama": {"version": "==0.4"},
+        },
+    ])
+    assert merged["foo"] == {
+        "version": "==1.0", "hashes": ["sha256:a", "sha256:b"],
+    }
+    assert merged["bar"]["markers"] == (
+        "(python_version >= '3' and "
+        "python_version == '3.8' and sys_platform == 'linux')"
+    )
+    assert merged["colorama"]["markers"] == (
+        "(python_version == '3.8' and sys_platform == 'win32')"
+    )
+
+
+def test_merge_sections_conflict():
+    with pytest.raises(TargetConflictError) as ctx:
+        merge_sections([Target("2.7", "linux"), Target("3.8", "linux")], [
+            {"foo": {"version": "==1.0"}}, {"foo": {"version": "==2.0"}},
+        ])
+    assert ctx.value.conflicts == [
+        "foo (==1.0 for 2.7-linux, ==2.0 for 3.8-linux)",
+    ]
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from passa.internals.uninstallers import BatchUninstaller
+
+
+class FakeDistribution(object):
+    def __init__(self, key, location, record):
+        self.key = key
+        self.location = location
+        self.record = record
+
+    def has_metadata(self, name):
+        return name == "RECORD" and self.record is not None
+
+    def get_metadata_lines(self, name):
+        return self.record
+
+
+def _make_distribution(tmpdir, name):
+    site = tmpdir.ensure("lib", "site-packages", dir=True)
+    site.ensure(name, "__init__.py")
+    site.ensure(name, "a,b.txt")
+    site.ensure("{0}-1.0.dist-info".format(name), "RECORD")
+    tmpdir.ensure("bin", name)
+    record = [
+        "{0}/__init__.py,sha256=abc,0".format(name),
+        '"{0}/a,b.txt",sha256=abc,0'.format(name),
+        "{0}-1.0.dist-info/RECORD,,".format(name),
+        "../../bin/{0},sha256=abc,0".format(name),
+    ]
+    return FakeDistribution(name, str(site), record)
+
+
+def test_batch_uninstall_commit(tmpdir):
+    dists = [_make_distribution(tmpdir, n) for n in ("foo", "bar")]
+    egg = FakeDistribution("egg", str(tmpdir), None)
+    uninstaller = BatchUninstaller(dists + [egg], str(tmpdir))
+    with uninstaller:
+        site = tmpdir.join("lib", "site-packages")
+        assert not site.join("foo", "__init__.py").check()
+    assert uninstaller.names == {"foo", "bar"}
+    assert uninstaller.unsupported == [egg]
+    assert tmpdir.join("lib", "site-packages").listdir() == []
+    assert tmpdir.join("bin").listdir() == []
+
+
+def test_batch_uninstall_rollback(tmpdir):
+    dists = [_make_distribution(tmpdir, n) for n in ("foo", "bar")]
+    with pytest.raises(ValueError):
+        with BatchUninstaller(dists, str(tmpdir)):
+            raise ValueError
+    site = tmpdir.join("lib", "site-packages")
+    assert sorted(p.basename for p in site.listdir()) == [
+        "bar", "bar-1.0.dist-info", "foo", "foo-1.0.dist-info",
+    ]
+    assert site.join("foo", "__init__.py").check(file=True)
+    assert sorted(os.listdir(str(tmpdir.join("bin")))) == ["bar", "foo"]
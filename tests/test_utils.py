@@ -0,0 +1,41 @@
+# -*- coding=utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+
+from passa.internals.utils import LRUCache, get_env_number
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache["a"] = 1
+    cache["b"] = 2
+    assert cache.get("a") == 1  # "b" is now the least recently used.
+    cache["c"] = 3
+    assert len(cache) == 2
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.get("b", 0) == 0
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, 10),
+    ("", 10),
+    ("4", 4),
+    ("four", 10),
+    ("0", 10),
+    ("2.5", 10),
+])
+def test_get_env_number(monkeypatch, value, expected):
+    if value is None:
+        monkeypatch.delenv("PASSA_TEST_NUMBER", raising=False)
+    else:
+        monkeypatch.setenv("PASSA_TEST_NUMBER", value)
+    assert get_env_number("PASSA_TEST_NUMBER", 10, minimum=1) == expected
+
+
+def test_get_env_number_float(monkeypatch):
+    monkeypatch.setenv("PASSA_TEST_NUMBER", "2.5")
+    assert get_env_number("PASSA_TEST_NUMBER", 0, convert=float) == 2.5
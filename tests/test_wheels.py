@@ -0,0 +1,149 @@
+import os
+import zipfile
+
+import distlib.scripts
+import distlib.wheel
+import pytest
+
+# Skip where the installed pip-shims does not match pip; passa needs
+# pip_shims.utils (see passa.internals._pip_shims). Errors in passa itself
+# must still fail.
+pip_shims = pytest.importorskip("pip_shims")
+if not hasattr(pip_shims, "utils"):
+    pytest.skip("pip-shims {0} does not match pip".format(
+        pip_shims.__version__,
+    ), allow_module_level=True)
+
+from passa.internals import wheels
+
+
+WHEEL = """\
+Wheel-Version: 1.0
+Generator: test
+Root-Is-Purelib: true
+Tag: py2-none-any
+Tag: py3-none-any
+"""
+
+METADATA = """\
+Metadata-Version: 2.1
+Name: foo
+Version: 1.0
+"""
+
+ENTRY_POINTS = """\
+[console_scripts]
+foo = foo:main
+"""
+
+
+def _make_wheel(directory, module=b"def main():\n    pass\n", digest=None):
+    members = [
+        ("foo/__init__.py", module),
+        ("foo-1.0.dist-info/WHEEL", WHEEL.encode("utf-8")),
+        ("foo-1.0.dist-info/METADATA", METADATA.encode("utf-8")),
+        ("foo-1.0.dist-info/entry_points.txt", ENTRY_POINTS.encode("utf-8")),
+    ]
+    record = [
+        "{0},{1},{2}".format(name, wheels._get_record_hash(data), len(data))
+        for name, data in members
+    ]
+    if digest is not None:
+        record[0] = "foo/__init__.py,{0},0".format(digest)
+    record.append("foo-1.0.dist-info/RECORD,,")
+    path = os.path.join(directory, "foo-1.0-py2.py3-none-any.whl")
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, data in members:
+            zf.writestr(name, data)
+        zf.writestr("foo-1.0.dist-info/RECORD", "\n".join(record) + "\n")
+    return distlib.wheel.Wheel(path)
+
+
+@pytest.fixture()
+def store(tmpdir, monkeypatch):
+    store = tmpdir.mkdir("store")
+    monkeypatch.setattr(wheels, "STORE_DIR", str(store))
+    return store
+
+
+def _get_paths(root):
+    return {
+        key: str(root.join(key))
+        for key in ("purelib", "platlib", "scripts", "headers", "data")
+    }
+
+
+def test_install_linked(tmpdir, store):
+    wheel = _make_wheel(str(tmpdir))
+    env = tmpdir.mkdir("env")
+    paths = _get_paths(env)
+    paths["prefix"] = str(env)
+    maker = distlib.scripts.ScriptMaker(None, None)
+
+    dist = wheels.install_linked(wheel, paths, maker, "hardlink", "abc")
+
+    installed = env.join("purelib", "foo", "__init__.py")
+    stored = store.join("abc", "foo", "__init__.py")
+    assert os.path.samefile(str(installed), str(stored))
+    assert env.join("scripts", "foo").check(file=True)
+    assert dist.name == "foo"
+    recorded = [path for path, _, _ in dist.list_installed_files()]
+    assert "foo/__init__.py" in recorded
+    assert not store.listdir(lambda p: p.basename.startswith("unpack-"))
+
+
+def test_unpack_wheel_checks_record(tmpdir, store):
+    wheel = _make_wheel(str(tmpdir), digest="sha256=wrong")
+    with pytest.raises(ValueError):
+        wheels.get_unpacked_wheel(wheel, "abc")
+    assert store.listdir() == []
+
+
+@pytest.mark.parametrize("method", ["hardlink", "reflink", "copy"])
+def test_link_file(tmpdir, method):
+    source = tmpdir.join("source")
+    source.write("content")
+    target = tmpdir.join("sub", "target")
+    target.write("old", ensure=True)
+    wheels.link_file(str(source), str(target), method)
+    assert target.read() == "content"
+    linked = os.path.samefile(str(source), str(target))
+    assert linked == (method == "hardlink")
+
+
+def test_link_file_falls_back_to_copy(tmpdir, monkeypatch):
+    def fail(source, target):
+        with open(target, "w") as f:
+            f.write("partial")
+        raise OSError(95, "not supported")
+
+    monkeypatch.setattr(wheels, "_reflink", fail)
+    source = tmpdir.join("source")
+    source.write("content")
+    target = tmpdir.join("target")
+    wheels.link_file(str(source), str(target), "reflink")
+    assert target.read() == "content"
+    assert not os.path.samefile(str(source), str(target))
+
+
+def test_get_unpacked_wheel_verify(tmpdir, store):
+    wheel = _make_wheel(str(tmpdir))
+    location = wheels.get_unpacked_wheel(wheel, "abc")
+    module = os.path.join(location, "foo", "__init__.py")
+    with open(module, "w") as f:
+        f.write("tampered = True\n")
+
+    # Reused as-is unless verified.
+    assert wheels.get_unpacked_wheel(wheel, "abc") == location
+    with open(module) as f:
+        assert f.read() == "tampered = True\n"
+
+    assert wheels.get_unpacked_wheel(wheel, "abc", verify=True) == location
+    with open(module) as f:
+        assert f.read() == "def main():\n    pass\n"
+    assert store.listdir() == [store.join("abc")]
+
+    record = os.path.join(location, "foo-1.0.dist-info", "RECORD")
+    with open(record, "a") as f:
+        f.write("foo/evil.py,,\n")
+    assert not wheels._is_unpacked_wheel_intact(wheel, location)